@@ -0,0 +1,236 @@
+"""
+This module provides the Alpha Vantage client shared by the tools. All requests go through one pooled HTTP
+session with keep-alive, wait for a token of the plan's per-minute quota before they are sent, and identical
+requests in flight at the same time are sent once. The per-day quota resets with the calendar day, a request
+beyond it fails at once instead of waiting for the next day. When Alpha Vantage answers with its per-minute rate
+limit notice anyway, e.g. because another process shares the API key, the request is queued and retried with
+back-off, its notices of the daily limit and of premium endpoints are raised without retries. The base URL is
+configurable so the client can run against a local mock server.
+
+Classes:
+    AlphaVantageRateLimitError: Raised for a per-minute rate limit notice of Alpha Vantage.
+    AlphaVantageQuotaError: Raised when the daily quota is used up or an endpoint needs a premium plan.
+    AlphaVantageStats: A data class counting requests, coalesced requests and rate limit waits.
+    AlphaVantageClient: The client.
+
+Functions:
+    get_alpha_vantage_client() -> AlphaVantageClient:
+        Returns the process-wide client used by the tools.
+
+    set_alpha_vantage_client(client: AlphaVantageClient) -> None:
+        Replaces the process-wide client, e.g. by one pointing to a mock server.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import TokenBucket, retry_with_jitter
+
+ALPHA_VANTAGE_BASE_URL = "https://www.alphavantage.co/query/"
+
+# quota of the free plan, premium plans allow more calls per minute and none per day
+DEFAULT_CALLS_PER_MINUTE = 5
+DEFAULT_CALLS_PER_DAY = 25
+
+
+class AlphaVantageRateLimitError(Exception):
+    """Raised when Alpha Vantage answers with its per-minute rate limit notice instead of data."""
+
+
+class AlphaVantageQuotaError(Exception):
+    """Raised when the daily quota is used up or Alpha Vantage answers that an endpoint needs a premium plan."""
+
+
+@dataclass
+class AlphaVantageStats:
+    """Class for keeping track of the requests sent, coalesced and held back by the quota."""
+
+    requests: int = 0
+    coalesced: int = 0
+    rate_limited: int = 0
+    waited_seconds: float = 0.0
+
+
+class AlphaVantageClient:
+    """
+    A thread-safe Alpha Vantage client with a pooled session, token buckets per quota and coalescing of
+    identical requests in flight.
+
+    Args:
+        api_key (str): The API key, read from ALPHAVANTAGE_API_KEY if not given.
+        base_url (str): The URL of the query endpoint, e.g. of a local mock server.
+        calls_per_minute (float): The calls per minute of the plan, 0 for unlimited.
+        calls_per_day (float): The calls per day of the plan, 0 for unlimited.
+        pool_size (int): The number of connections kept alive.
+        timeout (float): The seconds to wait for a response.
+        max_retries (int): The number of retries of a request answered with the rate limit notice.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = ALPHA_VANTAGE_BASE_URL,
+        calls_per_minute: float = DEFAULT_CALLS_PER_MINUTE,
+        calls_per_day: float = DEFAULT_CALLS_PER_DAY,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        max_retries: int = 5,
+    ):
+        self.api_key = api_key or os.environ["ALPHAVANTAGE_API_KEY"]
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = AlphaVantageStats()
+        # the whole minute quota may be used at once, the day quota is refilled when the UTC date changes
+        self.minute_bucket = None
+        if calls_per_minute:
+            self.minute_bucket = TokenBucket.per_minute(calls_per_minute, burst=calls_per_minute)
+        self.calls_per_day = calls_per_day
+        self._day_bucket = TokenBucket(rate=0.0, capacity=calls_per_day) if calls_per_day else None
+        self._quota_date = datetime.now(timezone.utc).date()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def query(self, function: str, **params: Any) -> Dict[str, Any]:
+        """
+        Sends a request to the query endpoint, or waits for the identical request already in flight.
+
+        Args:
+            function (str): The Alpha Vantage function, e.g. "TIME_SERIES_DAILY".
+            **params: The further parameters of the function, e.g. symbol.
+
+        Returns:
+            dict: The JSON response.
+        """
+        params = {"function": function, **params}
+        key = json.dumps(params, sort_keys=True, default=str)
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future: Future = Future()
+                self._inflight[key] = future
+            else:
+                self.stats.coalesced += 1
+        if inflight is not None:
+            return inflight.result()
+
+        try:
+            data = retry_with_jitter(
+                lambda: self._send(params),
+                max_retries=self.max_retries,
+                base_delay=12.0,
+                max_delay=60.0,
+                retry_on=(AlphaVantageRateLimitError,),
+            )
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+        future.set_result(data)
+        return data
+
+    def _take_daily_quota(self) -> None:
+        if self._day_bucket is None:
+            return
+        with self._lock:
+            today = datetime.now(timezone.utc).date()
+            if today != self._quota_date:
+                self._day_bucket = TokenBucket(rate=0.0, capacity=self.calls_per_day)
+                self._quota_date = today
+            day_bucket = self._day_bucket
+        if not day_bucket.try_acquire():
+            raise AlphaVantageQuotaError(
+                f"The Alpha Vantage quota of {self.calls_per_day:g} calls per day is used up, "
+                "it resets at midnight UTC."
+            )
+
+    def _send(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._take_daily_quota()
+        waited = self.minute_bucket.acquire() if self.minute_bucket else 0.0
+        response = self.session.get(self.base_url, params={**params, "apikey": self.api_key}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.waited_seconds += waited
+
+        if "Error Message" in data:
+            raise ValueError(f"API Error: {data['Error Message']}")
+        # the notices come with status 200 under "Note" or "Information" instead of the data
+        notice = data.get("Note") or data.get("Information")
+        if notice and len(data) == 1:
+            # waiting does not help against the daily limit or a premium endpoint
+            if "per day" in notice or "premium" in notice.lower():
+                raise AlphaVantageQuotaError(f"Alpha Vantage refused the request: {notice}")
+            with self._lock:
+                self.stats.rate_limited += 1
+            print(f"alpha vantage rate limit, request queued: {notice}")
+            raise AlphaVantageRateLimitError(notice)
+        return data
+
+    def search_symbols(self, keywords: str) -> Dict[str, Any]:
+        return self.query("SYMBOL_SEARCH", keywords=keywords)
+
+    def get_market_news_sentiment(self, symbol: str) -> Dict[str, Any]:
+        return self.query("NEWS_SENTIMENT", symbol=symbol)
+
+    def get_time_series_daily(self, symbol: str) -> Dict[str, Any]:
+        return self.query("TIME_SERIES_DAILY", symbol=symbol)
+
+    def get_time_series_weekly(self, symbol: str) -> Dict[str, Any]:
+        return self.query("TIME_SERIES_WEEKLY", symbol=symbol)
+
+    def get_quote(self, symbol: str) -> Dict[str, Any]:
+        return self.query("GLOBAL_QUOTE", symbol=symbol)
+
+    def get_top_gainers_losers(self) -> Dict[str, Any]:
+        return self.query("TOP_GAINERS_LOSERS")
+
+    def get_exchange_rate(self, from_currency: str, to_currency: str) -> Dict[str, Any]:
+        return self.query("CURRENCY_EXCHANGE_RATE", from_currency=from_currency, to_currency=to_currency)
+
+
+_client: Optional[AlphaVantageClient] = None
+_client_lock = threading.Lock()
+
+
+def get_alpha_vantage_client() -> AlphaVantageClient:
+    """
+    Returns the process-wide client used by the tools, created on first use. The base URL and the quota are
+    read from ALPHAVANTAGE_BASE_URL, ALPHAVANTAGE_CALLS_PER_MINUTE and ALPHAVANTAGE_CALLS_PER_DAY.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AlphaVantageClient(
+                base_url=os.environ.get("ALPHAVANTAGE_BASE_URL", ALPHA_VANTAGE_BASE_URL),
+                calls_per_minute=float(os.environ.get("ALPHAVANTAGE_CALLS_PER_MINUTE", DEFAULT_CALLS_PER_MINUTE)),
+                calls_per_day=float(os.environ.get("ALPHAVANTAGE_CALLS_PER_DAY", DEFAULT_CALLS_PER_DAY)),
+            )
+        return _client
+
+
+def set_alpha_vantage_client(client: AlphaVantageClient) -> None:
+    """
+    Replaces the process-wide client, e.g. by AlphaVantageClient(base_url=...) of a local mock server in tests.
+
+    Args:
+        client (AlphaVantageClient): The client used by the tools from now on.
+    """
+    global _client
+    with _client_lock:
+        _client = client
@@ -1,40 +1,43 @@
 from langchain.agents import Tool
 from langchain.tools.base import StructuredTool
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_community.utilities.alpha_vantage import AlphaVantageAPIWrapper
+
+from alpha_vantage_client import get_alpha_vantage_client
+from market_data_cache import cached_fetch
 
 def search_symbols(company_name: str) -> str:
     """Searches a stock market symbol or a company."""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage.search_symbols(company_name)
+    return cached_fetch("alpha_vantage", "search_symbols", company_name, "search",
+                        lambda: get_alpha_vantage_client().search_symbols(company_name))
 
 def get_exchange_rate(from_currency: str, to_currency: str) -> str:
     """Gets the exchange rate for twu currencies."""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage._get_exchange_rate(from_currency, to_currency)
+    return cached_fetch("alpha_vantage", "exchange_rate", "", "quote",
+                        lambda: get_alpha_vantage_client().get_exchange_rate(from_currency, to_currency),
+                        {"from": from_currency, "to": to_currency})
 
 
 def get_time_series_daily(ticker_symbol: str) -> str:
     """"Gets the daily time series for a stock market ticker symbol"""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage._get_time_series_daily(ticker_symbol)
+    return cached_fetch("alpha_vantage", "time_series_daily", ticker_symbol, "history",
+                        lambda: get_alpha_vantage_client().get_time_series_daily(ticker_symbol))
 
 
 def get_time_series_weekly(ticker_symbol: str) -> str:
     """"Gets the weekly time series for a stock market ticker symbol"""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage._get_time_series_weekly(ticker_symbol)
+    return cached_fetch("alpha_vantage", "time_series_weekly", ticker_symbol, "history",
+                        lambda: get_alpha_vantage_client().get_time_series_weekly(ticker_symbol))
 
 
 def get_market_news_sentiment(ticker_symbol: str) -> str:
     """"Gets the market news sentiment for a ticker"""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage._get_market_news_sentiment(ticker_symbol)
+    return cached_fetch("alpha_vantage", "market_news_sentiment", ticker_symbol, "sentiment",
+                        lambda: get_alpha_vantage_client().get_market_news_sentiment(ticker_symbol))
 
 def get_top_gainers_losers() -> str:
     """"Gets the top gainers and losers of the stock market"""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage._get_top_gainers_losers()
+    return cached_fetch("alpha_vantage", "top_gainers_losers", "", "quote",
+                        lambda: get_alpha_vantage_client().get_top_gainers_losers())
 
 def get_search_symbols_tool():
     description = (
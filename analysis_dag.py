@@ -0,0 +1,110 @@
+"""
+This module runs the steps of an investment analysis as a DAG of sub-agents. A step starts as soon as the
+steps it depends on are done, so the independent data-gathering steps run concurrently and a step depending
+on them, like the final rating, gets their results as input. A full report then takes about as long as the
+slowest data-gathering step plus the rating instead of the sum of all steps.
+
+Classes:
+    AnalysisStep: A data class describing one step, its prompt, its tools and its dependencies.
+    AnalysisResult: A data class holding the outputs and timings of a run.
+
+Functions:
+    run_analysis_dag(steps, input, invoke, max_workers, outputs) -> AnalysisResult:
+        Runs the steps concurrently in dependency order.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# the input variable a dependent step gets the outputs of its dependencies in
+STEP_RESULTS_KEY = "step_results"
+
+
+@dataclass
+class AnalysisStep:
+    """Class for describing one step of the analysis."""
+
+    key: str
+    prompt_template: str
+    tools: List[Any]
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class AnalysisResult:
+    """Class for keeping the outputs and timings of an analysis run."""
+
+    outputs: Dict[str, str] = field(default_factory=dict)
+    step_seconds: Dict[str, float] = field(default_factory=dict)
+    total_seconds: float = 0.0
+
+    @property
+    def sequential_seconds(self) -> float:
+        """The time the steps would have taken one after another."""
+        return sum(self.step_seconds.values())
+
+
+def _step_results(step: AnalysisStep, outputs: Dict[str, str]) -> str:
+    return "\n\n".join(f"### {key}\n{outputs[key]}" for key in step.depends_on)
+
+
+def run_analysis_dag(
+    steps: Sequence[AnalysisStep],
+    input: Dict[str, Any],
+    invoke: Callable[..., Dict[str, Any]],
+    max_workers: int = 8,
+    outputs: Optional[Dict[str, str]] = None,
+) -> AnalysisResult:
+    """
+    Runs every step as its own agent as soon as its dependencies are done. A step with dependencies gets
+    their outputs in the `step_results` input variable of its prompt.
+
+    Args:
+        steps (Sequence[AnalysisStep]): The steps, dependencies have to be part of the steps.
+        input (dict): The input variables of the prompts, e.g. ticker, topics and period.
+        invoke (Callable): Runs an agent, called as invoke(input=..., tools=..., prompt_template=...) and
+            returning a dict with the key "output", e.g. invoke_cohere_with_tools.
+        max_workers (int): The maximal number of agents running at once.
+        outputs (dict): The outputs of steps done before the run, e.g. a market research shared by the runs
+            of a watchlist. Steps may depend on them and they are not part of the result.
+
+    Returns:
+        AnalysisResult: The outputs and durations of the steps.
+    """
+    outputs = outputs or {}
+    keys = {step.key for step in steps} | set(outputs)
+    for step in steps:
+        missing = set(step.depends_on) - keys
+        if missing:
+            raise ValueError(f"step {step.key} depends on unknown steps {sorted(missing)}")
+
+    def run(step: AnalysisStep, step_input: Dict[str, Any]) -> Tuple[str, float]:
+        started = time.monotonic()
+        response = invoke(input=step_input, tools=step.tools, prompt_template=step.prompt_template)
+        return response["output"], time.monotonic() - started
+
+    result = AnalysisResult()
+    started = time.monotonic()
+    pending = list(steps)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis") as executor:
+        while pending or running:
+            done_outputs = {**outputs, **result.outputs}
+            ready = [step for step in pending if all(key in done_outputs for key in step.depends_on)]
+            for step in ready:
+                pending.remove(step)
+                step_input = dict(input)
+                if step.depends_on:
+                    step_input[STEP_RESULTS_KEY] = _step_results(step, done_outputs)
+                running[executor.submit(run, step, step_input)] = step
+            if not running:
+                raise ValueError(f"steps {[step.key for step in pending]} have circular dependencies")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                result.outputs[step.key], result.step_seconds[step.key] = future.result()
+                print(f"analysis step {step.key} done in {result.step_seconds[step.key]:.1f}s")
+    result.total_seconds = time.monotonic() - started
+    return result
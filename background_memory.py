@@ -0,0 +1,137 @@
+"""
+This module provides a conversation memory that keeps the latest turns verbatim and folds older turns into a
+running summary in a background worker. ConversationSummaryMemory re-summarizes the history with a blocking
+LLM call after every turn, so the next question waits for it. Here a question never waits for the summary:
+turns that are not folded yet are simply passed verbatim until the background summary catches up.
+
+Classes:
+    MemoryStats: A data class counting the background summaries and their latency.
+    BackgroundSummaryMemory: The conversation memory.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.summary import SummarizerMixin
+from langchain_core.messages import BaseMessage, get_buffer_string
+from langchain_core.pydantic_v1 import PrivateAttr
+
+# summarizes the histories of all sessions of the process
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory")
+
+
+@dataclass
+class MemoryStats:
+    """Class for keeping track of the background summaries and the latency they took off the critical path."""
+
+    turns: int = 0
+    scheduled_summaries: int = 0
+    background_summaries: int = 0
+    background_seconds: float = 0.0
+    failures: int = 0
+    folded_turns: int = 0
+
+
+class BackgroundSummaryMemory(BaseChatMemory, SummarizerMixin):
+    """
+    A conversation memory returning the running summary of the older turns followed by the messages of the
+    latest `window_turns` turns and of every turn the background summary has not folded in yet.
+    """
+
+    memory_key: str = "history"
+    window_turns: int = 3
+    summary: str = ""
+
+    _summarized: int = PrivateAttr(default=0)
+    _epoch: int = PrivateAttr(default=0)
+    _future: Optional[Future] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _stats: MemoryStats = PrivateAttr(default_factory=MemoryStats)
+
+    @property
+    def stats(self) -> MemoryStats:
+        return self._stats
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def buffer(self) -> Any:
+        with self._lock:
+            messages = self.chat_memory.messages[self._summarized:]
+            summary = self.summary
+        if self.return_messages:
+            return ([self.summary_message_cls(content=summary)] if summary else []) + list(messages)
+        lines = get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        return f"{summary}\n{lines}" if summary else lines
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.memory_key: self.buffer}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        with self._lock:
+            self._stats.turns += 1
+        self._schedule()
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self._summarized = 0
+            # a summary still running belongs to the cleared history and is dropped
+            self._epoch += 1
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits until the background summary caught up with the turns outside the window.
+
+        Args:
+            timeout (float): The maximal number of seconds to wait.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                future = self._future
+            if future is None:
+                return
+            future.result(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def _schedule(self) -> None:
+        with self._lock:
+            if self._future is not None:
+                return
+            end = len(self.chat_memory.messages) - 2 * self.window_turns
+            if end <= self._summarized:
+                return
+            messages = self.chat_memory.messages[self._summarized:end]
+            self._stats.scheduled_summaries += 1
+            self._future = _executor.submit(self._fold, messages, self.summary, end, self._epoch)
+
+    def _fold(self, messages: List[BaseMessage], summary: str, end: int, epoch: int) -> None:
+        started = time.monotonic()
+        try:
+            new_summary = self.predict_new_summary(messages, summary)
+        except Exception as e:
+            # the turns stay verbatim and are folded in after the next turn
+            print(f"background summary failed: {e}")
+            with self._lock:
+                self._stats.failures += 1
+                self._future = None
+            return
+
+        with self._lock:
+            self._future = None
+            if epoch != self._epoch:
+                return
+            self.summary = new_summary
+            self._summarized = end
+            self._stats.background_summaries += 1
+            self._stats.background_seconds += time.monotonic() - started
+            self._stats.folded_turns += len(messages) // 2
+        # turns that ended while summarizing
+        self._schedule()
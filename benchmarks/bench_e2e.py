@@ -0,0 +1,411 @@
+"""
+Benchmarks the RAG chain of main.py and the investment advisor agent end to end with local stand-ins, so
+their latency can be tracked between commits without Cohere, Qdrant, Tavily, Polygon or Yahoo:
+
+- the RAG suite runs scripted conversations through the RAGChain that initialize_session_state builds, with
+  the stub embedder, an in-memory Qdrant collection and the stub chat model streaming at a configurable
+  latency and token rate,
+- the advisor suite runs the analysis DAG of every ticker with the scripted ReAct completion model and the
+  finance tools replayed from the record/replay fixtures of benchmarks/tool_fixtures.py.
+
+The report has the latency distribution of every stage (condense, retrieve, generation and the rest of a turn;
+the LLM and tool time of every analysis step) and of the totals, the LLM calls and the prompt and completion
+tokens per turn and per analysis. The results are saved per commit, and --compare prints the change against
+the results of another commit and exits with 1 if a metric got worse by more than the tolerance.
+
+The conversations file holds a JSON list of conversations, each a list of questions.
+
+Usage:
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --suites rag --conversations conversations.json --tokenizer words
+    python -m benchmarks.bench_e2e --suites advisor --tickers NVDA MSFT --record
+    python -m benchmarks.bench_e2e --compare benchmark_results/e2e-1a2b3c4.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from qdrant_client import QdrantClient
+
+from background_memory import BackgroundSummaryMemory
+from benchmarks.stubs import ScriptedAgentLLM, StubChatModel, StubEmbeddings, chunk_points, synthetic_chunks
+from benchmarks.tool_fixtures import TOOL_FIXTURES_PATH, ToolFixtures
+from context_packer import ContextPacker
+from embedding_cache import CachedEmbeddings
+from ingestion import COLLECTION_NAME
+from metrics import summarize_latencies
+from mmr import MMRRetriever
+from prompts import ANSWER_PROMPT, CONDENSE_QUESTION_PROMPT
+from question_router import QuestionRouter
+from rag_chain import ANSWER_TAG, AnswerStreamHandler, RAGChain
+from semantic_cache import SemanticCache
+from token_count import tiktoken_counter
+from tool_compaction import ToolCompactor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmark_results")
+
+# standalone questions, follow-ups that are condensed and a repeated question answered from the cache
+DEFAULT_CONVERSATIONS = [
+    [
+        "How do I create a Qdrant collection for Cohere embeddings?",
+        "And how do I search it?",
+        "What does the retriever return for a question?",
+        "How do I create a Qdrant collection for Cohere embeddings?",
+    ],
+    [
+        "What is maximal marginal relevance in the retriever?",
+        "Why does it help?",
+        "How does the chain use the conversation memory?",
+    ],
+    [
+        "How does the answer prompt use the retrieved context?",
+        "Can it stream the tokens?",
+        "What happens when no documents are found?",
+    ],
+]
+
+DEFAULT_TOPICS = ("all relevant key figures like margin, profit, earnings growth and so on, fundamental indicators, "
+                  "technical indicators and analyst recommendations")
+
+DUMMY_KEYS = ("ALPHAVANTAGE_API_KEY", "COHERE_API_KEY", "POLYGON_API_KEY", "TAVILY_API_KEY")
+
+
+class StageRecorder(BaseCallbackHandler):
+    """
+    Collects the seconds spent per stage, the LLM and tool calls and the tokens of one turn or analysis step.
+    LLM runs tagged as the answer count as "generation", other LLM runs as `llm_stage`.
+
+    Args:
+        count_tokens (Callable[[str], int]): Counts the tokens of a text.
+        llm_stage (str): The stage of the LLM runs not generating the answer.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], llm_stage: str = "llm"):
+        self.count_tokens = count_tokens
+        self.llm_stage = llm_stage
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._running: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: Any, stage: str) -> None:
+        with self._lock:
+            self._running[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: Any) -> None:
+        with self._lock:
+            stage, started = self._running.pop(run_id, (None, None))
+            if stage is not None:
+                self.stages[stage] += time.perf_counter() - started
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: Any, tags=None,
+                     **kwargs: Any) -> None:
+        tokens = sum(self.count_tokens(prompt) for prompt in prompts)
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += tokens
+        self._start(run_id, "generation" if tags and ANSWER_TAG in tags else self.llm_stage)
+
+    def on_llm_end(self, response: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+        tokens = sum(self.count_tokens(generation.text) for generations in response.generations
+                     for generation in generations)
+        with self._lock:
+            self.completion_tokens += tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: Any, **kwargs: Any) -> None:
+        self._start(run_id, "retrieve")
+
+    def on_retriever_end(self, documents: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self.tool_calls += 1
+        self._start(run_id, "tools")
+
+    def on_tool_end(self, output: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stages": dict(self.stages),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+def token_counter(tokenizer: str) -> Callable[[str], int]:
+    if tokenizer == "words":
+        return lambda text: len(text.split())
+    return tiktoken_counter()
+
+
+def run_rag_suite(args, conversations, count_tokens):
+    embeddings = CachedEmbeddings(StubEmbeddings(dim=args.dim, call_ms=args.embed_ms), path=":memory:")
+    client = QdrantClient(":memory:")
+    vectors_config, points = chunk_points(embeddings.embeddings, synthetic_chunks(args.chunks))
+    client.create_collection(COLLECTION_NAME, vectors_config=vectors_config)
+    client.upsert(COLLECTION_NAME, points=points)
+    llm = StubChatModel(tokens=args.answer_tokens, first_token_ms=args.first_token_ms,
+                        token_ms=1000 / args.tokens_per_second, streaming=True)
+    # shared by all sessions like the resources of the Streamlit app
+    answer_cache = SemanticCache(embeddings, threshold=0.95)
+    context_packer = ContextPacker(count_tokens=count_tokens)
+    question_router = QuestionRouter()
+
+    turns = []
+    for conversation_index, conversation in enumerate(conversations):
+        # the chain of initialize_session_state with the stand-ins
+        chain = RAGChain.from_llm(
+            llm=llm,
+            chain_type="stuff",
+            memory=BackgroundSummaryMemory(llm=llm, memory_key="chat_history", input_key="question",
+                                           output_key="answer", return_messages=True),
+            retriever=MMRRetriever(client=client, collection_name=COLLECTION_NAME, embeddings=embeddings,
+                                   k=4, fetch_k=20, lambda_mult=0.5),
+            condense_question_prompt=CONDENSE_QUESTION_PROMPT,
+            return_source_documents=False,
+            combine_docs_chain_kwargs={"prompt": ANSWER_PROMPT},
+            answer_cache=answer_cache,
+            context_packer=context_packer,
+            question_router=question_router,
+        )
+        for turn_index, question in enumerate(conversation):
+            recorder = StageRecorder(count_tokens, llm_stage="condense")
+            handler = AnswerStreamHandler(on_token=lambda text: None)
+            chain({"question": question}, callbacks=[recorder, handler], return_only_outputs=True)
+            timings = handler.timings()
+            stages = {stage: recorder.stages.get(stage, 0.0) for stage in ("condense", "retrieve", "generation")}
+            stages["other"] = max(timings["total"] - sum(stages.values()), 0.0)
+            turns.append({
+                "conversation": conversation_index,
+                "turn": turn_index,
+                "question": question,
+                "cached": timings["generation"] is None,
+                "stages": stages,
+                "time_to_first_token": timings["time_to_first_token"],
+                "total": timings["total"],
+                **{key: value for key, value in recorder.report().items() if key != "stages"},
+            })
+        chain.memory.wait()
+    return turns
+
+
+def run_advisor_suite(args, count_tokens, fixtures, compactor):
+    if not args.record:
+        # the replayed tools are built but never call their APIs
+        for key in DUMMY_KEYS:
+            os.environ.setdefault(key, "dummy")
+    from analysis_dag import run_analysis_dag
+    from investment_advisor import ANALYSIS_TOOLS, PROMPT_TEMPLATES, build_analysis_steps, invoke_cohere_with_tools
+    from tool_compaction import compact_tools
+    from tool_registry import get_tools
+
+    tools = compact_tools([fixtures.wrap(tool) for tool in get_tools(ANALYSIS_TOOLS)], compactor)
+    steps = build_analysis_steps(list(PROMPT_TEMPLATES), tools)
+    step_keys = {step.prompt_template: step.key for step in steps}
+
+    analyses = []
+    for ticker in args.tickers:
+        llm = ScriptedAgentLLM(subject=ticker, answer_tokens=args.agent_answer_tokens,
+                               first_token_ms=args.first_token_ms, token_ms=1000 / args.tokens_per_second)
+        recorders = {step.key: StageRecorder(count_tokens) for step in steps}
+
+        def invoke(input, tools, prompt_template="{input}"):
+            callbacks = [recorders[step_keys[prompt_template]]]
+            return invoke_cohere_with_tools(input, tools, prompt_template, callbacks=callbacks, llm=llm)
+
+        result = run_analysis_dag(steps, {"ticker": ticker, "topics": DEFAULT_TOPICS, "period": args.period},
+                                  invoke, max_workers=args.workers)
+        step_reports = {key: {"seconds": result.step_seconds[key], **recorder.report()}
+                        for key, recorder in recorders.items()}
+        analyses.append({
+            "ticker": ticker,
+            "total": result.total_seconds,
+            "sequential": result.sequential_seconds,
+            "steps": step_reports,
+            **{key: sum(step[key] for step in step_reports.values())
+               for key in ("llm_calls", "tool_calls", "prompt_tokens", "completion_tokens")},
+        })
+    if args.record:
+        fixtures.save()
+    return analyses
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def summarize(rag_turns, analyses) -> Dict[str, float]:
+    """Flattens the results into metrics where lower is better, keyed like rag.retrieve.p95_ms."""
+    summary = {}
+
+    def add_latencies(prefix, values):
+        for key, value in summarize_latencies(values).items():
+            if key != "count":
+                summary[f"{prefix}.{key}"] = value
+
+    if rag_turns:
+        for stage in ("condense", "retrieve", "generation", "other"):
+            add_latencies(f"rag.{stage}", [turn["stages"][stage] for turn in rag_turns])
+        add_latencies("rag.total", [turn["total"] for turn in rag_turns])
+        add_latencies("rag.time_to_first_token",
+                      [turn["time_to_first_token"] for turn in rag_turns if turn["time_to_first_token"] is not None])
+        for key in ("llm_calls", "prompt_tokens", "completion_tokens"):
+            summary[f"rag.{key}_per_turn"] = _mean([turn[key] for turn in rag_turns])
+    if analyses:
+        add_latencies("advisor.total", [analysis["total"] for analysis in analyses])
+        for stage in ("llm", "tools"):
+            add_latencies(f"advisor.{stage}", [step["stages"].get(stage, 0.0) for analysis in analyses
+                                              for step in analysis["steps"].values()])
+        for key in analyses[0]["steps"]:
+            add_latencies(f"advisor.step.{key}", [analysis["steps"][key]["seconds"] for analysis in analyses])
+        for key in ("llm_calls", "tool_calls", "prompt_tokens", "completion_tokens"):
+            summary[f"advisor.{key}_per_analysis"] = _mean([analysis[key] for analysis in analyses])
+    return summary
+
+
+def compare(summary, baseline, tolerance, min_delta_ms=5.0) -> List[str]:
+    """
+    Prints the change of every metric against the baseline and returns the metrics that got worse by more than
+    `tolerance`, for latencies also by more than `min_delta_ms`.
+    """
+    regressions = []
+    print(f"{'metric':<52}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key in sorted(set(summary) & set(baseline)):
+        before, after = baseline[key], summary[key]
+        change = (after - before) / before if before else 0.0
+        worse = change > tolerance and after - before > (min_delta_ms if key.endswith("_ms") else 0.0)
+        if worse:
+            regressions.append(key)
+        print(f"{key:<52}{before:>12.1f}{after:>12.1f}{change:>+9.0%}{' !' if worse else ''}")
+    return regressions
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return "", False
+    return commit, dirty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=("rag", "advisor"), default=["rag", "advisor"])
+    parser.add_argument("--conversations", default=None, help="json file with the conversations of the rag suite")
+    parser.add_argument("--tickers", nargs="+", default=["NVDA", "MSFT", "AAPL"])
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--workers", type=int, default=8, help="analysis steps running at once")
+    parser.add_argument("--first-token-ms", type=float, default=300.0, help="latency of the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="token rate of the stand-in LLMs")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="tokens of a rag answer")
+    parser.add_argument("--agent-answer-tokens", type=int, default=200, help="tokens of an agent answer")
+    parser.add_argument("--embed-ms", type=float, default=100.0, help="latency of an embedding call")
+    parser.add_argument("--chunks", type=int, default=1000, help="chunks in the in-memory collection")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--fixtures", default=TOOL_FIXTURES_PATH, help="json file of the recorded tool calls")
+    parser.add_argument("--record", action="store_true", help="call the real tools and record them, needs the keys")
+    parser.add_argument("--tool-latency-scale", type=float, default=1.0, help="factor of the replayed tool latency")
+    parser.add_argument("--tokenizer", choices=("tiktoken", "words"), default="tiktoken")
+    parser.add_argument("--output", default=None, help="defaults to benchmark_results/e2e-<commit>.json")
+    parser.add_argument("--compare", default=None, help="results of another commit to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="latency change counted as a regression")
+    args = parser.parse_args()
+
+    count_tokens = token_counter(args.tokenizer)
+    conversations = DEFAULT_CONVERSATIONS
+    if args.conversations:
+        with open(args.conversations, encoding="utf-8") as f:
+            conversations = json.load(f)
+    fixtures = ToolFixtures(args.fixtures, record=args.record, latency_scale=args.tool_latency_scale)
+
+    started = time.perf_counter()
+    rag_turns = run_rag_suite(args, conversations, count_tokens) if "rag" in args.suites else []
+    compactor = ToolCompactor(count_tokens=count_tokens)
+    analyses = run_advisor_suite(args, count_tokens, fixtures, compactor) if "advisor" in args.suites else []
+    summary = summarize(rag_turns, analyses)
+    seconds = time.perf_counter() - started
+
+    if rag_turns:
+        print(f"rag: {len(rag_turns)} turns in {len(conversations)} conversations, "
+              f"{sum(turn['cached'] for turn in rag_turns)} answered from the cache")
+        for stage in ("condense", "retrieve", "generation", "other", "total", "time_to_first_token"):
+            print(f"  {stage:<22}p50 {summary[f'rag.{stage}.p50_ms']:>7.0f}ms  p95 {summary[f'rag.{stage}.p95_ms']:>7.0f}ms")
+        print(f"  per turn: {summary['rag.llm_calls_per_turn']:.2f} LLM calls, "
+              f"{summary['rag.prompt_tokens_per_turn']:.0f} prompt and "
+              f"{summary['rag.completion_tokens_per_turn']:.0f} completion tokens")
+    if analyses:
+        print(f"advisor: {len(analyses)} analyses, {fixtures.stats.replayed} tool calls replayed, "
+              f"{fixtures.stats.synthetic} synthetic, {fixtures.stats.recorded} recorded")
+        for stage in ("total", "llm", "tools"):
+            print(f"  {stage:<22}p50 {summary[f'advisor.{stage}.p50_ms']:>7.0f}ms  "
+                  f"p95 {summary[f'advisor.{stage}.p95_ms']:>7.0f}ms")
+        print(f"  per analysis: {summary['advisor.llm_calls_per_analysis']:.1f} LLM calls, "
+              f"{summary['advisor.tool_calls_per_analysis']:.1f} tool calls, "
+              f"{summary['advisor.prompt_tokens_per_analysis']:.0f} prompt and "
+              f"{summary['advisor.completion_tokens_per_analysis']:.0f} completion tokens")
+        print(f"  tool compaction: {compactor.stats.report()}")
+
+    commit, dirty = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{commit or 'unknown'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "dirty": dirty,
+            "python": sys.version.split()[0],
+            "seconds": seconds,
+            "config": vars(args),
+            "summary": summary,
+            "rag_turns": rag_turns,
+            "analyses": analyses,
+            "tool_compaction": {name: {"calls": calls, "tokens_in": compactor.stats.tokens_in[name],
+                                       "tokens_out": compactor.stats.tokens_out[name]}
+                                for name, calls in compactor.stats.calls.items()},
+            "fixtures": {"replayed": fixtures.stats.replayed, "synthetic": fixtures.stats.synthetic,
+                         "recorded": fixtures.stats.recorded},
+        }, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"compared with {baseline.get('commit') or args.compare}:")
+        regressions = compare(summary, baseline["summary"], args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} metrics worse by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
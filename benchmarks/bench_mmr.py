@@ -0,0 +1,80 @@
+"""
+Benchmarks the MMR selection of mmr.py against langchain's maximal_marginal_relevance, which the langchain
+Qdrant vector store runs for as_retriever(search_type="mmr"). Both get the candidates as the Qdrant client
+returns them, a list of float lists, and the benchmark checks that both select the same candidates.
+
+Usage:
+    python -m benchmarks.bench_mmr
+    python -m benchmarks.bench_mmr --fetch-k 20 100 500 --dim 4096 --k 4 --output mmr.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from benchmarks.bench_quantization import synthetic_vectors
+from metrics import percentile
+from mmr import mmr_select
+
+
+def time_selection(select, queries, candidates):
+    latencies, selections = [], []
+    for query, vectors in zip(queries, candidates):
+        started = time.perf_counter()
+        selections.append(select(query, vectors))
+        latencies.append(time.perf_counter() - started)
+    return latencies, selections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    args = parser.parse_args()
+
+    results = []
+    for fetch_k in args.fetch_k:
+        vectors = synthetic_vectors(args.queries * (fetch_k + 1), args.dim, seed=fetch_k)
+        queries = vectors[: args.queries]
+        candidates = [
+            vectors[args.queries + i * fetch_k: args.queries + (i + 1) * fetch_k].tolist()
+            for i in range(args.queries)
+        ]
+
+        baseline, expected = time_selection(
+            lambda query, vectors: maximal_marginal_relevance(query, vectors, args.lambda_mult, args.k),
+            queries, candidates,
+        )
+        vectorized, selected = time_selection(
+            lambda query, vectors: mmr_select(query, vectors, args.k, args.lambda_mult),
+            queries, candidates,
+        )
+        results.append({
+            "fetch_k": fetch_k,
+            "langchain_p50_ms": 1000 * percentile(baseline, 50),
+            "langchain_p99_ms": 1000 * percentile(baseline, 99),
+            "vectorized_p50_ms": 1000 * percentile(vectorized, 50),
+            "vectorized_p99_ms": 1000 * percentile(vectorized, 99),
+            "speedup_p50": percentile(baseline, 50) / percentile(vectorized, 50),
+            "same_selection": sum(a == b for a, b in zip(expected, selected)) / len(selected),
+        })
+
+    print(f"k={args.k}, lambda={args.lambda_mult}, {args.dim} dims, {args.queries} queries per fetch_k")
+    print(f"{'fetch_k':>8}{'langchain p50':>15}{'p99':>10}{'vectorized p50':>16}{'p99':>10}{'speedup':>9}{'same':>7}")
+    for row in results:
+        print(f"{row['fetch_k']:>8}{row['langchain_p50_ms']:>15.2f}{row['langchain_p99_ms']:>10.2f}"
+              f"{row['vectorized_p50_ms']:>16.2f}{row['vectorized_p99_ms']:>10.2f}"
+              f"{row['speedup_p50']:>8.1f}x{row['same_selection']:>7.0%}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"k": args.k, "dim": args.dim, "queries": args.queries, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
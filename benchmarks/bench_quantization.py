@@ -0,0 +1,135 @@
+"""
+Benchmarks scalar and binary quantization of 4096-dim cosine vectors against the unquantized baseline.
+Quantization is ignored by the local mode of qdrant-client, so the benchmark needs a Qdrant server.
+
+The same vectors are upserted into one collection per quantization kind. For every query the exact top-k of
+the float32 collection is the ground truth, and each kind reports the estimated RAM of the searched vectors,
+p50/p99 search latency and recall@k.
+
+Usage:
+    python -m benchmarks.bench_quantization --url http://localhost:6333 --points 20000
+    python -m benchmarks.bench_quantization --url ... --source rag_documents
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from metrics import percentile
+from quantization import QUANTIZATION_KINDS, quantization_config, search_params, vectors_config
+
+
+def synthetic_vectors(points: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    # embeddings of real text are clustered by topic, uniform random vectors would overstate the difficulty
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=points)
+    return centers[labels] + 0.5 * rng.normal(size=(points, dim)).astype(np.float32)
+
+
+def collection_vectors(client: QdrantClient, collection_name: str, limit: int) -> np.ndarray:
+    vectors = []
+    offset = None
+    while len(vectors) < limit:
+        points, offset = client.scroll(collection_name, limit=256, offset=offset, with_vectors=True)
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    return np.array(vectors[:limit], dtype=np.float32)
+
+
+def estimated_ram_bytes(kind: str, points: int, dim: int) -> int:
+    bytes_per_vector = {"none": 4 * dim, "scalar": dim, "binary": dim // 8}[kind]
+    return points * bytes_per_vector
+
+
+def wait_for_green(client: QdrantClient, collection_name: str, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{collection_name} was not indexed within {timeout}s")
+        time.sleep(1)
+
+
+def search_ids(client, collection_name, query, k, params):
+    response = client.query_points(
+        collection_name, query=query.tolist(), limit=k, search_params=params, with_payload=False
+    )
+    return [point.id for point in response.points]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--source", default=None, help="collection to copy vectors from instead of synthetic ones")
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=None)
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, api_key=args.api_key, timeout=120)
+    if args.source:
+        vectors = collection_vectors(client, args.source, args.points)
+    else:
+        vectors = synthetic_vectors(args.points, args.dim)
+    points, dim = vectors.shape
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, points, size=args.queries)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    names = {kind: f"bench_quantization_{kind}" for kind in QUANTIZATION_KINDS}
+    try:
+        for kind, name in names.items():
+            client.recreate_collection(
+                name, vectors_config=vectors_config(dim, kind), quantization_config=quantization_config(kind)
+            )
+            for start in range(0, points, 256):
+                client.upsert(name, points=models.Batch(
+                    ids=list(range(start, min(start + 256, points))),
+                    vectors=vectors[start:start + 256].tolist(),
+                ))
+            wait_for_green(client, name)
+
+        exact = models.SearchParams(exact=True)
+        truth = [set(search_ids(client, names["none"], query, args.k, exact)) for query in queries]
+
+        results = []
+        for kind, name in names.items():
+            params = search_params(kind, args.oversampling)
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = search_ids(client, name, query, args.k, params)
+                latencies.append(time.perf_counter() - started)
+                recalls.append(len(expected.intersection(found)) / args.k)
+            results.append({
+                "quantization": kind,
+                "ram_mb": estimated_ram_bytes(kind, points, dim) / 2 ** 20,
+                "p50_ms": 1000 * percentile(latencies, 50),
+                "p99_ms": 1000 * percentile(latencies, 99),
+                f"recall@{args.k}": sum(recalls) / len(recalls),
+            })
+    finally:
+        for name in names.values():
+            client.delete_collection(name)
+
+    print(f"{points} vectors x {dim} dims, {len(queries)} queries")
+    print(f"{'quantization':<14}{'RAM MB':>10}{'p50 ms':>10}{'p99 ms':>10}{f'recall@{args.k}':>12}")
+    for row in results:
+        print(f"{row['quantization']:<14}{row['ram_mb']:>10.1f}{row['p50_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row[f'recall@{args.k}']:>12.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"points": points, "dim": dim, "queries": len(queries), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Load-tests the headless RAG API of rag_api.py. The service runs in-process on a local port with the stub
+embedder and chat model of benchmarks/stubs.py and an in-memory async Qdrant collection, so only the serving
+path is measured: routing, micro-batched embedding, retrieval, packing, generation and the per-conversation
+memory. Concurrent users each hold a conversation of several turns, every third turn is a follow-up that is
+condensed. The benchmark reports requests/s, the latency percentiles and how many embedding calls the queries
+took, for every batching window, a window of 0 embeds every query on its own.
+
+Usage:
+    python -m benchmarks.bench_rag_api
+    python -m benchmarks.bench_rag_api --users 64 --turns 5 --windows 0 2 5 --stream --output rag_api.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+from qdrant_client import AsyncQdrantClient
+
+from background_memory import BackgroundSummaryMemory
+from benchmarks.stubs import StubChatModel, StubEmbeddings, seed_collection, synthetic_chunks
+from context_packer import ContextPacker
+from embedding_cache import CachedEmbeddings
+from metrics import summarize_latencies
+from question_router import QuestionRouter
+from rag_api import ConversationStore, MicroBatchEmbedder, RAGService, create_app
+
+_TOPICS = ["qdrant", "cohere", "retriever", "embeddings", "memory", "prompt", "chain", "agent"]
+
+
+def question(user, turn):
+    if turn % 3 == 2:
+        return "And what about its limits?"
+    return f"How does the {_TOPICS[(user + turn) % len(_TOPICS)]} handle case {user}-{turn}?"
+
+
+async def build_service(args, window_ms):
+    stub_embeddings = StubEmbeddings(dim=args.dim, call_ms=args.embed_ms)
+    llm = StubChatModel(tokens=args.tokens, first_token_ms=args.first_token_ms, token_ms=args.token_ms)
+    client = AsyncQdrantClient(":memory:")
+    await seed_collection(client, stub_embeddings, "rag_documents", synthetic_chunks(args.chunks))
+    stub_embeddings.calls = stub_embeddings.texts = 0
+    service = RAGService(
+        llm=llm,
+        embedder=MicroBatchEmbedder(
+            CachedEmbeddings(stub_embeddings, path=":memory:").embed_queries,
+            window_ms=window_ms,
+            max_batch=args.max_batch if window_ms > 0 else 1,
+        ),
+        client=client,
+        conversations=ConversationStore(lambda: BackgroundSummaryMemory(
+            llm=llm, memory_key="chat_history", input_key="question", output_key="answer", return_messages=True,
+        )),
+        fetch_k=20,
+        # words instead of tiktoken tokens, the encoding is not downloaded for a benchmark
+        context_packer=ContextPacker(count_tokens=lambda text: len(text.split())),
+        question_router=QuestionRouter(),
+    )
+    return service, stub_embeddings
+
+
+async def run_user(session, url, user, turns, stream, latencies, first_tokens, errors):
+    conversation_id = f"user-{user}"
+    for turn in range(turns):
+        body = {"question": question(user, turn), "conversation_id": conversation_id, "stream": stream}
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{url}/chat", json=body) as response:
+                response.raise_for_status()
+                if not stream:
+                    await response.json()
+                else:
+                    first = None
+                    async for line in response.content:
+                        if first is None and line.startswith(b"data: {\"token\""):
+                            first = time.perf_counter() - started
+                        if line.startswith(b"data: {\"error\""):
+                            raise RuntimeError(line.decode())
+                    first_tokens.append(first)
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def load_test(args, window_ms):
+    service, stub_embeddings = await build_service(args, window_ms)
+    runner = web.AppRunner(create_app(service))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}"
+
+    latencies, first_tokens, errors = [], [], []
+    connector = aiohttp.TCPConnector(limit=args.users)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            run_user(session, url, user, args.turns, args.stream, latencies, first_tokens, errors)
+            for user in range(args.users)
+        ))
+        seconds = time.perf_counter() - started
+        stats = await (await session.get(f"{url}/stats")).json()
+    await runner.cleanup()
+
+    result = {
+        "window_ms": window_ms,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": len(latencies) / seconds,
+        "latency": summarize_latencies(latencies),
+        "embedding_calls": stub_embeddings.calls,
+        "mean_batch": stats["embedding_batches"]["mean_batch"],
+        "max_batch": stats["embedding_batches"]["max_batch"],
+        "condense_calls": stats["question_router"]["decisions"].get("condensed", 0),
+    }
+    if args.stream:
+        result["time_to_first_token"] = summarize_latencies([first for first in first_tokens if first is not None])
+    if errors:
+        print(f"window {window_ms}ms: {len(errors)} errors, e.g. {errors[0]}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=64, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=5, help="questions per conversation")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5], help="batching windows in ms")
+    parser.add_argument("--max-batch", type=int, default=96)
+    parser.add_argument("--stream", action="store_true", help="stream the answers as server-sent events")
+    parser.add_argument("--embed-ms", type=float, default=100.0, help="latency of an embedding call")
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per answer")
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks in the collection")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    args = parser.parse_args()
+
+    results = [asyncio.run(load_test(args, window_ms)) for window_ms in args.windows]
+
+    print(f"{args.users} users x {args.turns} turns, {'streamed' if args.stream else 'not streamed'}")
+    print(f"{'window':>8}{'req/s':>10}{'p50':>10}{'p99':>10}{'embed calls':>13}{'mean batch':>12}")
+    for result in results:
+        print(f"{result['window_ms']:>6.0f}ms{result['requests_per_second']:>10.1f}"
+              f"{result['latency']['p50_ms']:>8.0f}ms{result['latency']['p99_ms']:>8.0f}ms"
+              f"{result['embedding_calls']:>13}{result['mean_batch']:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"users": args.users, "turns": args.turns, "stream": args.stream, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
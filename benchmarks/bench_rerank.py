@@ -0,0 +1,90 @@
+"""
+Benchmarks the latency/quality trade-off of two-stage retrieval on the rag_documents collection. For every
+labeled question the single stage MMR retriever and the rerankers over RERANK_CANDIDATES first stage
+candidates each return 4 chunks, and the benchmark reports the hit rate (a returned chunk contains the
+expected text), the mean reciprocal rank of the first hit, the context size and the retrieval latency.
+
+The questions file holds one json object per line, e.g.
+    {"question": "How do I use Qdrant as a retriever?", "expected": "as_retriever"}
+
+Usage:
+    python -m benchmarks.bench_rerank --questions questions.jsonl --url ... --api-key ...
+    python -m benchmarks.bench_rerank --questions questions.jsonl --rerankers lexical --output rerank.json
+"""
+import argparse
+import json
+import time
+
+from langchain_cohere import CohereEmbeddings
+from qdrant_client import QdrantClient
+
+from ingestion import COLLECTION_NAME
+from metrics import summarize_latencies
+from mmr import MMRRetriever
+from reranker import CohereReranker, LexicalReranker, RerankingRetriever
+
+RERANKERS = {"cohere": CohereReranker, "lexical": LexicalReranker}
+
+
+def evaluate(retriever, questions):
+    latencies, hits, reciprocal_ranks, context_chars = [], [], [], []
+    for item in questions:
+        started = time.perf_counter()
+        documents = retriever.invoke(item["question"])
+        latencies.append(time.perf_counter() - started)
+        expected = item["expected"].lower()
+        ranks = [rank for rank, document in enumerate(documents, start=1) if expected in document.page_content.lower()]
+        hits.append(1.0 if ranks else 0.0)
+        reciprocal_ranks.append(1.0 / ranks[0] if ranks else 0.0)
+        context_chars.append(sum(len(document.page_content) for document in documents))
+    summary = summarize_latencies(latencies)
+    return {
+        "hit_rate": sum(hits) / len(hits),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "context_chars": sum(context_chars) / len(context_chars),
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", required=True, help="jsonl file of question/expected pairs")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50])
+    parser.add_argument("--rerankers", nargs="+", choices=sorted(RERANKERS), default=["lexical", "cohere"])
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    args = parser.parse_args()
+
+    with open(args.questions) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    client = QdrantClient(url=args.url, api_key=args.api_key)
+    embeddings = CohereEmbeddings(model="embed-english-v2.0")
+
+    def first_stage(k, fetch_k, lambda_mult):
+        return MMRRetriever(client=client, collection_name=args.collection, embeddings=embeddings,
+                            k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+
+    results = [{"mode": "mmr", "candidates": 20, **evaluate(first_stage(4, 20, 0.5), questions)}]
+    for kind in args.rerankers:
+        for candidates in args.candidates:
+            # a fresh reranker per run, so that the score cache does not hide the reranking latency
+            retriever = RerankingRetriever(
+                base_retriever=first_stage(candidates, candidates, 1.0), reranker=RERANKERS[kind](), top_n=4
+            )
+            results.append({"mode": f"rerank-{kind}", "candidates": candidates, **evaluate(retriever, questions)})
+
+    print(f"{len(questions)} questions, 4 chunks per question")
+    print(f"{'mode':<16}{'candidates':>11}{'hit rate':>10}{'MRR':>7}{'context chars':>15}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in results:
+        print(f"{row['mode']:<16}{row['candidates']:>11}{row['hit_rate']:>10.2f}{row['mrr']:>7.2f}"
+              f"{row['context_chars']:>15.0f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"questions": len(questions), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
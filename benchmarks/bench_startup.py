@@ -0,0 +1,140 @@
+"""
+Benchmarks the startup of the Streamlit apps so cold start and rerun latency can be tracked over time. Every
+measurement runs in a fresh interpreter:
+
+- the cold import time of the app modules and the modules they depend on,
+- the first run and the reruns of the investment advisor app under Streamlit's AppTest, a rerun toggles a
+  checkbox like a user does,
+- building the analysis tools through the tool registry the first time and taking them from it again.
+
+No API is called, the keys are dummies.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeats 5 --reruns 20 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from metrics import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "investment_advisor", "tool_registry", "yfinance_tools", "cohere_tools", "alpha_vantage_tools",
+    "finvizfinance_tools", "watchlist_batch", "resources", "rag_chain",
+]
+
+DUMMY_KEYS = {
+    "ALPHAVANTAGE_API_KEY": "dummy",
+    "COHERE_API_KEY": "dummy",
+    "OPEN_WEATHER_API_KEY": "dummy",
+    "OPENWEATHERMAP_API_KEY": "dummy",
+    "POLYGON_API_KEY": "dummy",
+    "TAVILY_API_KEY": "dummy",
+}
+
+_IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+_APP_SCRIPT = """
+import json, time
+from streamlit.testing.v1 import AppTest
+
+app = AppTest.from_file("investment_advisor.py", default_timeout=120)
+for key, value in {keys!r}.items():
+    app.secrets[key] = value
+started = time.perf_counter()
+app.run()
+first = time.perf_counter() - started
+reruns = []
+for _ in range({reruns}):
+    checkbox = app.checkbox[-1]
+    started = time.perf_counter()
+    checkbox.set_value(not checkbox.value).run()
+    reruns.append(time.perf_counter() - started)
+print(json.dumps({{"first_run": first, "reruns": reruns, "exceptions": len(app.exception)}}))
+"""
+
+_TOOLS_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from investment_advisor import get_tools
+imported = time.perf_counter() - started
+started = time.perf_counter()
+get_tools()
+first = time.perf_counter() - started
+started = time.perf_counter()
+get_tools()
+print(json.dumps({{"import": imported, "first_build": first, "cached": time.perf_counter() - started}}))
+"""
+
+
+def run_python(script):
+    env = {**os.environ, **DUMMY_KEYS}
+    completed = subprocess.run([sys.executable, "-W", "ignore", "-c", script], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns of the app per interpreter")
+    parser.add_argument("--output", default=None, help="write the results as json to this file")
+    args = parser.parse_args()
+
+    imports = {}
+    for module in args.modules:
+        seconds = [float(run_python(_IMPORT_SCRIPT.format(module=module))) for _ in range(args.repeats)]
+        imports[module] = {"median_ms": 1000 * statistics.median(seconds), "min_ms": 1000 * min(seconds)}
+
+    apps = [json.loads(run_python(_APP_SCRIPT.format(keys=DUMMY_KEYS, reruns=args.reruns)))
+            for _ in range(args.repeats)]
+    reruns = [seconds for app in apps for seconds in app["reruns"]]
+    app = {
+        "first_run_ms": 1000 * statistics.median(app["first_run"] for app in apps),
+        "rerun_p50_ms": 1000 * percentile(reruns, 50),
+        "rerun_p95_ms": 1000 * percentile(reruns, 95),
+        "exceptions": sum(app["exceptions"] for app in apps),
+    }
+
+    builds = [json.loads(run_python(_TOOLS_SCRIPT.format())) for _ in range(args.repeats)]
+    tools = {name: 1000 * statistics.median(build[name] for build in builds) for name in ("import", "first_build", "cached")}
+
+    print(f"{'module':<24}{'cold import median':>20}{'min':>10}")
+    for module, row in imports.items():
+        print(f"{module:<24}{row['median_ms']:>18.0f}ms{row['min_ms']:>8.0f}ms")
+    print(f"investment advisor app: first run {app['first_run_ms']:.0f}ms, rerun p50 {app['rerun_p50_ms']:.0f}ms, "
+          f"p95 {app['rerun_p95_ms']:.0f}ms, {app['exceptions']} exceptions")
+    print(f"analysis tools: first build {tools['first_build']:.0f}ms, cached {tools['cached']:.2f}ms")
+
+    if args.output:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                    text=True).stdout.strip()
+        except OSError:
+            commit = ""
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": commit,
+                "python": sys.version.split()[0],
+                "imports": imports,
+                "app": app,
+                "tools": tools,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
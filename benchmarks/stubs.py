@@ -0,0 +1,227 @@
+"""
+This module provides stand-ins for the Cohere embedder and chat model, so the pipelines can be benchmarked
+without API keys and without the variance of a remote service. The stubs wait like the remote calls would, a
+fixed latency per call plus a latency per text or token, and count their calls.
+
+Classes:
+    StubEmbeddings: Deterministic embeddings with the batch interface of CohereEmbeddings.
+    StubChatModel: A chat model answering with a fixed number of tokens, streaming and async included.
+    ScriptedAgentLLM: A completion model playing a Cohere ReAct agent that calls each of its tools once.
+
+Functions:
+    synthetic_chunks(count: int) -> List[str]:
+        Returns short chunks about the topics of the knowledge base.
+
+    chunk_points(embeddings, documents) -> Tuple[VectorParams, List[PointStruct]]:
+        Returns the vector config and the points of chunks in the payload layout of the ingestion pipeline.
+
+    seed_collection(client, embeddings, collection_name, documents) -> None:
+        Creates a collection in an async Qdrant client and stores synthetic chunks in it.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream, generate_from_stream
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from qdrant_client.http import models
+
+from ingest_pipeline import CONTENT_PAYLOAD_KEY, METADATA_PAYLOAD_KEY
+
+_TOPICS = ["qdrant", "cohere", "retriever", "embeddings", "memory", "prompt", "chain", "agent", "streamlit", "index"]
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Embeds texts into deterministic unit vectors seeded by the text hash. A call sleeps `call_ms` plus
+    `text_ms` per text, like a remote embedding request.
+
+    Args:
+        dim (int): The dimension of the vectors.
+        call_ms (float): The latency of a call in milliseconds.
+        text_ms (float): The additional latency per text in milliseconds.
+    """
+
+    def __init__(self, dim: int = 256, call_ms: float = 100.0, text_ms: float = 0.2):
+        self.dim = dim
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self.model = "stub"
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed(self, texts: List[str], *, input_type: Optional[str] = None) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return [self._vector(text) for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts, input_type="search_document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text], input_type="search_query")[0]
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Answers every prompt with `tokens` tokens, the first after `first_token_ms` and the others `token_ms`
+    apart, in the sync, async and streaming interfaces. With streaming=True chains stream the tokens like they
+    do with ChatCohere(streaming=True).
+    """
+
+    tokens: int = 40
+    first_token_ms: float = 150.0
+    token_ms: float = 5.0
+    streaming: bool = False
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        self.calls += 1
+        words = str(messages[-1].content).split()[-8:] or ["answer"]
+        return [f"{words[i % len(words)]} " for i in range(self.tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        # like ChatCohere, the chains stream through _generate
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+        tokens = self._tokens(messages)
+        time.sleep((self.first_token_ms + self.token_ms * (len(tokens) - 1)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+        tokens = self._tokens(messages)
+        await asyncio.sleep((self.first_token_ms + self.token_ms * (len(tokens) - 1)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            time.sleep((self.token_ms if i else self.first_token_ms) / 1000)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            await asyncio.sleep((self.token_ms if i else self.first_token_ms) / 1000)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# the tools as the Cohere ReAct prompt renders them, e.g. "def yf_get_ticker_info(ticker_symbol: str) -> List[Dict]:"
+_TOOL_RE = re.compile(r"^def ([\w-]+)\((.*?)\)", re.MULTILINE)
+
+
+class ScriptedAgentLLM(LLM):
+    """
+    Plays the completion model of a Cohere ReAct agent: while fewer than `tool_rounds` tool results are in the
+    prompt it plans and calls every tool of the prompt at once, passing `subject` for every parameter without a
+    default, then it answers with `answer_tokens` tokens. A completion takes `first_token_ms` plus `token_ms`
+    per further token.
+    """
+
+    subject: str = "NVDA"
+    tool_rounds: int = 1
+    answer_tokens: int = 200
+    first_token_ms: float = 300.0
+    token_ms: float = 10.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted_agent"
+
+    def _completion(self, prompt: str) -> str:
+        tools = [(name, params) for name, params in _TOOL_RE.findall(prompt) if name != "directly_answer"]
+        if tools and prompt.count("<results>") < self.tool_rounds:
+            actions = [
+                {"tool_name": name, "parameters": {
+                    param.split(":")[0].strip(): self.subject for param in params.split(",") if param.strip() and "=" not in param
+                }}
+                for name, params in tools
+            ]
+            return (f"Plan: I will gather the data about {self.subject} with the tools.\n"
+                    f"Action: ```json\n{json.dumps(actions)}\n```")
+        words = [f"{self.subject}"] + ["analysis", "shows", "solid", "data", "for", "the", "report"]
+        answer = " ".join(words[i % len(words)] for i in range(self.answer_tokens))
+        return f"Relevant Documents: 0\nCited Documents: 0\nAnswer: {answer}\nGrounded answer: {answer}"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        self.calls += 1
+        completion = self._completion(prompt)
+        time.sleep((self.first_token_ms + self.token_ms * (len(completion.split()) - 1)) / 1000)
+        return completion
+
+
+def synthetic_chunks(count: int) -> List[str]:
+    """Returns `count` short chunks about the topics of the knowledge base."""
+    return [
+        f"Chunk {i} explains how the {_TOPICS[i % len(_TOPICS)]} works together with the "
+        f"{_TOPICS[(i * 7 + 3) % len(_TOPICS)]} in step {i % 13}."
+        for i in range(count)
+    ]
+
+
+def chunk_points(embeddings: Embeddings, documents: List[str]) -> Tuple[models.VectorParams, List[models.PointStruct]]:
+    """
+    Embeds the documents and returns the vector config of their collection and their points with the payload
+    layout of the ingestion pipeline.
+
+    Args:
+        embeddings (Embeddings): The embeddings of the documents.
+        documents (List[str]): The texts of the chunks.
+
+    Returns:
+        Tuple[VectorParams, List[PointStruct]]: The vector config and the points.
+    """
+    vectors = embeddings.embed_documents(documents)
+    points = [
+        models.PointStruct(
+            id=i, vector=vector, payload={CONTENT_PAYLOAD_KEY: text, METADATA_PAYLOAD_KEY: {"source": f"doc-{i}"}}
+        )
+        for i, (text, vector) in enumerate(zip(documents, vectors))
+    ]
+    return models.VectorParams(size=len(vectors[0]), distance=models.Distance.COSINE), points
+
+
+async def seed_collection(client: Any, embeddings: Embeddings, collection_name: str, documents: List[str]) -> None:
+    """
+    Creates a collection in an async Qdrant client, e.g. AsyncQdrantClient(":memory:"), and stores the
+    documents with their embeddings and the payload layout of the ingestion pipeline.
+
+    Args:
+        client (AsyncQdrantClient): The client.
+        embeddings (Embeddings): The embeddings of the documents.
+        collection_name (str): The name of the collection.
+        documents (List[str]): The texts of the chunks.
+    """
+    vectors_config, points = chunk_points(embeddings, documents)
+    await client.create_collection(collection_name, vectors_config=vectors_config)
+    await client.upsert(collection_name, points=points)
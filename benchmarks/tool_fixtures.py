@@ -0,0 +1,213 @@
+"""
+This module provides record/replay fixtures of the agent tools, so the investment advisor can be benchmarked
+without Yahoo, Polygon and Tavily. In record mode every tool call goes to the real tool and its input, output
+and latency are stored in a JSON file; in replay mode the stored output is returned after the stored latency.
+Calls missing from the fixtures are answered with a deterministic synthetic output shaped like the output of the
+tool, so the benchmark also runs before anything was recorded.
+
+Classes:
+    FixtureStats: A data class counting recorded, replayed and synthetic tool calls.
+    ToolFixtures: Records and replays tool calls.
+"""
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import typing
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+from tool_compaction import TOOL_FIELDS
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+# the tools returning lists and the length of their synthetic lists
+_SYNTHETIC_RECORDS = {"polygon_financials": 4, "polygon_ticker_news": 10, "internet_search": 5}
+# the fields holding prose rather than short values
+_TEXT_FIELDS = ("content", "description", "sentiment_reasoning")
+
+TOOL_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "tool_calls.json")
+
+
+@dataclass
+class FixtureStats:
+    """Class for keeping track of the recorded, replayed and synthetic tool calls."""
+
+    recorded: int = 0
+    replayed: int = 0
+    synthetic: int = 0
+
+
+class ToolFixtures:
+    """
+    Records tool calls into a JSON file or replays them from it, keyed by tool name and input.
+
+    Args:
+        path (str): The path of the JSON file.
+        record (bool): Whether to call the real tools and record them instead of replaying.
+        latency_scale (float): The factor applied to the recorded latencies on replay, 0 replays instantly.
+        synthetic_ms (float): The latency of a synthetic output in milliseconds.
+        synthetic_items (int): The number of rows of a synthetic text output and of the unused fields of a
+            synthetic structured output.
+    """
+
+    def __init__(
+        self,
+        path: str = TOOL_FIXTURES_PATH,
+        record: bool = False,
+        latency_scale: float = 1.0,
+        synthetic_ms: float = 400.0,
+        synthetic_items: int = 20,
+    ):
+        self.path = path
+        self.record = record
+        self.latency_scale = latency_scale
+        self.synthetic_ms = synthetic_ms
+        self.synthetic_items = synthetic_items
+        self.stats = FixtureStats()
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._calls = json.load(f)
+
+    @staticmethod
+    def key(tool_name: str, tool_input: Any) -> str:
+        payload = json.dumps([tool_name, tool_input], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _synthetic(self, tool_name: str, tool_input: Any) -> str:
+        # deterministic and shaped like the real output, so the compaction keeps what it keeps of real data
+        seed = int(self.key(tool_name, tool_input)[:8], 16)
+        subject = " ".join(str(value) for value in _flatten(tool_input)) or tool_name
+        paths = TOOL_FIELDS.get(tool_name)
+        if paths is None:
+            # the text tools, e.g. the price history, are passed on unprojected
+            return "\n".join(
+                f"{subject} {tool_name} row {i}: {round((seed % 997) * (i + 1) / 7.0, 4)}"
+                for i in range(self.synthetic_items)
+            )
+        records = [
+            _synthetic_record(paths, seed + i, subject, self.synthetic_items)
+            for i in range(_SYNTHETIC_RECORDS.get(tool_name, 1))
+        ]
+        return json.dumps(records if tool_name in _SYNTHETIC_RECORDS else records[0])
+
+    def call(self, tool_name: str, tool_input: Any, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the output of a tool call, recorded from `compute` or replayed from the fixtures.
+
+        Args:
+            tool_name (str): The name of the tool.
+            tool_input (Any): The arguments of the call, part of the key.
+            compute (Callable[[], Any]): Calls the real tool.
+
+        Returns:
+            Any: The output of the tool.
+        """
+        key = self.key(tool_name, tool_input)
+        if self.record:
+            started = time.monotonic()
+            output = compute()
+            seconds = time.monotonic() - started
+            with self._lock:
+                self._calls[key] = {"tool": tool_name, "input": tool_input, "output": output, "seconds": seconds}
+                self.stats.recorded += 1
+            return output
+
+        with self._lock:
+            fixture = self._calls.get(key)
+            if fixture is None:
+                self.stats.synthetic += 1
+            else:
+                self.stats.replayed += 1
+        if fixture is None:
+            time.sleep(self.synthetic_ms * self.latency_scale / 1000)
+            return self._synthetic(tool_name, tool_input)
+        time.sleep(fixture["seconds"] * self.latency_scale)
+        return fixture["output"]
+
+    def save(self) -> None:
+        """Writes the recorded calls to the JSON file, replacing it at once."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            calls = dict(self._calls)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(calls, f, indent=1, ensure_ascii=False, default=str)
+        os.replace(self.path + ".tmp", self.path)
+
+    def wrap(self, tool: "BaseTool") -> "BaseTool":
+        """
+        Returns a copy of the tool whose calls are recorded or replayed. Name, description and arguments are
+        kept, so the agent sees the same tool, and the copy can be compacted like the original.
+
+        Args:
+            tool (BaseTool): The tool.
+
+        Returns:
+            BaseTool: The wrapped tool.
+        """
+        fixture_class = _fixture_class(type(tool), self)
+        return fixture_class.construct(**{name: getattr(tool, name) for name in tool.__fields__})
+
+
+def _flatten(value: Any) -> List[Any]:
+    if isinstance(value, dict):
+        return [item for inner in value.values() for item in _flatten(inner)]
+    if isinstance(value, (list, tuple)):
+        return [item for inner in value for item in _flatten(inner)]
+    return [value]
+
+
+def _synthetic_record(paths: List[str], seed: int, subject: str, extra_fields: int) -> Dict[str, Any]:
+    # a value for every field kept by the compaction, plus fields it drops like the real outputs have
+    record: Dict[str, Any] = {}
+    for i, path in enumerate(paths):
+        *parents, leaf = path.split(".")
+        node = record
+        for key in parents:
+            node = node.setdefault(key, {})
+        if leaf in _TEXT_FIELDS:
+            node[leaf] = " ".join(f"{subject} {leaf} sentence {j} about the outlook." for j in range(8))
+        elif i % 3 == 0:
+            node[leaf] = f"{subject} {leaf}"
+        else:
+            node[leaf] = round((seed % 997) * (i + 1) / 7.0, 6)
+    for i in range(extra_fields):
+        record[f"unused_{i}"] = round((seed % 991) * (i + 1) / 3.0, 6)
+    return record
+
+
+_fixture_classes: Dict[Tuple[type, ToolFixtures], type] = {}
+
+
+def _fixture_class(tool_class: type, fixtures: ToolFixtures) -> type:
+    # a subclass overriding _run(), below run() and so below the compaction and the callbacks
+    key = (tool_class, fixtures)
+    if key not in _fixture_classes:
+        from langchain_core.runnables import RunnableConfig
+
+        takes_run_manager = "run_manager" in inspect.signature(tool_class._run).parameters
+        # run() passes the config to the parameter annotated as RunnableConfig, e.g. of StructuredTool._run
+        config_param = next(
+            (name for name, hint in typing.get_type_hints(tool_class._run).items() if hint is RunnableConfig), None
+        )
+
+        def _run(self, *args, config: RunnableConfig, run_manager=None, **kwargs):
+            def compute():
+                extra = {"run_manager": run_manager} if takes_run_manager else {}
+                if config_param:
+                    extra[config_param] = config
+                return tool_class._run(self, *args, **kwargs, **extra)
+
+            output = fixtures.call(self.name, [list(args), kwargs], compute)
+            # e.g. the Tavily search returns (content, artifact), which JSON stores as a list
+            if getattr(self, "response_format", "content") == "content_and_artifact" and not isinstance(output, tuple):
+                output = tuple(output) if isinstance(output, list) and len(output) == 2 else (output, None)
+            return output
+
+        _fixture_classes[key] = type(f"Fixture{tool_class.__name__}", (tool_class,), {"_run": _run})
+    return _fixture_classes[key]
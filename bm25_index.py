@@ -0,0 +1,198 @@
+"""
+This module provides a compact BM25 inverted index over the chunk texts. It is built at ingestion time next to
+the dense vectors and stored as one compressed numpy archive holding the vocabulary, the postings in CSR layout
+and the chunks themselves. Exact identifiers such as API names, class names or ticker symbols are kept as
+single tokens, which is what dense embeddings tend to miss.
+
+Classes:
+    BM25Builder: Collects the chunks of an ingestion run and writes the index.
+    BM25Index: A loaded index that scores queries with vectorized BM25.
+
+Functions:
+    tokenize(text: str) -> List[str]:
+        Splits a text into lowercase word and identifier tokens.
+
+    load_bm25_index(path: str) -> Optional[BM25Index]:
+        Returns the process-wide loaded index, reloaded when the archive was rewritten.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+BM25_INDEX_PATH = "bm25_index.npz"
+
+# identifiers like langchain_community.vectorstores.Qdrant are kept whole and also split at the dots
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*|\d+(?:\.\d+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into lowercase word and identifier tokens.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        List[str]: The tokens, dotted identifiers followed by their parts.
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall(text):
+        token = match.lower()
+        tokens.append(token)
+        if "." in token and not token[0].isdigit():
+            tokens.extend(token.split("."))
+    return tokens
+
+
+class BM25Builder:
+    """
+    Collects the chunks of an ingestion run and writes the BM25 index. The texts, metadata and postings of all
+    chunks are held in memory until save().
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._docs: List[dict] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+    def add(self, doc_id: str, document: Document) -> None:
+        """
+        Adds a chunk to the index.
+
+        Args:
+            doc_id (str): The id of the chunk, i.e. its Qdrant point id.
+            document (Document): The chunk.
+        """
+        position = len(self._ids)
+        counts = Counter(tokenize(document.page_content))
+        for term, tf in counts.items():
+            self._postings[term].append((position, tf))
+        self._ids.append(doc_id)
+        self._docs.append({"page_content": document.page_content, "metadata": document.metadata})
+        self._lengths.append(sum(counts.values()))
+
+    def save(self, path: str = BM25_INDEX_PATH) -> None:
+        """
+        Writes the index atomically to a compressed numpy archive.
+
+        Args:
+            path (str): The path of the archive.
+        """
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_positions, tfs = [], []
+        for i, term in enumerate(terms):
+            postings = self._postings[term]
+            offsets[i + 1] = offsets[i] + len(postings)
+            doc_positions.extend(position for position, _ in postings)
+            tfs.extend(tf for _, tf in postings)
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            terms=np.frombuffer(json.dumps(terms).encode("utf-8"), dtype=np.uint8),
+            ids=np.frombuffer(json.dumps(self._ids).encode("utf-8"), dtype=np.uint8),
+            docs=np.frombuffer(json.dumps(self._docs).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            doc_positions=np.asarray(doc_positions, dtype=np.uint32),
+            tfs=np.asarray(tfs, dtype=np.uint16),
+            lengths=np.asarray(self._lengths, dtype=np.uint32),
+        )
+        os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """
+    A loaded BM25 index.
+
+    Args:
+        path (str): The path of the archive written by BM25Builder.save.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        with np.load(path) as archive:
+            terms = json.loads(archive["terms"].tobytes().decode("utf-8"))
+            self.ids: List[str] = json.loads(archive["ids"].tobytes().decode("utf-8"))
+            self._docs: List[dict] = json.loads(archive["docs"].tobytes().decode("utf-8"))
+            self._offsets = archive["offsets"]
+            self._doc_positions = archive["doc_positions"]
+            self._tfs = archive["tfs"].astype(np.float32)
+            lengths = archive["lengths"].astype(np.float32)
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        n = len(self.ids)
+        document_frequency = np.diff(self._offsets).astype(np.float32)
+        self._idf = np.log(1.0 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = float(lengths.mean()) if n else 0.0
+        self._length_norm = k1 * (1 - b + b * lengths / (average_length or 1.0))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, position: int) -> Document:
+        record = self._docs[position]
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """
+        Returns the k chunks with the highest BM25 score for a query.
+
+        Args:
+            query (str): The query.
+            k (int): The number of chunks to return.
+
+        Returns:
+            List[Tuple[Document, float]]: The chunks and their scores, best first.
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            positions = self._doc_positions[start:end]
+            tf = self._tfs[start:end]
+            scores[positions] += self._idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[positions])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.document(int(position)), float(scores[position])) for position in ranked]
+
+
+_loaded: Dict[str, Tuple[int, BM25Index]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_bm25_index(path: str = BM25_INDEX_PATH) -> Optional[BM25Index]:
+    """
+    Returns the process-wide loaded index, reloaded when the archive was rewritten by an ingestion run.
+
+    Args:
+        path (str): The path of the archive.
+
+    Returns:
+        BM25Index: The index, or None if no index was built yet.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        loaded = _loaded.get(path)
+        if loaded is None or loaded[0] != mtime:
+            loaded = (mtime, BM25Index(path))
+            _loaded[path] = loaded
+            print(f"bm25 index with {len(loaded[1])} chunks loaded !")
+        return loaded[1]
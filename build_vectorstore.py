@@ -1,15 +1,19 @@
 import os
+import argparse
+import qdrant_client
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import Qdrant
 from langchain_cohere import CohereEmbeddings
 import streamlit as st
 
-
-
-os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
-QDRANT_HOST = st.secrets["QDRANT_HOST"]
-QDRANT_API_KEY = st.secrets["QDRANT_API_KEY"]
+from bm25_index import BM25_INDEX_PATH, BM25Builder
+from embedding_cache import CachedEmbeddings
+from ingest_pipeline import IngestPipeline
+from ingestion import COLLECTION_NAME, MANIFEST_PATH, incremental_ingest
+from local_index import LOCAL_INDEX_DIR, export_collection
+from quantization import QUANTIZATION_KINDS, enable_quantization
+from rate_limit import TokenBucket
+from streaming_loader import stream_chunks
 
 
 web_links = ["https://python.langchain.com/v0.2/docs/introduction",
@@ -20,22 +24,91 @@ web_links = ["https://python.langchain.com/v0.2/docs/introduction",
              "https://python.langchain.com/v0.2/docs/integrations/retrievers",
              "https://python.langchain.com/v0.2/docs/integrations/vectorstores/qdrant",
              "https://python.langchain.com/v0.2/docs/integrations/providers/cohere/#react-agent"]
- 
 
-loader = WebBaseLoader(web_links)
-document=loader.load()
 
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-texts = text_splitter.split_documents(document)
-
-embeddings = CohereEmbeddings(model = "embed-english-v2.0")
-
-qdrant = Qdrant.from_documents(
-    document,
-    embeddings,
-    url=QDRANT_HOST,
-    api_key=QDRANT_API_KEY,
-    prefer_grpc=True,
-    collection_name="rag_documents",
-    force_recreate=True,
-)
+
+
+def load_chunks(links):
+    loader = WebBaseLoader(links)
+    document = loader.load()
+    return text_splitter.split_documents(document)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the web links into the rag_documents collection.")
+    parser.add_argument("--full", action="store_true",
+                        help="drop the collection and re-embed the whole corpus instead of only new or changed chunks")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="path of the chunk hash -> point id manifest")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding call and upsert")
+    parser.add_argument("--embed-workers", type=int, default=4, help="concurrent embedding calls")
+    parser.add_argument("--upsert-workers", type=int, default=2, help="concurrent upserts")
+    parser.add_argument("--calls-per-minute", type=float, default=0,
+                        help="embedding calls per minute allowed by the Cohere plan, 0 for unlimited")
+    parser.add_argument("--stream", action="store_true",
+                        help="fetch and split the pages concurrently and embed chunks as they arrive")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent page fetches in streaming mode")
+    parser.add_argument("--export-local", nargs="?", const=LOCAL_INDEX_DIR, default=None, metavar="DIR",
+                        help="publish a local FAISS snapshot of the collection for VECTOR_BACKEND = 'local'")
+    parser.add_argument("--quantization", choices=QUANTIZATION_KINDS, default=None,
+                        help="quantize the stored vectors, switching an existing collection if given")
+    parser.add_argument("--no-sparse", action="store_true",
+                        help="skip building the BM25 index used by RETRIEVAL_MODE = 'hybrid'. The index keeps the "
+                             "text, metadata and postings of every chunk in memory until it is written, so its "
+                             "memory grows with the corpus; it is skipped with --stream unless --sparse is given")
+    parser.add_argument("--sparse", action="store_true",
+                        help="build the BM25 index also with --stream, at the memory cost described for --no-sparse")
+    args = parser.parse_args()
+
+    os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
+    QDRANT_HOST = st.secrets["QDRANT_HOST"]
+    QDRANT_API_KEY = st.secrets["QDRANT_API_KEY"]
+
+    if args.stream:
+        texts = stream_chunks(web_links, text_splitter, concurrency=args.concurrency)
+    else:
+        texts = load_chunks(web_links)
+    embeddings = CachedEmbeddings(CohereEmbeddings(model="embed-english-v2.0"))
+    client = qdrant_client.QdrantClient(
+        url=QDRANT_HOST,
+        api_key=QDRANT_API_KEY,
+        prefer_grpc=True,
+    )
+
+    if args.full:
+        client.delete_collection(COLLECTION_NAME)
+
+    pipeline = IngestPipeline(
+        client,
+        embeddings,
+        batch_size=args.batch_size,
+        embed_workers=args.embed_workers,
+        upsert_workers=args.upsert_workers,
+        rate_limiter=TokenBucket.per_minute(args.calls_per_minute, burst=args.embed_workers)
+        if args.calls_per_minute else None,
+    )
+    if args.quantization and client.collection_exists(COLLECTION_NAME):
+        enable_quantization(client, COLLECTION_NAME, args.quantization)
+
+    # the builder holds the whole corpus, which would undo the flat memory of the streaming mode
+    build_sparse = args.sparse or not (args.no_sparse or args.stream)
+    if args.stream and not build_sparse and not args.no_sparse:
+        print(f"bm25 index skipped in streaming mode, pass --sparse to rebuild {BM25_INDEX_PATH}")
+    sparse_index = BM25Builder() if build_sparse else None
+    result = incremental_ingest(client, COLLECTION_NAME, texts, embeddings,
+                                manifest_path=args.manifest, pipeline=pipeline,
+                                quantization=args.quantization or "none", sparse_index=sparse_index)
+    print(f"{result.added} chunks added, {result.unchanged} unchanged, {result.deleted} deleted")
+    if sparse_index is not None:
+        sparse_index.save(BM25_INDEX_PATH)
+        print(f"bm25 index written to {BM25_INDEX_PATH}")
+    print(f"embedding cache: {embeddings.stats.memory_hits + embeddings.stats.disk_hits} hits, "
+          f"{embeddings.stats.misses} misses")
+
+    if args.export_local:
+        os.makedirs(args.export_local, exist_ok=True)
+        print(f"local snapshot {export_collection(client, COLLECTION_NAME, args.export_local)} published")
+
+
+if __name__ == "__main__":
+    main()
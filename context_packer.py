@@ -0,0 +1,157 @@
+"""
+This module provides the context packing stage between retrieval and the "stuff" combine prompt. The chunks
+scraped from the docs carry navigation text and runs of blank lines, and retrievers return overlapping chunks,
+which all end up in the prompt. The packer strips the boilerplate, drops near-duplicate chunks, orders the
+chunks by relevance and keeps as many as fit into a token budget counted with tiktoken.
+
+Classes:
+    ContextPackerStats: A data class counting the chunks and tokens going in and out of the packer.
+    ContextPacker: Packs retrieved chunks into a token budget.
+
+Functions:
+    strip_boilerplate(text: str) -> str:
+        Removes navigation lines and redundant whitespace from a scraped chunk.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, List, Optional
+
+from langchain_core.documents import Document
+
+from token_count import tiktoken_counter
+
+# relevance score set by the retrievers, higher is more relevant
+RELEVANCE_KEY = "_relevance"
+
+# navigation and footer lines of the python.langchain.com pages loaded by build_vectorstore.py
+_BOILERPLATE_LINES = frozenset({
+    "skip to main content", "on this page", "edit this page", "previous", "next", "community", "twitter",
+    "github", "python", "js/ts", "more", "homepage", "blog", "youtube", "integrations", "api reference",
+    "search", "docs", "v0.2", "latest", "was this page helpful?", "you can also leave detailed feedback on github.",
+})
+_BOILERPLATE_RE = re.compile(r"^(copyright ©|edit this page|was this page helpful|💬|🦜️🔗)", re.IGNORECASE)
+_SPACES_RE = re.compile(r"[ \t\u00a0\u200b]+")
+
+
+def strip_boilerplate(text: str) -> str:
+    """
+    Removes navigation lines, zero-width characters and redundant whitespace from a scraped chunk.
+
+    Args:
+        text (str): The text of the chunk.
+
+    Returns:
+        str: The cleaned text.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = _SPACES_RE.sub(" ", line).strip()
+        if not line or line.lower() in _BOILERPLATE_LINES or _BOILERPLATE_RE.match(line):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    words = text.lower().split()
+    if len(words) <= size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+@dataclass
+class ContextPackerStats:
+    """Class for keeping track of the chunks and tokens going in and out of the packer."""
+
+    queries: int = 0
+    chunks_in: int = 0
+    chunks_out: int = 0
+    duplicates: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+class ContextPacker:
+    """
+    Packs the retrieved chunks of a query into a token budget.
+
+    Args:
+        max_tokens (int): The token budget of the packed chunks.
+        duplicate_threshold (float): The Jaccard similarity of the word 3-grams above which a chunk counts as
+            a near-duplicate of a more relevant one.
+        encoding_name (str): The tiktoken encoding used to count tokens.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text. Defaults to the tiktoken encoding.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        duplicate_threshold: float = 0.8,
+        encoding_name: str = "cl100k_base",
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.encoding_name = encoding_name
+        self._count_tokens = count_tokens or tiktoken_counter(encoding_name)
+        self.stats = ContextPackerStats()
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        return self._count_tokens(text)
+
+    def pack(self, documents: List[Document]) -> List[Document]:
+        """
+        Strips boilerplate, drops near-duplicates and returns the most relevant chunks fitting into the budget.
+        Chunks are ordered by their relevance score if the retriever set one, else the retriever order is kept.
+
+        Args:
+            documents (List[Document]): The retrieved chunks.
+
+        Returns:
+            List[Document]: The packed chunks, most relevant first.
+        """
+        if all(RELEVANCE_KEY in document.metadata for document in documents):
+            documents = sorted(documents, key=lambda document: -document.metadata[RELEVANCE_KEY])
+
+        tokens_in = sum(self.count_tokens(document.page_content) for document in documents)
+        packed: List[Document] = []
+        kept_shingles: List[FrozenSet[str]] = []
+        duplicates = 0
+        budget = self.max_tokens
+        for document in documents:
+            text = strip_boilerplate(document.page_content)
+            if not text:
+                continue
+            shingles = _shingles(text)
+            if any(len(shingles & kept) / len(shingles | kept) >= self.duplicate_threshold for kept in kept_shingles):
+                duplicates += 1
+                continue
+            tokens = self.count_tokens(text)
+            if tokens > budget:
+                # later chunks may still fit, but a partial chunk is only used to not return nothing
+                if packed:
+                    continue
+                while tokens > budget and text:
+                    text = text[: len(text) * budget // tokens]
+                    tokens = self.count_tokens(text)
+                if not text:
+                    continue
+            packed.append(Document(page_content=text, metadata=document.metadata))
+            kept_shingles.append(shingles)
+            budget -= tokens
+        tokens_out = self.max_tokens - budget
+
+        with self._lock:
+            self.stats.queries += 1
+            self.stats.chunks_in += len(documents)
+            self.stats.chunks_out += len(packed)
+            self.stats.duplicates += duplicates
+            self.stats.tokens_in += tokens_in
+            self.stats.tokens_out += tokens_out
+        return packed
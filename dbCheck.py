@@ -1,9 +1,13 @@
 import qdrant_client
 import streamlit as st
 
+from quantization import quantization_config, vectors_config
+
 
 QDRANT_HOST = st.secrets["QDRANT_HOST"]
 QDRANT_API_KEY = st.secrets["QDRANT_API_KEY"]
+# "none", "scalar" (int8) or "binary"
+QDRANT_QUANTIZATION = st.secrets.get("QDRANT_QUANTIZATION", "none")
 
 
 # Creating a persistant DB
@@ -13,11 +17,9 @@ client = qdrant_client.QdrantClient(
 )
 # create_collection
 collection_name = "rag_documents"
-vector_config = qdrant_client.http.models.VectorParams(
-    size = 4096,
-    distance = qdrant_client.http.models.Distance.COSINE
-)
+vector_config = vectors_config(4096, QDRANT_QUANTIZATION)
 client.recreate_collection(
     collection_name = collection_name,
     vectors_config = vector_config,
+    quantization_config = quantization_config(QDRANT_QUANTIZATION),
 )
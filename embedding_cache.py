@@ -0,0 +1,182 @@
+"""
+This module provides a cache-backed wrapper around any langchain embeddings model. Embeddings are keyed by
+(model, input type, text hash) and kept in an in-memory LRU tier in front of an on-disk SQLite store, so
+repeated questions and re-ingested chunks do not cost a remote embedding call.
+
+Classes:
+    CacheStats: A data class counting cache hits and misses.
+    CachedEmbeddings: An Embeddings implementation that caches the results of another Embeddings.
+"""
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite"
+
+
+@dataclass
+class CacheStats:
+    """Class for keeping track of embedding cache hits and misses."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+
+def _embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    # CohereEmbeddings embeds several queries in one request, the Embeddings interface only one per call
+    embed = getattr(embeddings, "embed", None)
+    if len(texts) > 1 and embed is not None and "input_type" in inspect.signature(embed).parameters:
+        return embed(texts, input_type="search_query")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that are looked up in an LRU memory tier, then in a SQLite store and only then computed
+    by the wrapped embeddings. The SQLite store is evicted by least recent access once it grows above
+    max_bytes.
+
+    Args:
+        embeddings (Embeddings): The embeddings to cache, e.g. CohereEmbeddings.
+        model (str): The model name used in the cache key. Defaults to the model of the wrapped embeddings.
+        path (str): The path of the SQLite store. Use ":memory:" for a process local cache.
+        max_bytes (int): The maximal size of the stored vectors before the least recently used are evicted.
+        memory_entries (int): The number of vectors kept in the in-memory LRU tier.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: Optional[str] = None,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_bytes: int = 512 * 1024 * 1024,
+        memory_entries: int = 10_000,
+    ):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._db.commit()
+        self._stored_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def _key(self, input_type: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{input_type}:{digest}"
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        missing = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                self._memory.move_to_end(key)
+                found[key] = vector
+        self.stats.memory_hits += len(found)
+
+        # sqlite limits the number of host parameters per statement
+        for start in range(0, len(missing), 500):
+            batch = missing[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f", blob).tolist()
+                found[key] = vector
+                self._remember(key, vector)
+            if rows:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                )
+                self.stats.disk_hits += len(rows)
+        self._db.commit()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        now = time.time()
+        for key, vector in vectors.items():
+            blob = array("f", vector).tobytes()
+            # a key another thread stored meanwhile is kept and not counted twice
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", (key, blob, len(blob), now)
+            )
+            if cursor.rowcount > 0:
+                self._stored_bytes += len(blob)
+            self._remember(key, vector)
+        self._evict()
+        self._db.commit()
+
+    def _evict(self) -> None:
+        while self._stored_bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._stored_bytes = 0
+                return
+            self._db.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            self._stored_bytes -= sum(size for _, size in rows)
+            self.stats.evictions += len(rows)
+
+    def _embed(self, texts: List[str], input_type: str) -> List[List[float]]:
+        keys = [self._key(input_type, text) for text in texts]
+        with self._lock:
+            found = self._load(keys)
+        to_compute = {key: text for key, text in zip(keys, texts) if key not in found}
+        if to_compute:
+            with self._lock:
+                self.stats.misses += len(to_compute)
+            if input_type == "query":
+                computed = _embed_queries(self.embeddings, list(to_compute.values()))
+            else:
+                computed = self.embeddings.embed_documents(list(to_compute.values()))
+            new_vectors = dict(zip(to_compute.keys(), computed))
+            with self._lock:
+                self._store(new_vectors)
+            found.update(new_vectors)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds search documents, computing only the ones that are not cached."""
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a query text, computing it only if it is not cached."""
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several query texts, the ones that are not cached in one call if the embeddings support it."""
+        return self._embed(texts, "query")
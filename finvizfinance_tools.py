@@ -1,6 +1,8 @@
 from finvizfinance.quote import finvizfinance
 from langchain.tools import StructuredTool
 
+from market_data_cache import cached_fetch
+
 def get_fundamental_data(ticker_symbol):
  """
     Retrieves fundamental data about a specified stock market ticker symbol.
@@ -11,8 +13,8 @@ def get_fundamental_data(ticker_symbol):
     Returns:
         dict: A dictionary containing the fundamental data of the stock.
 """
- stock = finvizfinance(ticker_symbol)
- return stock.ticker_fundament()
+ return cached_fetch("finviz", "ticker_fundament", ticker_symbol, "fundamentals",
+                     lambda: finvizfinance(ticker_symbol).ticker_fundament())
 
 
 def get_fundamental_data_tool():
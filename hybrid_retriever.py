@@ -0,0 +1,75 @@
+"""
+This module provides a hybrid retriever that runs the dense retriever and a BM25 search over the chunk texts
+concurrently and fuses both rankings with reciprocal-rank fusion.
+
+Classes:
+    HybridRetriever: A retriever fusing dense and sparse rankings.
+
+Functions:
+    reciprocal_rank_fusion(rankings: List[List[Document]], k: int) -> List[Tuple[Document, float]]:
+        Fuses several rankings of documents into one.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25_index import BM25_INDEX_PATH, load_bm25_index
+from context_packer import RELEVANCE_KEY
+
+# runs the dense searches next to the sparse ones, shared by all retrievers of the process
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid")
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    Fuses several rankings of documents into one. A document scores the sum of 1 / (k + rank) over the
+    rankings it appears in, and documents are identified by their content.
+
+    Args:
+        rankings (List[List[Document]]): The rankings, best first. The first ranking wins for duplicates.
+        k (int): The constant damping the influence of the top ranks.
+
+    Returns:
+        List[Tuple[Document, float]]: The fused ranking with the fusion scores, best first.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [(documents[key], scores[key]) for key in ordered]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves with the dense retriever and BM25 concurrently and returns the `k` best chunks of the fused
+    ranking. Falls back to the dense ranking as long as no BM25 index was built.
+    """
+
+    dense_retriever: BaseRetriever
+    sparse_index_path: str = BM25_INDEX_PATH
+    k: int = 4
+    sparse_k: int = 10
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense_future = _executor.submit(
+            self.dense_retriever.invoke, query, {"callbacks": run_manager.get_child()}
+        )
+        index = load_bm25_index(self.sparse_index_path)
+        sparse = [document for document, _ in index.search(query, self.sparse_k)] if index else []
+        dense = dense_future.result()
+        fused = reciprocal_rank_fusion([dense, sparse], self.rrf_k)[: self.k]
+        # the scores go on copies, the documents of the BM25 index and the local docstore are shared by all sessions
+        return [
+            Document(page_content=document.page_content, metadata={**document.metadata, RELEVANCE_KEY: score})
+            for document, score in fused
+        ]
@@ -0,0 +1,230 @@
+"""
+This module provides a pipelined ingester that embeds chunks in batches on a bounded worker pool and
+upserts the resulting points into Qdrant in parallel, so that upserts overlap with the embedding of the
+next batches. Embedding calls are throttled by a token bucket and retried with jittered back-off.
+
+Classes:
+    IngestStats: A data class with throughput and latency figures of an ingestion run.
+    IngestPipeline: The chunk -> embed -> upsert pipeline.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+from metrics import summarize_latencies
+from rate_limit import TokenBucket, retry_with_jitter
+
+# payload keys used by the langchain Qdrant vector store, so that the chat retriever can read our points
+CONTENT_PAYLOAD_KEY = "page_content"
+METADATA_PAYLOAD_KEY = "metadata"
+
+
+@dataclass
+class IngestStats:
+    """Class for keeping track of the throughput of an ingestion run."""
+
+    chunks: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    embed_latencies: List[float] = field(default_factory=list)
+    upsert_latencies: List[float] = field(default_factory=list)
+    throttled_seconds: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        embed = summarize_latencies(self.embed_latencies)
+        upsert = summarize_latencies(self.upsert_latencies)
+        return (
+            f"{self.chunks} chunks in {self.batches} batches, {self.elapsed:.1f}s, "
+            f"{self.chunks_per_second:.1f} chunks/s | "
+            f"embed p50 {embed['p50_ms']:.0f} ms p95 {embed['p95_ms']:.0f} ms p99 {embed['p99_ms']:.0f} ms | "
+            f"upsert p50 {upsert['p50_ms']:.0f} ms | throttled {self.throttled_seconds:.1f}s"
+        )
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestPipeline:
+    """
+    Embeds (point id, chunk) pairs in batches on a bounded worker pool and upserts them in parallel.
+    At most `max_pending_batches` batches are in flight, so memory stays bounded for any input size.
+
+    Args:
+        client (QdrantClient): The Qdrant client to upsert into.
+        embeddings (Embeddings): The embeddings used for the chunks.
+        batch_size (int): The number of chunks per embedding call and upsert.
+        embed_workers (int): The number of concurrent embedding calls.
+        upsert_workers (int): The number of concurrent upserts.
+        rate_limiter (TokenBucket): Throttles the embedding calls, e.g. TokenBucket.per_minute(100).
+        max_retries (int): The number of retries of a failing embedding call or upsert.
+        max_pending_batches (int): The number of batches embedded or upserted at the same time.
+        progress (Callable): Called with a progress line every `report_every` seconds, None to disable.
+        report_every (float): The interval of the progress reports in seconds.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        embed_workers: int = 4,
+        upsert_workers: int = 2,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 5,
+        max_pending_batches: Optional[int] = None,
+        progress: Optional[Callable[[str], None]] = print,
+        report_every: float = 5.0,
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+        # the local (in-memory or on-disk) mode of qdrant-client does not support concurrent writes
+        self.upsert_workers = 1 if isinstance(getattr(client, "_client", None), QdrantLocal) else upsert_workers
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.max_pending_batches = max_pending_batches or 2 * (embed_workers + upsert_workers)
+        self.progress = progress
+        self.report_every = report_every
+        # the stats of a run are updated by the embed and upsert workers
+        self._stats_lock = threading.Lock()
+
+    def _embed(self, texts: List[str], stats: IngestStats) -> List[List[float]]:
+        def call():
+            if self.rate_limiter is not None:
+                throttled = self.rate_limiter.acquire()
+                with self._stats_lock:
+                    stats.throttled_seconds += throttled
+            started = time.monotonic()
+            vectors = self.embeddings.embed_documents(texts)
+            with self._stats_lock:
+                stats.embed_latencies.append(time.monotonic() - started)
+            return vectors
+
+        return retry_with_jitter(call, max_retries=self.max_retries)
+
+    def _upsert(self, collection_name: str, points: List[models.PointStruct], stats: IngestStats) -> None:
+        def call():
+            started = time.monotonic()
+            self.client.upsert(collection_name=collection_name, points=points)
+            with self._stats_lock:
+                stats.upsert_latencies.append(time.monotonic() - started)
+
+        retry_with_jitter(call, max_retries=self.max_retries)
+
+    def run(
+        self,
+        collection_name: str,
+        items: Iterable[Tuple[str, Document]],
+        create_collection: Optional[Callable[[int], None]] = None,
+    ) -> IngestStats:
+        """
+        Embeds and upserts all (point id, chunk) pairs.
+
+        Args:
+            collection_name (str): The collection to upsert into.
+            items (Iterable[Tuple[str, Document]]): The point ids and chunks, consumed lazily.
+            create_collection (Callable): Called once with the vector size before the first upsert.
+
+        Returns:
+            IngestStats: The throughput and latency figures of the run.
+        """
+        stats = IngestStats()
+        slots = threading.BoundedSemaphore(self.max_pending_batches)
+        collection_lock = threading.Lock()
+        collection_ready = create_collection is None
+        errors: List[BaseException] = []
+        futures: List[Future] = []
+        last_report = time.monotonic()
+
+        embed_pool = ThreadPoolExecutor(self.embed_workers, thread_name_prefix="embed")
+        upsert_pool = ThreadPoolExecutor(self.upsert_workers, thread_name_prefix="upsert")
+
+        def upsert(points: List[models.PointStruct]) -> None:
+            try:
+                self._upsert(collection_name, points, stats)
+                with self._stats_lock:
+                    stats.chunks += len(points)
+                    stats.batches += 1
+            finally:
+                slots.release()
+
+        def check(future: Future) -> None:
+            if future.exception() is not None:
+                errors.append(future.exception())
+
+        def embed(batch: List[Tuple[str, Document]]) -> None:
+            nonlocal collection_ready
+            try:
+                vectors = self._embed([doc.page_content for _, doc in batch], stats)
+                if not collection_ready:
+                    with collection_lock:
+                        if not collection_ready:
+                            create_collection(len(vectors[0]))
+                            collection_ready = True
+                points = [
+                    models.PointStruct(
+                        id=point_id,
+                        vector=vector,
+                        payload={CONTENT_PAYLOAD_KEY: doc.page_content, METADATA_PAYLOAD_KEY: doc.metadata},
+                    )
+                    for (point_id, doc), vector in zip(batch, vectors)
+                ]
+                future = upsert_pool.submit(upsert, points)
+                future.add_done_callback(check)
+                futures.append(future)
+            except BaseException:
+                slots.release()
+                raise
+
+        try:
+            for batch in _batched(items, self.batch_size):
+                slots.acquire()
+                if errors:
+                    slots.release()
+                    break
+                future = embed_pool.submit(embed, batch)
+                future.add_done_callback(check)
+                futures.append(future)
+                if self.progress is not None and time.monotonic() - last_report >= self.report_every:
+                    with self._stats_lock:
+                        report = stats.report()
+                    self.progress(report)
+                    last_report = time.monotonic()
+        finally:
+            embed_pool.shutdown(wait=True)
+            upsert_pool.shutdown(wait=True)
+
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+        stats.finished = time.monotonic()
+        if self.progress is not None:
+            self.progress(stats.report())
+        return stats
@@ -0,0 +1,248 @@
+"""
+This module provides incremental, content-hashed ingestion of document chunks into a Qdrant collection.
+Every chunk is identified by a hash of its content and metadata, and a local manifest maps each hash to the
+id of the point stored in Qdrant. Only new or changed chunks are embedded and upserted, and points whose
+chunks disappeared from the corpus are deleted.
+
+Classes:
+    IngestResult: A data class summarizing what an ingestion run changed.
+
+Functions:
+    chunk_hash(document: Document) -> str:
+        Computes the content hash identifying a chunk.
+
+    point_id_for(digest: str) -> str:
+        Derives the deterministic Qdrant point id for a chunk hash.
+
+    load_manifest(path: str, collection_name: str) -> dict:
+        Loads the hash -> point id manifest for a collection.
+
+    save_manifest(path: str, collection_name: str, chunks: dict) -> None:
+        Atomically writes the hash -> point id manifest for a collection.
+
+    write_generation(path: str) -> str:
+        Marks that the collection changed, which invalidates caches derived from it.
+
+    read_generation(path: str) -> str:
+        Returns the current ingestion generation.
+
+    incremental_ingest(client, collection_name, chunks, embeddings, manifest_path, batch_size, pipeline,
+                       quantization, sparse_index) -> IngestResult:
+        Embeds and upserts new chunks through an IngestPipeline and deletes stale points.
+"""
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from bm25_index import BM25Builder
+from ingest_pipeline import IngestPipeline, IngestStats
+from quantization import quantization_config, vectors_config
+
+COLLECTION_NAME = "rag_documents"
+MANIFEST_PATH = "ingest_manifest.json"
+GENERATION_PATH = "ingest_generation"
+
+
+@dataclass
+class IngestResult:
+    """Class for keeping track of what an ingestion run changed."""
+
+    added: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    stats: Optional[IngestStats] = None
+
+
+def chunk_hash(document: Document) -> str:
+    """
+    Computes the content hash identifying a chunk.
+
+    Args:
+        document (Document): The chunk produced by the text splitter.
+
+    Returns:
+        str: The hex encoded sha256 of the chunk metadata and content.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(document.metadata, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def point_id_for(digest: str) -> str:
+    """
+    Derives the deterministic Qdrant point id for a chunk hash.
+
+    Args:
+        digest (str): The chunk hash returned by chunk_hash.
+
+    Returns:
+        str: A UUID string usable as Qdrant point id.
+    """
+    return str(uuid.UUID(hex=digest[:32]))
+
+
+def load_manifest(path: str, collection_name: str) -> Dict[str, str]:
+    """
+    Loads the hash -> point id manifest for a collection.
+
+    Args:
+        path (str): The path of the manifest file.
+        collection_name (str): The collection the manifest must belong to.
+
+    Returns:
+        dict: The manifest, or an empty dict if there is none for this collection.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        data = json.load(f)
+    if data.get("collection") != collection_name:
+        return {}
+    return data.get("chunks", {})
+
+
+def save_manifest(path: str, collection_name: str, chunks: Dict[str, str]) -> None:
+    """
+    Atomically writes the hash -> point id manifest for a collection.
+
+    Args:
+        path (str): The path of the manifest file.
+        collection_name (str): The collection the manifest belongs to.
+        chunks (dict): The hash -> point id mapping.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"collection": collection_name, "chunks": chunks}, f)
+    os.replace(tmp_path, path)
+
+
+def write_generation(path: str = GENERATION_PATH) -> str:
+    """
+    Marks that the collection changed, which invalidates caches derived from it such as the semantic answer cache.
+
+    Args:
+        path (str): The path of the generation file.
+
+    Returns:
+        str: The new generation.
+    """
+    generation = uuid.uuid4().hex
+    with open(f"{path}.tmp", "w") as f:
+        f.write(generation)
+    os.replace(f"{path}.tmp", path)
+    return generation
+
+
+def read_generation(path: str = GENERATION_PATH) -> str:
+    """
+    Returns the current ingestion generation.
+
+    Args:
+        path (str): The path of the generation file.
+
+    Returns:
+        str: The generation, or an empty string if the collection was never ingested from here.
+    """
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def _ensure_collection(
+    client: QdrantClient, collection_name: str, vector_size: int, quantization: str = "none"
+) -> None:
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=vectors_config(vector_size, quantization),
+            quantization_config=quantization_config(quantization),
+        )
+
+
+def incremental_ingest(
+    client: QdrantClient,
+    collection_name: str,
+    chunks: Iterable[Document],
+    embeddings: Embeddings,
+    manifest_path: str = MANIFEST_PATH,
+    batch_size: int = 64,
+    pipeline: Optional[IngestPipeline] = None,
+    quantization: str = "none",
+    sparse_index: Optional[BM25Builder] = None,
+) -> IngestResult:
+    """
+    Embeds and upserts the chunks that are not in the manifest yet and deletes the points
+    whose chunks are no longer part of the corpus.
+
+    Args:
+        client (QdrantClient): The Qdrant client to write to.
+        collection_name (str): The collection to ingest into. It is created if it does not exist.
+        chunks (Iterable[Document]): All chunks of the current corpus.
+        embeddings (Embeddings): The embeddings used for new chunks.
+        manifest_path (str): The path of the hash -> point id manifest.
+        batch_size (int): The number of chunks embedded and upserted at once.
+        pipeline (IngestPipeline): The pipeline embedding and upserting new chunks. Defaults to
+            an IngestPipeline with the given batch size.
+        quantization (str): The quantization ("none", "scalar" or "binary") of a newly created collection.
+        sparse_index (BM25Builder): Receives every chunk of the corpus, unchanged ones included, to build
+            the BM25 index of the hybrid retriever. None skips the sparse index.
+
+    Returns:
+        IngestResult: The number of added, unchanged and deleted chunks.
+    """
+    # a manifest is only trustworthy as long as the collection it describes still exists
+    if client.collection_exists(collection_name):
+        manifest = load_manifest(manifest_path, collection_name)
+    else:
+        manifest = {}
+
+    if pipeline is None:
+        pipeline = IngestPipeline(client, embeddings, batch_size=batch_size)
+
+    result = IngestResult()
+    current: Dict[str, str] = {}
+
+    def new_chunks() -> Iterator[Tuple[str, Document]]:
+        for doc in chunks:
+            digest = chunk_hash(doc)
+            if digest in current:
+                continue
+            current[digest] = point_id_for(digest)
+            if sparse_index is not None:
+                sparse_index.add(current[digest], doc)
+            if digest in manifest:
+                result.unchanged += 1
+                continue
+            yield current[digest], doc
+
+    result.stats = pipeline.run(
+        collection_name,
+        new_chunks(),
+        create_collection=lambda size: _ensure_collection(client, collection_name, size, quantization),
+    )
+    result.added = result.stats.chunks
+
+    stale_ids = [point_id for digest, point_id in manifest.items() if digest not in current]
+    if stale_ids:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=stale_ids),
+        )
+        result.deleted = len(stale_ids)
+
+    save_manifest(manifest_path, collection_name, current)
+    if result.added or result.deleted:
+        write_generation()
+    return result
@@ -1,58 +1,16 @@
 import streamlit as st
 import os
-import markdown
 import warnings
-from langchain_cohere.llms import Cohere
-from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_cohere import ChatCohere, create_cohere_react_agent
-from langchain_community.agent_toolkits.polygon.toolkit import PolygonToolkit
-from langchain_community.utilities.polygon import PolygonAPIWrapper
-from langchain.agents import AgentExecutor
-from cohere_tools import get_internet_search_tool
-from yfinance_tools import get_business_summary_tool, get_ticker_history_tool, get_ticker_info_tool
+from functools import partial
+# LangChain, Polygon and yfinance are imported when the tools are built or an agent runs, so the page
+# renders and reruns without them; see tool_registry.py
+from analysis_dag import AnalysisStep, run_analysis_dag
+from report_cache import get_report_cache
+from tool_compaction import compact_tools, get_tool_compactor
+from tool_registry import get_tools as get_registered_tools
 
-# Function to get API keys from Streamlit secrets
-def get_keys():
-    warnings.filterwarnings("ignore")
-    os.environ["ALPHAVANTAGE_API_KEY"] = st.secrets["ALPHAVANTAGE_API_KEY"]
-    os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
-    os.environ["OPENWEATHERMAP_API_KEY"] = st.secrets["OPEN_WEATHER_API_KEY"]
-    os.environ["POLYGON_API_KEY"] = st.secrets["POLYGON_API_KEY"]
-    os.environ["TAVILY_API_KEY"] = st.secrets["TAVILY_API_KEY"]
-
-# Function to get tools from Polygon API
-def get_polygon_tools():
-    polygon = PolygonAPIWrapper()
-    toolkit = PolygonToolkit.from_polygon_api_wrapper(polygon)
-    return toolkit.get_tools()
-
-# Function to get tools from Yahoo Finance API
-def get_yfinance_tools():
-    return [get_business_summary_tool(), get_ticker_history_tool(), get_ticker_info_tool()]
-
-def invoke_cohere_with_tools(input, tools, prompt_template="{input}"):
-    llm = Cohere()
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    agent = create_cohere_react_agent(llm, tools, prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=False)
-    response = agent_executor.invoke(input)    
-    return response
-
-# Initialize the Streamlit app
-def main():
-    st.title("Investment Advisor Analysis")
-    
-    # Get API keys
-    get_keys()
-    
-    # User inputs
-    ticker = st.text_input("Enter the ticker symbol:", "NVDA")
-    period = st.text_input("Enter the period (e.g., '1y'):", "1y")
-    topics = st.text_area("Enter the topics:", "all relevant key figures like margin, profit, earnings growth and so on, fundamental indicators, technical indicators and analyst recommendations")
-    
-    # Prompt templates
-    prompt_start = """0. I want you to act as an investment advisor.
+# Prompt templates
+PROMPT_START = """0. I want you to act as an investment advisor.
                          Your advise is always reflected and based on science and proven economic and investment theories.
                          Think step-by-step and use the right tools and check your results against this instruction.
                          Before analyzing make an internet search about 1. the current macroeconomic situation,
@@ -110,25 +68,25 @@ def main():
 
                     Write everything in good markup for a good display in a chatbot.
                    """
-    
-    prompt_template_summary = """ 1. Get a summary for {ticker}. If summary could not be loaded by  the summary tool,
+
+PROMPT_TEMPLATE_SUMMARY = """ 1. Get a summary for {ticker}. If summary could not be loaded by  the summary tool,
                                      search in the internet for a summary about {ticker}."""
-    
-    prompt_template_ticker_info = """ 2. I need detailed information about {ticker}. Produce a bullet point key value list for all for your analysis important {topics} using CRLF before each point.
+
+PROMPT_TEMPLATE_TICKER_INFO = """ 2. I need detailed information about {ticker}. Produce a bullet point key value list for all for your analysis important {topics} using CRLF before each point.
                                      After that analyze the fundamental and technical data and rate the company. Is it a good buy? Is it oversold or overbought? Is it a stable investment
                                      with a good sharpe ratio? Is it risky or safe to hold stocks of {ticker}? Display your detailed analysis at the end."""
-    
-    prompt_template_av_financials = """ 3. How are the financials for {ticker}? What is its market value?
+
+PROMPT_TEMPLATE_AV_FINANCIALS = """ 3. How are the financials for {ticker}? What is its market value?
                                         Produce an overview in form of a bullet point list and use CRLF for new lines
                                         and rate the financial situation of the company and display it. """
-    
-    prompt_template_av_sentiment = " 4. What is the news sentiment for {ticker}? Rate the sentiment based on the news and explain your rating and display it. "
-    
-    prompt_template_history = " 5. How did {ticker} perform the last {period}? Get the timeseries in a dataframe and calculate and rate the performance and display it. "
-    
-    prompt_template_search = """ 6. Search news and articles in the internet what you find about {ticker} and judge the sentiment. """
-    
-    prompt_template_rating = """ 7. Based on all relevant information about fundamental, technical and sentiment data 
+
+PROMPT_TEMPLATE_AV_SENTIMENT = " 4. What is the news sentiment for {ticker}? Rate the sentiment based on the news and explain your rating and display it. "
+
+PROMPT_TEMPLATE_HISTORY = " 5. How did {ticker} perform the last {period}? Get the timeseries in a dataframe and calculate and rate the performance and display it. "
+
+PROMPT_TEMPLATE_SEARCH = """ 6. Search news and articles in the internet what you find about {ticker} and judge the sentiment. """
+
+PROMPT_TEMPLATE_RATING = """ 7. Based on all relevant information about fundamental, technical and sentiment data 
                                 determined in the steps before for {ticker}
                                 and the overall macroeconomic situation and sentiment at the stock market exchange
                                 produce now a detailed and profound investment analysis and trading rating based on your own ratings in your report.
@@ -136,41 +94,205 @@ def main():
                                 Make an educated advice for a trader about a reasonable profit-target above the stock price, a reasonable stop-loss under the stock price
                                 and a reasonable position size all in currency USD if the stock is a buy.                            
                              """
+
+# Prompt template checkboxes, in the order of the report
+PROMPT_TEMPLATES = {
+    "prompt_start": PROMPT_START,
+    "prompt_template_summary": PROMPT_TEMPLATE_SUMMARY,
+    "prompt_template_ticker_info": PROMPT_TEMPLATE_TICKER_INFO,
+    "prompt_template_av_financials": PROMPT_TEMPLATE_AV_FINANCIALS,
+    "prompt_template_av_sentiment": PROMPT_TEMPLATE_AV_SENTIMENT,
+    "prompt_template_history": PROMPT_TEMPLATE_HISTORY,
+    "prompt_template_search": PROMPT_TEMPLATE_SEARCH,
+    "prompt_template_rating": PROMPT_TEMPLATE_RATING
+}
+
+RATING_KEY = "prompt_template_rating"
+
+# Prompt templates of the concurrent mode, where every data-gathering step runs as its own sub-agent
+# and the macro research of step 0 is a data-gathering step of its own
+PROMPT_SUB_AGENT = """You are an investment advisor gathering the data for one step of an investment analysis of {ticker}.
+                      Use the right tools, answer only this step and display your results.
+                   """
+
+PROMPT_TEMPLATE_MARKET = """ 0. Make a profound internet research about 1. the current macroeconomic situation,
+                                2. the detailed actual performance of the big indices, 3. the detailed actual performance of the different sectors,
+                                4. the value of the fear and greed index for today and 5. the sentiment at the stock market exchanges.
+                                Display your findings. """
+
+PROMPT_STEP_RESULTS = """ The data of the steps 0 to 6 was already gathered, use it instead of searching again:
+
+{step_results}
+
+"""
+
+# Tools of the analysis
+POLYGON_TOOLS = ("polygon_financials", "polygon_ticker_news")
+YFINANCE_TOOLS = ("yf_get_business_summary", "yf_get_ticker_history", "yf_get_ticker_info", "yf_get_technical_indicators")
+ANALYSIS_TOOLS = POLYGON_TOOLS + YFINANCE_TOOLS + ("internet_search",)
+
+# Tools of the sub-agent of each data-gathering step
+STEP_TOOLS = {
+    "prompt_start": ("internet_search",),
+    "prompt_template_summary": ("yf_get_business_summary", "internet_search"),
+    "prompt_template_ticker_info": ("yf_get_ticker_info", "yf_get_technical_indicators"),
+    "prompt_template_av_financials": ("polygon_financials",),
+    "prompt_template_av_sentiment": ("polygon_ticker_news",),
+    "prompt_template_history": ("yf_get_technical_indicators", "yf_get_ticker_history"),
+    "prompt_template_search": ("internet_search",),
+}
+
+
+# Function to get API keys from Streamlit secrets
+def get_keys():
+    warnings.filterwarnings("ignore")
+    os.environ["ALPHAVANTAGE_API_KEY"] = st.secrets["ALPHAVANTAGE_API_KEY"]
+    os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
+    os.environ["OPENWEATHERMAP_API_KEY"] = st.secrets["OPEN_WEATHER_API_KEY"]
+    os.environ["POLYGON_API_KEY"] = st.secrets["POLYGON_API_KEY"]
+    os.environ["TAVILY_API_KEY"] = st.secrets["TAVILY_API_KEY"]
+    # optional settings of the shared Alpha Vantage client
+    for key in ("ALPHAVANTAGE_BASE_URL", "ALPHAVANTAGE_CALLS_PER_MINUTE", "ALPHAVANTAGE_CALLS_PER_DAY"):
+        if key in st.secrets:
+            os.environ[key] = str(st.secrets[key])
+
+# Function to get tools from Polygon API, built once per process
+def get_polygon_tools():
+    return get_registered_tools(POLYGON_TOOLS)
+
+# Function to get tools from Yahoo Finance API, built once per process
+def get_yfinance_tools():
+    return get_registered_tools(YFINANCE_TOOLS)
+
+# Function to get the tools of the analysis, their outputs are compacted before they reach the agent
+def get_tools():
+    return compact_tools(get_registered_tools(ANALYSIS_TOOLS))
+
+# Function to describe the tokens the compaction of the tool outputs saved
+def describe_tool_compaction():
+    stats = get_tool_compactor().stats
+    tokens_in, tokens_out = sum(stats.tokens_in.values()), sum(stats.tokens_out.values())
+    return f"{sum(stats.calls.values())} tool calls, outputs compacted from {tokens_in} to {tokens_out} tokens"
+
+# Function to run a Cohere ReAct agent with tools, the benchmarks pass a scripted llm instead of Cohere
+def invoke_cohere_with_tools(input, tools, prompt_template="{input}", callbacks=None, llm=None):
+    from langchain.agents import AgentExecutor
+    from langchain_cohere import create_cohere_react_agent
+    from langchain_cohere.llms import Cohere
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = llm or Cohere()
+    prompt = ChatPromptTemplate.from_template(prompt_template)
+    agent = create_cohere_react_agent(llm, tools, prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=False)
+    response = agent_executor.invoke(input, config={"callbacks": callbacks} if callbacks else None)
+    return response
+
+# Function to build the analysis DAG: the selected data-gathering steps are independent and the rating step
+# depends on all of them
+def build_analysis_steps(selected_keys, tools):
+    tools_by_name = {tool.name: tool for tool in tools}
+    steps = []
+    for key in selected_keys:
+        if key == RATING_KEY:
+            continue
+        template = PROMPT_TEMPLATE_MARKET if key == "prompt_start" else PROMPT_TEMPLATES[key]
+        step_tools = [tools_by_name[name] for name in STEP_TOOLS[key] if name in tools_by_name] or tools
+        steps.append(AnalysisStep(key=key, prompt_template=PROMPT_SUB_AGENT + template, tools=step_tools))
+
+    if RATING_KEY in selected_keys:
+        # the rating agent writes the report in the layout of step 0 from the gathered data
+        prompt_template = PROMPT_START if "prompt_start" in selected_keys else ""
+        if steps:
+            prompt_template += PROMPT_STEP_RESULTS
+        steps.append(AnalysisStep(
+            key=RATING_KEY,
+            prompt_template=prompt_template + PROMPT_TEMPLATE_RATING,
+            tools=tools,
+            depends_on=tuple(step.key for step in steps),
+        ))
+    return steps
+
+# Initialize the Streamlit app
+def main():
+    st.title("Investment Advisor Analysis")
     
-    # Prompt template checkboxes
-    prompt_templates = {
-        "prompt_start": prompt_start,
-        "prompt_template_summary": prompt_template_summary,
-        "prompt_template_ticker_info": prompt_template_ticker_info,
-        "prompt_template_av_financials": prompt_template_av_financials,
-        "prompt_template_av_sentiment": prompt_template_av_sentiment,
-        "prompt_template_history": prompt_template_history,
-        "prompt_template_search": prompt_template_search,
-        "prompt_template_rating": prompt_template_rating
-    }
+    # Get API keys
+    get_keys()
+    
+    # User inputs
+    ticker = st.text_input("Enter the ticker symbol:", "NVDA")
+    period = st.text_input("Enter the period (e.g., '1y'):", "1y")
+    topics = st.text_area("Enter the topics:", "all relevant key figures like margin, profit, earnings growth and so on, fundamental indicators, technical indicators and analyst recommendations")
     
+    selected_keys = []
     selected_templates = []
-    for key, value in prompt_templates.items():
+    for key, value in PROMPT_TEMPLATES.items():
         if st.checkbox(f"Include {key}", value=True):
+            selected_keys.append(key)
             selected_templates.append(value)
+
+    # Independent steps run as concurrent sub-agents, the rating step waits for their results
+    run_concurrently = st.checkbox("Run the independent steps concurrently", value=True)
+
+    # Steps run before on the same trading date with the same inputs are not recomputed
+    reuse_steps = st.checkbox("Reuse the step results of earlier runs today", value=True)
     
     # Combine selected templates into a single prompt
     prompt_template_combined = "".join(selected_templates)
     
-    # Get tools
-    combined_tools = []
-    filtered_polygon_tools = [tool for tool in get_polygon_tools() if tool.name in ("polygon_financials", "polygon_ticker_news")]
-    combined_tools.extend(filtered_polygon_tools)
-    combined_tools.extend(get_yfinance_tools())
-    combined_tools.append(get_internet_search_tool())
-    
     # Prepare input
     input = {"ticker": ticker, "topics": topics, "period": period}
+    report_cache = get_report_cache()
+    invoke = report_cache.memoize(invoke_cohere_with_tools) if reuse_steps else invoke_cohere_with_tools
     
     # Execute analysis
     if st.button("Run Analysis"):
-        response = invoke_cohere_with_tools(input=input, tools=combined_tools, prompt_template=prompt_template_combined)
-        st.write(response['output'])
+        # Get tools
+        combined_tools = get_tools()
+        if run_concurrently:
+            steps = build_analysis_steps(selected_keys, combined_tools)
+            result = run_analysis_dag(steps, input, invoke)
+            if RATING_KEY in result.outputs:
+                st.write(result.outputs[RATING_KEY])
+            else:
+                st.write("\n\n".join(result.outputs[step.key] for step in steps))
+            st.caption(f"{len(steps)} steps in {result.total_seconds:.1f}s, "
+                       f"{result.sequential_seconds:.1f}s when run one after another")
+        else:
+            response = invoke(input=input, tools=combined_tools, prompt_template=prompt_template_combined)
+            st.write(response['output'])
+        st.caption(describe_tool_compaction())
+        if reuse_steps:
+            st.caption(f"{report_cache.stats.hits} steps reused, {report_cache.stats.misses} computed, "
+                       f"~{report_cache.stats.saved_seconds:.0f}s saved")
+
+    # Batch mode: the selected steps for every ticker of a watchlist, the market research runs once
+    watchlist = st.text_area("Watchlist for the batch mode (tickers separated by commas, spaces or new lines):", "")
+    if st.button("Run Watchlist"):
+        from watchlist_batch import WATCHLIST_OUTPUT_PATH, build_rate_limiter, parse_watchlist, run_watchlist, write_results
+
+        combined_tools = get_tools()
+        tickers = parse_watchlist(watchlist)
+        limiter = build_rate_limiter({
+            "llm": float(st.secrets.get("LLM_CALLS_PER_MINUTE", 0)),
+            "polygon": float(st.secrets.get("POLYGON_CALLS_PER_MINUTE", 5)),
+            "search": float(st.secrets.get("SEARCH_CALLS_PER_MINUTE", 0)),
+            "yfinance": float(st.secrets.get("YFINANCE_CALLS_PER_MINUTE", 0)),
+        })
+        steps = build_analysis_steps(selected_keys, combined_tools)
+        result = run_watchlist(tickers, steps, {"topics": topics, "period": period},
+                               partial(invoke, callbacks=[limiter]),
+                               workers=int(st.secrets.get("WATCHLIST_WORKERS", 4)))
+        write_results(result, WATCHLIST_OUTPUT_PATH, {"topics": topics, "period": period})
+        st.caption(f"{len(tickers)} tickers in {result.total_seconds:.1f}s, "
+                   f"{result.tickers_per_minute:.1f} tickers/min, reports written to {WATCHLIST_OUTPUT_PATH}")
+        st.caption(describe_tool_compaction())
+        for ticker, error in result.errors.items():
+            st.error(f"{ticker}: {error}")
+        for ticker, report in result.reports.items():
+            with st.expander(ticker):
+                st.write(report["report"])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""
+This module provides an embedded, memory-mapped FAISS index that serves the chat retriever locally instead of
+querying the remote Qdrant cluster. Snapshots are exported from the rag_documents collection into
+`<index_dir>/<snapshot>/` and published by atomically rewriting `<index_dir>/CURRENT`, which running
+retrievers pick up without a restart.
+
+Classes:
+    LocalIndex: A vector store stand-in that reloads the snapshot when a new one is published.
+    ReloadingRetriever: A retriever serving from the current snapshot of a LocalIndex.
+
+Functions:
+    export_collection(client, collection_name, index_dir, batch_size, keep) -> str:
+        Exports a Qdrant collection into a new snapshot and publishes it.
+
+    load_snapshot(index_dir, embeddings) -> Tuple[str, FAISS]:
+        Loads the current snapshot as a langchain FAISS vector store backed by a memory-mapped index.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from qdrant_client import QdrantClient
+
+from ingest_pipeline import CONTENT_PAYLOAD_KEY, METADATA_PAYLOAD_KEY
+
+LOCAL_INDEX_DIR = "vector_index"
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.faiss"
+DOCS_FILE = "docs.jsonl"
+
+
+def export_collection(
+    client: QdrantClient,
+    collection_name: str,
+    index_dir: str = LOCAL_INDEX_DIR,
+    batch_size: int = 1024,
+    keep: int = 2,
+) -> str:
+    """
+    Exports a Qdrant collection into a new snapshot and publishes it.
+
+    Args:
+        client (QdrantClient): The client of the collection to export.
+        collection_name (str): The collection to export.
+        index_dir (str): The directory holding the snapshots.
+        batch_size (int): The number of points scrolled per request.
+        keep (int): The number of snapshots kept, older ones are deleted.
+
+    Returns:
+        str: The name of the published snapshot.
+    """
+    # microseconds keep the names of one process in order, the random suffix keeps them unique; the pruning
+    # below relies on the names sorting by creation time
+    now = time.time()
+    snapshot = (f"snapshot-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now % 1 * 1e6):06d}"
+                f"-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    snapshot_dir = os.path.join(index_dir, snapshot)
+    os.makedirs(snapshot_dir)
+
+    index = None
+    offset = None
+    with open(os.path.join(snapshot_dir, DOCS_FILE), "w") as docs:
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if points:
+                vectors = np.array([point.vector for point in points], dtype=np.float32)
+                # the collection uses cosine distance, i.e. inner product of normalized vectors
+                faiss.normalize_L2(vectors)
+                if index is None:
+                    index = faiss.IndexFlatIP(vectors.shape[1])
+                index.add(vectors)
+                for point in points:
+                    payload = point.payload or {}
+                    docs.write(json.dumps({
+                        "id": str(point.id),
+                        CONTENT_PAYLOAD_KEY: payload.get(CONTENT_PAYLOAD_KEY, ""),
+                        METADATA_PAYLOAD_KEY: payload.get(METADATA_PAYLOAD_KEY) or {},
+                    }) + "\n")
+            if offset is None:
+                break
+
+    if index is None:
+        shutil.rmtree(snapshot_dir)
+        raise ValueError(f"collection {collection_name} is empty")
+    faiss.write_index(index, os.path.join(snapshot_dir, INDEX_FILE))
+
+    current_path = os.path.join(index_dir, CURRENT_FILE)
+    with open(f"{current_path}.tmp", "w") as f:
+        f.write(snapshot)
+    os.replace(f"{current_path}.tmp", current_path)
+
+    snapshots = sorted(name for name in os.listdir(index_dir) if name.startswith("snapshot-"))
+    for name in snapshots[:-keep]:
+        if name != snapshot:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    return snapshot
+
+
+def _current_snapshot(index_dir: str) -> str:
+    with open(os.path.join(index_dir, CURRENT_FILE), "r") as f:
+        return f.read().strip()
+
+
+def load_snapshot(index_dir: str, embeddings: Embeddings) -> Tuple[str, FAISS]:
+    """
+    Loads the current snapshot as a langchain FAISS vector store backed by a memory-mapped index.
+
+    Args:
+        index_dir (str): The directory holding the snapshots.
+        embeddings (Embeddings): The embeddings used for queries, must match the exported collection.
+
+    Returns:
+        Tuple[str, FAISS]: The name of the snapshot and the vector store.
+    """
+    snapshot = _current_snapshot(index_dir)
+    snapshot_dir = os.path.join(index_dir, snapshot)
+    index = faiss.read_index(
+        os.path.join(snapshot_dir, INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    )
+    documents: Dict[str, Document] = {}
+    index_to_docstore_id: Dict[int, str] = {}
+    with open(os.path.join(snapshot_dir, DOCS_FILE), "r") as f:
+        for position, line in enumerate(f):
+            record = json.loads(line)
+            documents[record["id"]] = Document(
+                page_content=record[CONTENT_PAYLOAD_KEY], metadata=record[METADATA_PAYLOAD_KEY]
+            )
+            index_to_docstore_id[position] = record["id"]
+    with warnings.catch_warnings():
+        # FAISS warns that normalize_L2 is meant for euclidean distance, but it is what
+        # turns the inner product of the normalized index vectors into cosine similarity
+        warnings.simplefilter("ignore", UserWarning)
+        store = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(documents),
+            index_to_docstore_id=index_to_docstore_id,
+            normalize_L2=True,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+        )
+    return snapshot, store
+
+
+class LocalIndex:
+    """
+    Stands in for the Qdrant vector store in main.load_db() when retrieval is served locally. The CURRENT
+    file is checked at most every `check_interval` seconds and a newly published snapshot is loaded before
+    the next search. All retrievers of an index share the loaded snapshot.
+
+    Args:
+        index_dir (str): The directory holding the snapshots.
+        embeddings (Embeddings): The embeddings used for queries.
+        check_interval (float): The minimal number of seconds between two checks for a new snapshot.
+    """
+
+    def __init__(self, index_dir: str, embeddings: Embeddings, check_interval: float = 1.0):
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        self.check_interval = check_interval
+        self._store: Optional[FAISS] = None
+        self._snapshot: Optional[str] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def store(self) -> FAISS:
+        """Returns the vector store of the current snapshot, loading a newly published one first."""
+        now = time.monotonic()
+        if self._store is not None and now - self._checked < self.check_interval:
+            return self._store
+        with self._lock:
+            self._checked = now
+            if self._store is None or _current_snapshot(self.index_dir) != self._snapshot:
+                self._snapshot, self._store = load_snapshot(self.index_dir, self.embeddings)
+                print(f"local index {self._snapshot} loaded !")
+        return self._store
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[dict] = None, **kwargs):
+        return ReloadingRetriever(
+            index=self, search_type=search_type, search_kwargs=search_kwargs or {}, **kwargs
+        )
+
+
+class ReloadingRetriever(BaseRetriever):
+    """A retriever serving from the current snapshot of a LocalIndex."""
+
+    index: LocalIndex
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        store = self.index.store()
+        if self.search_type == "mmr":
+            return store.max_marginal_relevance_search(query, **self.search_kwargs)
+        return store.similarity_search(query, **self.search_kwargs)
@@ -11,11 +11,26 @@ Functions:
     initialize_vector_store() -> Qdrant:
         Initializes and returns the Qdrant vector store for embeddings.
         
+    mmr_retriever(vector_store, k: int, fetch_k: int) -> BaseRetriever:
+        Returns the MMR retriever of the vector backend.
+
+    build_retriever(vector_store) -> BaseRetriever:
+        Returns the dense or hybrid retriever of the chain, optionally followed by a reranker.
+
+    build_memory(llm) -> BaseChatMemory:
+        Returns the conversation memory of a session for MEMORY_MODE.
+
     initialize_session_state() -> None:
         Initializes the Streamlit session state variables.
         
-    handle_chat_interaction() -> None:
+    on_click_callback() -> None:
         Callback function that handles the chat interaction and updates the session state.
+
+    render_message(origin: str, msg: str) -> str:
+        Returns the html of a chat bubble.
+
+    stream_pending_answer() -> None:
+        Streams the answer to the pending question into a chat bubble.
         
     main() -> None:
         The main function that sets up the Streamlit interface and handles user interactions.
@@ -25,19 +40,58 @@ import streamlit as st
 from typing import Literal
 from dataclasses import dataclass
 
-import qdrant_client
-from langchain.embeddings.cohere import CohereEmbeddings
 from langchain.vectorstores import Qdrant
 
-from langchain.chains import ConversationalRetrievalChain
-from langchain.embeddings.cohere import CohereEmbeddings
-from langchain_cohere import ChatCohere
-from langchain.prompts import PromptTemplate
 from langchain.chains.conversation.memory import ConversationSummaryMemory
 
+from background_memory import BackgroundSummaryMemory
+from hybrid_retriever import HybridRetriever
+from mmr import MMRRetriever
+from prompts import ANSWER_PROMPT, CONDENSE_QUESTION_PROMPT
+from quantization import search_params
+from rag_chain import AnswerStreamHandler, RAGChain
+from reranker import RerankingRetriever
+from resources import (
+    get_answer_cache,
+    get_context_packer,
+    get_embeddings,
+    get_llm,
+    get_local_index,
+    get_qdrant_client,
+    get_question_router,
+    get_reranker,
+    resource_stats,
+)
+
 os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
 QDRANT_HOST = st.secrets["QDRANT_HOST"]
 QDRANT_API_KEY = st.secrets["QDRANT_API_KEY"]
+QDRANT_PREFER_GRPC = st.secrets.get("QDRANT_PREFER_GRPC", True)
+# "qdrant" queries the Qdrant cluster, "local" serves from the FAISS snapshot exported by build_vectorstore.py
+VECTOR_BACKEND = st.secrets.get("VECTOR_BACKEND", "qdrant")
+# must match the quantization the rag_documents collection was created with
+QDRANT_QUANTIZATION = st.secrets.get("QDRANT_QUANTIZATION", "none")
+# answers are reused for standalone questions at least this similar, 0 < threshold <= 1, 0 disables the cache
+SEMANTIC_CACHE_THRESHOLD = float(st.secrets.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL = float(st.secrets.get("SEMANTIC_CACHE_TTL", 24 * 3600))
+# candidates fetched for MMR and the relevance weight, 1 ranks by relevance only and 0 by diversity only
+MMR_FETCH_K = int(st.secrets.get("MMR_FETCH_K", 20))
+MMR_LAMBDA = float(st.secrets.get("MMR_LAMBDA", 0.5))
+# "dense" retrieves with MMR over the vectors, "hybrid" fuses it with the BM25 index built by build_vectorstore.py
+RETRIEVAL_MODE = st.secrets.get("RETRIEVAL_MODE", "dense")
+# "cohere" or "lexical" reranks RERANK_CANDIDATES first stage candidates down to the 4 prompt chunks, "none" disables
+RERANKER = st.secrets.get("RERANKER", "none")
+RERANK_CANDIDATES = int(st.secrets.get("RERANK_CANDIDATES", 50))
+# token budget of the retrieved chunks in the answer prompt, 0 passes the chunks unchanged
+CONTEXT_TOKEN_BUDGET = int(st.secrets.get("CONTEXT_TOKEN_BUDGET", 2000))
+# "background" keeps the last MEMORY_WINDOW_TURNS turns verbatim and summarizes older ones off the critical path,
+# "summary" re-summarizes the whole history with a blocking LLM call after every turn
+MEMORY_MODE = st.secrets.get("MEMORY_MODE", "background")
+MEMORY_WINDOW_TURNS = int(st.secrets.get("MEMORY_WINDOW_TURNS", 3))
+# skips the condense-question LLM call for self-contained follow-ups and reuses rewrites
+ROUTE_QUESTIONS = st.secrets.get("ROUTE_QUESTIONS", True)
+# streams the answer tokens into the chat bubble instead of waiting behind a spinner
+STREAM_ANSWERS = st.secrets.get("STREAM_ANSWERS", True)
 
 # Streamlit header
 st.set_page_config(page_title="rag-agent")
@@ -66,23 +120,80 @@ def load_css():
 # we only need to load it
 
 
-# loading Qdrant cloud
-def load_db():
+# loading Qdrant cloud or the local index, the clients and the embedder are shared by all sessions
+def load_db(backend=VECTOR_BACKEND):
 
-    client = qdrant_client.QdrantClient(
+    if backend == "local":
+        return get_local_index()
+
+    client = get_qdrant_client(
         url=QDRANT_HOST,
         api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC,
     )
-    embeddings = CohereEmbeddings(model="embed-english-v2.0")
     vector_store = Qdrant(
-        client=client, collection_name="rag_documents", embeddings=embeddings
+        client=client, collection_name="rag_documents", embeddings=get_embeddings()
     )
-    print("connection established !")
     return vector_store
 
 
+def retriever_search_kwargs():
+    # quantized collections oversample on the quantized vectors and rescore with the originals
+    params = search_params(QDRANT_QUANTIZATION) if VECTOR_BACKEND == "qdrant" else None
+    return {"search_params": params} if params is not None else {}
+
+
+def mmr_retriever(vector_store, k, fetch_k):
+    if VECTOR_BACKEND == "local":
+        return vector_store.as_retriever(
+            search_type="mmr", search_kwargs={"k": k, "fetch_k": fetch_k, "lambda_mult": MMR_LAMBDA}
+        )
+    # vectorized MMR over the candidates and their vectors fetched in one Qdrant query
+    return MMRRetriever(
+        client=vector_store.client,
+        collection_name=vector_store.collection_name,
+        embeddings=vector_store.embeddings,
+        k=k,
+        fetch_k=fetch_k,
+        lambda_mult=MMR_LAMBDA,
+        **retriever_search_kwargs(),
+    )
+
+
+def build_retriever(vector_store):
+    # with a reranker the first stage only over-retrieves by relevance and the reranker picks the 4 chunks
+    k = RERANK_CANDIDATES if RERANKER != "none" else 4
+    if RETRIEVAL_MODE == "hybrid":
+        # both rankings contribute more candidates than the chunks returned
+        dense = mmr_retriever(vector_store, k=max(k, 10), fetch_k=max(MMR_FETCH_K, 3 * max(k, 10)))
+        retriever = HybridRetriever(dense_retriever=dense, k=k, sparse_k=max(k, 10))
+    else:
+        retriever = mmr_retriever(vector_store, k=k, fetch_k=max(MMR_FETCH_K, k))
+    if RERANKER == "none":
+        return retriever
+    return RerankingRetriever(base_retriever=retriever, reranker=get_reranker(RERANKER), top_n=4)
+
+
+def build_memory(llm):
+    if MEMORY_MODE == "summary":
+        return ConversationSummaryMemory(
+            llm=llm,
+            memory_key="chat_history",
+            input_key="question",
+            output_key="answer",
+            return_messages=True,
+        )
+    return BackgroundSummaryMemory(
+        llm=llm,
+        memory_key="chat_history",
+        input_key="question",
+        output_key="answer",
+        return_messages=True,
+        window_turns=MEMORY_WINDOW_TURNS,
+    )
+
+
 def initialize_session_state():
-    vector_store = load_db()
     # Initialize a session state to track whether the initial message has been sent
     if "initial_message_sent" not in st.session_state:
         st.session_state.initial_message_sent = False
@@ -94,52 +205,31 @@ def initialize_session_state():
     if "history" not in st.session_state:
         st.session_state.history = []
 
-    if "chain" not in st.session_state:
-
-        # create custom prompt for your use case
-        prompt_template = """
-        You are a bot to answer questions from a document.
-           
-        You will be given a context of the conversation made so far followed by a question, 
-        give the answer to the question using the context. 
-        The answer should be short, straight and to the point. If you don't know the answer, reply that the answer is not available.
-        
-        Context: {context}
+    # the question whose answer is streamed on the next run, and the timings of the answered turns
+    if "pending_prompt" not in st.session_state:
+        st.session_state.pending_prompt = None
 
-        Question: {question}
-        Answer:"""
+    if "timings" not in st.session_state:
+        st.session_state.timings = []
 
-        PROMPT = PromptTemplate(
-            template=prompt_template, input_variables=["context", "question"]
-        )
-
-        chain_type_kwargs = {"prompt": PROMPT}
-        # build your LLM
-        llm = ChatCohere()
-        # build your chain for RAG+C
-        template = """Combine the chat history and follow up question into 
-                a standalone question. 
-                If chat hsitory is empty, use the follow up question as it is.
-                Chat History: {chat_history}
-                Follow up question: {question}"""
-        # TRY TO ADD THE INPUT VARIABLES
-        prompt = PromptTemplate.from_template(template)
-        # question_generator_chain = LLMChain(llm=llm, prompt=prompt)
+    if "chain" not in st.session_state:
+        vector_store = load_db()
+        chain_type_kwargs = {"prompt": ANSWER_PROMPT}
+        # the LLM is shared by all sessions, only the memory is per session
+        llm = get_llm(streaming=True) if STREAM_ANSWERS else get_llm()
         print("vector store loaded !")
-        st.session_state.chain = ConversationalRetrievalChain.from_llm(
+        st.session_state.chain = RAGChain.from_llm(
             llm=llm,
             chain_type="stuff",
-            memory=ConversationSummaryMemory(
-                llm=llm,
-                memory_key="chat_history",
-                input_key="question",
-                output_key="answer",
-                return_messages=True,
-            ),
-            retriever=vector_store.as_retriever(search_type="mmr"),
-            condense_question_prompt=prompt,
+            memory=build_memory(llm),
+            retriever=build_retriever(vector_store),
+            condense_question_prompt=CONDENSE_QUESTION_PROMPT,
             return_source_documents=False,
             combine_docs_chain_kwargs=chain_type_kwargs,
+            answer_cache=get_answer_cache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL)
+            if SEMANTIC_CACHE_THRESHOLD > 0 else None,
+            context_packer=get_context_packer(CONTEXT_TOKEN_BUDGET) if CONTEXT_TOKEN_BUDGET > 0 else None,
+            question_router=get_question_router() if ROUTE_QUESTIONS else None,
         )
 
 
@@ -155,6 +245,11 @@ def on_click_callback():
         st.session_state.input_value = ""
         st.session_state.initial_message_sent = True
 
+        # the answer is streamed by main() into the chat, callbacks render above the page
+        if STREAM_ANSWERS:
+            st.session_state.pending_prompt = customer_prompt
+            return
+
         with st.spinner("Generating response..."):
 
             llm_response = st.session_state.chain(
@@ -169,9 +264,105 @@ def on_click_callback():
     st.session_state.history.append(Message("AI", llm_response))
 
 
+def render_message(origin, msg):
+    return f"""
+            <div class = "chatRow 
+            {'' if origin == 'AI' else 'rowReverse'}">
+                <img class="chatIcon" src = "app/static/{'elsa.png' if origin == 'AI' else 'admin.png'}" width=32 height=32>
+                <div class = "chatBubble {'adminBubble' if origin == 'AI' else 'humanBubble'}">&#8203; {msg}</div>
+            </div>"""
+
+
+def stream_pending_answer():
+    customer_prompt = st.session_state.pending_prompt
+    st.session_state.pending_prompt = None
+    st.markdown(render_message("customer", customer_prompt), unsafe_allow_html=True)
+
+    answer_placeholder = st.empty()
+    handler = AnswerStreamHandler(
+        on_token=lambda text: answer_placeholder.markdown(render_message("AI", text + " ▌"), unsafe_allow_html=True)
+    )
+    memory = st.session_state.chain.memory
+    scheduled = memory.stats.scheduled_summaries if isinstance(memory, BackgroundSummaryMemory) else 0
+    llm_response = st.session_state.chain(
+        {
+            "context": st.session_state.chain.memory.buffer,
+            "question": customer_prompt,
+        },
+        callbacks=[handler],
+        return_only_outputs=True,
+    )
+    answer_placeholder.markdown(render_message("AI", llm_response["answer"]), unsafe_allow_html=True)
+
+    timings = handler.timings()
+    # the summary calls scheduled in the background this turn instead of on the critical path
+    timings["deferred_llm_calls"] = (
+        memory.stats.scheduled_summaries - scheduled if isinstance(memory, BackgroundSummaryMemory) else 0
+    )
+    st.session_state.timings.append(timings)
+    st.session_state.history.append(Message("customer", customer_prompt))
+    st.session_state.history.append(Message("AI", llm_response))
+
+
+def show_turn_timings():
+    if not st.session_state.timings:
+        return
+    timings = st.session_state.timings[-1]
+    parts = []
+    if timings["time_to_first_token"] is not None:
+        parts.append(f"first token {timings['time_to_first_token']:.2f}s")
+    if timings["generation"] is not None:
+        parts.append(f"generation {timings['generation']:.2f}s")
+    else:
+        parts.append("answered from cache")
+    parts.append(f"total {timings['total']:.2f}s")
+    parts.append(f"{timings['llm_calls']} LLM calls waited for")
+    if timings["deferred_llm_calls"]:
+        parts.append(f"{timings['deferred_llm_calls']} moved off the critical path")
+    st.caption(" · ".join(parts))
+
+
+def show_resource_stats():
+    with st.sidebar.expander("Resource pool"):
+        st.json(resource_stats())
+
+    cache = st.session_state.chain.answer_cache
+    if cache is not None:
+        with st.sidebar.expander("Answer cache"):
+            st.write(f"hit rate: {cache.stats.hit_rate:.0%} ({cache.stats.hits}/{cache.stats.lookups})")
+            st.write(f"latency saved: {cache.stats.saved_seconds:.1f}s")
+
+    if RERANKER != "none":
+        with st.sidebar.expander("Reranker"):
+            st.json(get_reranker(RERANKER).stats.report())
+
+    memory = st.session_state.chain.memory
+    if isinstance(memory, BackgroundSummaryMemory) and memory.stats.turns:
+        with st.sidebar.expander("Conversation memory"):
+            st.write(f"{memory.stats.folded_turns} of {memory.stats.turns} turns summarized "
+                     f"in {memory.stats.background_summaries} background calls")
+            st.write(f"summarization time off the critical path: {memory.stats.background_seconds:.1f}s")
+
+    router = st.session_state.chain.question_router
+    if router is not None and router.stats.decisions:
+        with st.sidebar.expander("Question router"):
+            st.write(f"condense calls skipped: {router.stats.skipped} of {sum(router.stats.decisions.values())}")
+            st.write(f"latency saved: ~{router.stats.saved_seconds:.1f}s")
+            st.json(dict(router.stats.decisions))
+
+    packer = st.session_state.chain.context_packer
+    if packer is not None and packer.stats.queries:
+        with st.sidebar.expander("Context packer"):
+            st.write(f"tokens saved: {packer.stats.tokens_saved} of {packer.stats.tokens_in} "
+                     f"over {packer.stats.queries} queries")
+            st.write(f"chunks kept: {packer.stats.chunks_out}/{packer.stats.chunks_in}, "
+                     f"{packer.stats.duplicates} near-duplicates dropped")
+
+
 def main():
 
     initialize_session_state()
+    show_resource_stats()
     chat_placeholder = st.container()
     prompt_placeholder = st.form("chat-form")
 
@@ -181,13 +372,11 @@ def main():
                 msg = chat.Message["answer"]
             else:
                 msg = chat.Message
-            div = f"""
-            <div class = "chatRow 
-            {'' if chat.origin == 'AI' else 'rowReverse'}">
-                <img class="chatIcon" src = "app/static/{'elsa.png' if chat.origin == 'AI' else 'admin.png'}" width=32 height=32>
-                <div class = "chatBubble {'adminBubble' if chat.origin == 'AI' else 'humanBubble'}">&#8203; {msg}</div>
-            </div>"""
-            st.markdown(div, unsafe_allow_html=True)
+            st.markdown(render_message(chat.origin, msg), unsafe_allow_html=True)
+
+        if st.session_state.pending_prompt:
+            stream_pending_answer()
+        show_turn_timings()
 
     with st.form(key="chat_form"):
         cols = st.columns((6, 1))
@@ -0,0 +1,247 @@
+"""
+This module provides the cache shared by the market data tools (yfinance, Alpha Vantage and finviz). Payloads
+are keyed by (provider, endpoint, ticker, params) and expire after a time-to-live depending on the type of
+data, so quotes are refetched within a minute while a business summary is reused for days. An in-memory tier
+sits in front of a SQLite store that survives restarts, and concurrent callers asking for the same payload
+share one in-flight fetch.
+
+Classes:
+    MarketDataStats: A data class counting cache hits, misses and coalesced fetches.
+    MarketDataCache: The market data cache.
+
+Functions:
+    get_market_data_cache() -> MarketDataCache:
+        Returns the process-wide cache used by the tools.
+
+    set_market_data_cache(cache: MarketDataCache) -> None:
+        Replaces the process-wide cache, e.g. by one in memory for tests with stubbed providers.
+
+    cached_fetch(provider, endpoint, ticker, data_type, fetch, params) -> Any:
+        Returns a payload from the process-wide cache, fetching it on a miss.
+"""
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+MARKET_DATA_CACHE_PATH = "market_data_cache.sqlite"
+
+# seconds a payload of each data type stays fresh
+DEFAULT_TTLS = {
+    "quote": 60,
+    "history": 15 * 60,
+    "news": 15 * 60,
+    "sentiment": 30 * 60,
+    "info": 6 * 3600,
+    "financials": 24 * 3600,
+    "fundamentals": 24 * 3600,
+    "search": 7 * 24 * 3600,
+    "summary": 7 * 24 * 3600,
+}
+
+
+@dataclass
+class MarketDataStats:
+    """Class for keeping track of market data cache hits, misses and coalesced fetches."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.memory_hits + self.disk_hits + self.coalesced
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+
+class MarketDataCache:
+    """
+    A TTL cache of market data payloads with an in-memory LRU tier, a SQLite tier and request coalescing.
+    Failed fetches are not cached.
+
+    Args:
+        path (str): The path of the SQLite store. Use ":memory:" for a process local cache.
+        ttls (dict): The seconds a payload stays fresh per data type, merged into DEFAULT_TTLS.
+        memory_entries (int): The number of payloads kept in the in-memory tier.
+        clock (Callable[[], float]): Returns the current time in seconds, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        path: str = MARKET_DATA_CACHE_PATH,
+        ttls: Optional[Dict[str, float]] = None,
+        memory_entries: int = 2048,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.memory_entries = memory_entries
+        self.clock = clock
+        self.stats = MarketDataStats()
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS market_data (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS market_data_expires ON market_data (expires)")
+        self._db.commit()
+
+    @staticmethod
+    def key(provider: str, endpoint: str, ticker: str = "", params: Optional[Dict[str, Any]] = None) -> str:
+        return json.dumps([provider, endpoint, ticker.upper(), params or {}], sort_keys=True, default=str)
+
+    def _lookup(self, key: str, now: float) -> Tuple[bool, Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return True, entry[1]
+            del self._memory[key]
+
+        row = self._db.execute("SELECT value, expires FROM market_data WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] > now:
+            value = pickle.loads(row[0])
+            self._remember(key, row[1], value)
+            self.stats.disk_hits += 1
+            return True, value
+        return False, None
+
+    def _remember(self, key: str, expires: float, value: Any) -> None:
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, key: str, expires: float, value: Any, now: float) -> None:
+        self._remember(key, expires, value)
+        self._db.execute("INSERT OR REPLACE INTO market_data VALUES (?, ?, ?)", (key, pickle.dumps(value), expires))
+        self._db.execute("DELETE FROM market_data WHERE expires <= ?", (now,))
+        self._db.commit()
+
+    def get(
+        self,
+        provider: str,
+        endpoint: str,
+        ticker: str,
+        data_type: str,
+        fetch: Callable[[], Any],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """
+        Returns the cached payload, or fetches it once for all concurrent callers and caches it.
+
+        Args:
+            provider (str): The data provider, e.g. "yfinance".
+            endpoint (str): The endpoint or method of the provider, e.g. "info".
+            ticker (str): The ticker symbol, "" for data not bound to a ticker.
+            data_type (str): The type of data selecting the time-to-live, a key of DEFAULT_TTLS.
+            fetch (Callable[[], Any]): Fetches the payload from the provider on a miss.
+            params (dict): Further parameters of the request, e.g. the period of a history.
+
+        Returns:
+            Any: The payload.
+        """
+        ttl = self.ttls[data_type]
+        key = self.key(provider, endpoint, ticker, params)
+        with self._lock:
+            found, value = self._lookup(key, self.clock())
+            if found:
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future: Future = Future()
+                self._inflight[key] = future
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+        if inflight is not None:
+            return inflight.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self.stats.errors += 1
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            now = self.clock()
+            self._store(key, now + ttl, value, now)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def put(
+        self,
+        provider: str,
+        endpoint: str,
+        ticker: str,
+        data_type: str,
+        value: Any,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Stores a payload fetched elsewhere, e.g. in a bulk request, replacing a cached one.
+
+        Args:
+            provider (str): The data provider, e.g. "yfinance".
+            endpoint (str): The endpoint or method of the provider, e.g. "history".
+            ticker (str): The ticker symbol, "" for data not bound to a ticker.
+            data_type (str): The type of data selecting the time-to-live, a key of DEFAULT_TTLS.
+            value (Any): The payload.
+            params (dict): Further parameters of the request, e.g. the period of a history.
+        """
+        key = self.key(provider, endpoint, ticker, params)
+        with self._lock:
+            now = self.clock()
+            self._store(key, now + self.ttls[data_type], value, now)
+
+
+_cache: Optional[MarketDataCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_market_data_cache() -> MarketDataCache:
+    """Returns the process-wide cache used by the tools, created on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MarketDataCache()
+        return _cache
+
+
+def set_market_data_cache(cache: MarketDataCache) -> None:
+    """
+    Replaces the process-wide cache, e.g. by MarketDataCache(":memory:") in tests with stubbed providers.
+
+    Args:
+        cache (MarketDataCache): The cache used by the tools from now on.
+    """
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cached_fetch(
+    provider: str,
+    endpoint: str,
+    ticker: str,
+    data_type: str,
+    fetch: Callable[[], Any],
+    params: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    Returns a payload from the process-wide cache, fetching it on a miss. See MarketDataCache.get.
+    """
+    return get_market_data_cache().get(provider, endpoint, ticker, data_type, fetch, params)
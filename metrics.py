@@ -0,0 +1,50 @@
+"""
+This module provides small helpers to summarize latency measurements.
+
+Functions:
+    percentile(values: Sequence[float], q: float) -> float:
+        Computes the q-th percentile of a sequence using linear interpolation.
+
+    summarize_latencies(values: Sequence[float]) -> dict:
+        Summarizes latencies in seconds as count, mean, p50, p95 and p99 in milliseconds.
+"""
+from typing import Dict, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Computes the q-th percentile of a sequence using linear interpolation.
+
+    Args:
+        values (Sequence[float]): The measured values.
+        q (float): The percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0.0 for an empty sequence.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_latencies(values: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies in seconds as count, mean, p50, p95 and p99 in milliseconds.
+
+    Args:
+        values (Sequence[float]): The measured latencies in seconds.
+
+    Returns:
+        dict: The summary with the keys count, mean_ms, p50_ms, p95_ms and p99_ms.
+    """
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95),
+        "p99_ms": 1000 * percentile(values, 99),
+    }
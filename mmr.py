@@ -0,0 +1,144 @@
+"""
+This module provides a vectorized maximal marginal relevance (MMR) selection and a Qdrant retriever using it.
+The candidates are normalized once, their similarities to the query come from one matrix-vector product, and
+the maximal similarity of every candidate to the chunks selected so far is updated incrementally with one
+row of the candidate similarity matrix per selected chunk, instead of recomputing the similarities to all
+selected chunks in a Python loop over the candidates.
+
+Classes:
+    MMRRetriever: A retriever running MMR over the candidates fetched from Qdrant with their vectors.
+
+Functions:
+    mmr_select(query_vector, candidate_vectors, k, lambda_mult, similarity) -> List[int]:
+        Selects k candidates by maximal marginal relevance.
+
+    select_documents(query_vector, points, k, lambda_mult, collection_name) -> List[Document]:
+        Selects k of the points of a Qdrant query and returns them as documents.
+"""
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from context_packer import RELEVANCE_KEY
+from ingest_pipeline import CONTENT_PAYLOAD_KEY, METADATA_PAYLOAD_KEY
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(
+    query_vector,
+    candidate_vectors,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+    similarity: Optional[np.ndarray] = None,
+) -> List[int]:
+    """
+    Selects k candidates by maximal marginal relevance, i.e. repeatedly the candidate maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, s) for the selected s).
+    Selects the same candidates as langchain's maximal_marginal_relevance.
+
+    Args:
+        query_vector: The embedding of the query.
+        candidate_vectors: The embeddings of the candidates, one row per candidate.
+        k (int): The number of candidates to select.
+        lambda_mult (float): 1 ranks by relevance only, 0 by diversity only.
+        similarity (np.ndarray): The precomputed cosine similarity matrix of the candidates. Computed row
+            by row for the selected candidates if not given, which is cheaper as long as k << fetch_k.
+
+    Returns:
+        List[int]: The indices of the selected candidates in selection order.
+    """
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+    relevance = candidates @ query
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    while len(selected) < k:
+        last = selected[-1]
+        row = similarity[last] if similarity is not None else candidates @ candidates[last]
+        np.maximum(max_similarity, row, out=max_similarity)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def select_documents(
+    query_vector, points: List[Any], k: int, lambda_mult: float, collection_name: str
+) -> List[Document]:
+    """
+    Selects k of the points returned by a Qdrant query by mmr_select and returns them as documents with the
+    metadata of the langchain Qdrant vector store. Points queried without their vectors keep the relevance
+    order of the search. Shared by the sync retriever and the async API.
+
+    Args:
+        query_vector: The embedding of the query.
+        points (list): The scored points of the query, with payload and, for MMR, with vectors.
+        k (int): The number of documents to select.
+        lambda_mult (float): 1 ranks by relevance only, 0 by diversity only.
+        collection_name (str): The collection the points come from.
+
+    Returns:
+        List[Document]: The selected documents in selection order.
+    """
+    if not points:
+        return []
+    if lambda_mult >= 1 or points[0].vector is None:
+        selected = list(range(min(k, len(points))))
+    else:
+        selected = mmr_select(query_vector, [point.vector for point in points], k, lambda_mult)
+    documents = []
+    for i in selected:
+        payload = points[i].payload or {}
+        metadata = dict(payload.get(METADATA_PAYLOAD_KEY) or {})
+        metadata["_id"] = points[i].id
+        metadata["_collection_name"] = collection_name
+        metadata[RELEVANCE_KEY] = points[i].score
+        documents.append(Document(page_content=payload.get(CONTENT_PAYLOAD_KEY), metadata=metadata))
+    return documents
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Fetches the `fetch_k` nearest chunks with their vectors from a Qdrant collection in one query and returns
+    the `k` chunks selected by mmr_select.
+    """
+
+    client: Any
+    collection_name: str
+    embeddings: Embeddings
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    search_params: Optional[Any] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        # without diversity or when every candidate is returned, MMR keeps the relevance order of the search
+        relevance_only = self.lambda_mult >= 1 or self.k >= self.fetch_k
+        points = self.client.query_points(
+            self.collection_name,
+            query=query_vector,
+            limit=self.fetch_k,
+            search_params=self.search_params,
+            with_payload=True,
+            with_vectors=not relevance_only,
+        ).points
+        return select_documents(query_vector, points, self.k, self.lambda_mult, self.collection_name)
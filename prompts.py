@@ -0,0 +1,35 @@
+"""
+This module provides the prompt templates of the RAG chain. They are built once per process and shared by
+all sessions.
+
+Constants:
+    ANSWER_PROMPT: The prompt answering a question from the retrieved context.
+    CONDENSE_QUESTION_PROMPT: The prompt combining the chat history and a follow up question.
+"""
+from langchain.prompts import PromptTemplate
+
+# create custom prompt for your use case
+answer_template = """
+        You are a bot to answer questions from a document.
+
+        You will be given a context of the conversation made so far followed by a question,
+        give the answer to the question using the context.
+        The answer should be short, straight and to the point. If you don't know the answer, reply that the answer is not available.
+
+        Context: {context}
+
+        Question: {question}
+        Answer:"""
+
+ANSWER_PROMPT = PromptTemplate(
+    template=answer_template, input_variables=["context", "question"]
+)
+
+# build your chain for RAG+C
+condense_question_template = """Combine the chat history and follow up question into
+                a standalone question.
+                If chat hsitory is empty, use the follow up question as it is.
+                Chat History: {chat_history}
+                Follow up question: {question}"""
+
+CONDENSE_QUESTION_PROMPT = PromptTemplate.from_template(condense_question_template)
@@ -0,0 +1,106 @@
+"""
+This module provides the Qdrant settings for quantized storage of the 4096-dim rag_documents vectors.
+Scalar (int8) quantization shrinks the vectors searched in RAM by 4x and binary quantization by 32x.
+Searches oversample candidates on the quantized vectors and rescore them with the original float32 vectors.
+
+Functions:
+    vectors_config(size: int, kind: str) -> models.VectorParams:
+        Returns the vector params of a collection, keeping the originals on disk when they are quantized.
+
+    quantization_config(kind: str) -> Optional[models.QuantizationConfig]:
+        Returns the collection quantization config for "none", "scalar" or "binary".
+
+    search_params(kind: str, oversampling: float, rescore: bool) -> Optional[models.SearchParams]:
+        Returns the search params that oversample and rescore a quantized collection.
+
+    enable_quantization(client: QdrantClient, collection_name: str, kind: str) -> None:
+        Switches the quantization of an existing collection.
+"""
+from typing import Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+QUANTIZATION_KINDS = ("none", "scalar", "binary")
+
+# binary codes lose more information than int8 codes, so they need more candidates to rescore
+DEFAULT_OVERSAMPLING = {"scalar": 2.0, "binary": 3.0}
+
+
+def vectors_config(size: int, kind: str = "none") -> models.VectorParams:
+    """
+    Returns the cosine vector params of a collection. With quantization only the quantized vectors are
+    kept in RAM and the original vectors, which are only read for rescoring, stay on disk.
+
+    Args:
+        size (int): The dimension of the vectors.
+        kind (str): The quantization kind.
+
+    Returns:
+        VectorParams: The params to pass to create_collection.
+    """
+    return models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=kind != "none")
+
+
+def quantization_config(kind: str) -> Optional[models.QuantizationConfig]:
+    """
+    Returns the collection quantization config for "none", "scalar" or "binary".
+
+    Args:
+        kind (str): The quantization kind.
+
+    Returns:
+        QuantizationConfig: The config to pass to create_collection, or None for full precision only.
+    """
+    if kind == "none":
+        return None
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"unknown quantization {kind!r}, expected one of {QUANTIZATION_KINDS}")
+
+
+def search_params(
+    kind: str, oversampling: Optional[float] = None, rescore: bool = True
+) -> Optional[models.SearchParams]:
+    """
+    Returns the search params that oversample and rescore a quantized collection.
+
+    Args:
+        kind (str): The quantization kind of the collection.
+        oversampling (float): The factor of candidates fetched from the quantized vectors. Defaults per kind.
+        rescore (bool): Whether to rescore the candidates with the original vectors.
+
+    Returns:
+        SearchParams: The params to pass to searches, or None for a collection without quantization.
+    """
+    if kind == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            ignore=False,
+            rescore=rescore,
+            oversampling=oversampling or DEFAULT_OVERSAMPLING[kind],
+        )
+    )
+
+
+def enable_quantization(client: QdrantClient, collection_name: str, kind: str) -> None:
+    """
+    Switches the quantization of an existing collection. Qdrant builds the quantized vectors in the background.
+
+    Args:
+        client (QdrantClient): The client of the collection.
+        collection_name (str): The collection to update.
+        kind (str): The quantization kind.
+    """
+    config = quantization_config(kind)
+    client.update_collection(
+        collection_name=collection_name,
+        quantization_config=config if config is not None else models.Disabled.DISABLED,
+    )
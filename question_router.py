@@ -0,0 +1,166 @@
+"""
+This module provides the routing stage in front of the condense-question LLM call of the RAG chain. A question
+only needs to be rewritten into a standalone question when it depends on the conversation, so the router
+passes it through unchanged when there is no history or a cheap local heuristic judges it self-contained,
+and reuses the rewrite of the same question asked on the same history.
+
+Classes:
+    RouterStats: A data class counting the routing decisions and the condense latency they saved.
+    QuestionRouter: Decides whether a question is condensed and caches the rewrites.
+
+Functions:
+    is_self_contained(question: str) -> bool:
+        Judges whether a question can be understood without the conversation.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional, Tuple
+
+# words referring back to the conversation
+_REFERENCES = frozenset({
+    "it", "its", "it's", "this", "that", "these", "those", "they", "them", "their", "theirs", "he", "she", "him",
+    "her", "his", "hers", "there", "former", "latter", "above", "previous", "earlier", "same", "such", "again",
+    "else", "another", "other", "one", "ones", "more", "also", "too", "instead",
+})
+# openings continuing the previous question
+_CONTINUATIONS = ("and ", "but ", "so ", "or ", "then ", "what about", "how about", "why not", "what if", "why?")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could", "should", "would",
+    "will", "i", "you", "we", "me", "my", "your", "to", "of", "in", "on", "for", "with", "by", "at", "from", "as",
+    "how", "what", "which", "who", "why", "when", "where", "please", "tell", "explain", "show", "give", "about",
+})
+_WORD_RE = re.compile(r"[A-Za-z0-9_.'-]+")
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Judges whether a question can be understood without the conversation: it has no word referring back to
+    the conversation, does not continue the previous question and names at least two content words or a
+    code identifier.
+
+    Args:
+        question (str): The question of the user.
+
+    Returns:
+        bool: True if the question can be answered as it is.
+    """
+    text = question.strip().lower()
+    if text.startswith(_CONTINUATIONS):
+        return False
+    words = [word.strip(".'-") for word in _WORD_RE.findall(text)]
+    if any(word in _REFERENCES for word in words):
+        return False
+    content = [word for word in words if word and word not in _STOPWORDS]
+    return len(content) >= 2 or any("." in word or "_" in word for word in content)
+
+
+@dataclass
+class RouterStats:
+    """Class for keeping track of the routing decisions and the condense latency they saved."""
+
+    decisions: Counter = field(default_factory=Counter)
+    condense_seconds: float = 0.0
+    saved_seconds: float = 0.0
+
+    @property
+    def condensed(self) -> int:
+        return self.decisions["condensed"]
+
+    @property
+    def skipped(self) -> int:
+        return sum(self.decisions.values()) - self.condensed
+
+
+class QuestionRouter:
+    """
+    Decides whether a question goes through the condense-question LLM call and caches the rewrites by
+    (hash of the chat history, question).
+
+    Args:
+        cache_entries (int): The number of rewrites kept, the least recently used are dropped first.
+    """
+
+    def __init__(self, cache_entries: int = 1000):
+        self.cache_entries = cache_entries
+        self.stats = RouterStats()
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _record(self, decision: str, saved: bool, seconds: float = 0.0) -> None:
+        with self._lock:
+            self.stats.decisions[decision] += 1
+            self.stats.condense_seconds += seconds
+            if saved and self.stats.condensed:
+                # estimated by the mean latency of the condense calls made
+                self.stats.saved_seconds += self.stats.condense_seconds / self.stats.condensed
+
+    def _route(self, question: str, chat_history: str) -> Tuple[Optional[str], Optional[Tuple[str, str]]]:
+        # the standalone question if no condense call is needed, else None and the key of the rewrite
+        if not chat_history:
+            self._record("no_history", saved=True)
+            return question, None
+        if is_self_contained(question):
+            self._record("self_contained", saved=True)
+            return question, None
+
+        key = (hashlib.sha256(chat_history.encode("utf-8")).hexdigest(), question.strip())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            self._record("cached", saved=True)
+            return cached, key
+        return None, key
+
+    def _remember(self, key: Tuple[str, str], new_question: str, seconds: float) -> None:
+        self._record("condensed", saved=False, seconds=seconds)
+        with self._lock:
+            self._cache[key] = new_question
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def condense(self, question: str, chat_history: str, condense: Callable[[], str]) -> str:
+        """
+        Returns the standalone question, calling `condense` only when the question depends on the history
+        and was not condensed on the same history before.
+
+        Args:
+            question (str): The question of the user.
+            chat_history (str): The chat history as passed to the condense prompt.
+            condense (Callable[[], str]): Runs the condense-question LLM call.
+
+        Returns:
+            str: The standalone question.
+        """
+        new_question, key = self._route(question, chat_history)
+        if new_question is not None:
+            return new_question
+        started = time.monotonic()
+        new_question = condense()
+        self._remember(key, new_question, time.monotonic() - started)
+        return new_question
+
+    async def acondense(self, question: str, chat_history: str, condense: Callable[[], Awaitable[str]]) -> str:
+        """
+        Like condense, for a coroutine function running the condense-question LLM call.
+
+        Args:
+            question (str): The question of the user.
+            chat_history (str): The chat history as passed to the condense prompt.
+            condense (Callable[[], Awaitable[str]]): Runs the condense-question LLM call.
+
+        Returns:
+            str: The standalone question.
+        """
+        new_question, key = self._route(question, chat_history)
+        if new_question is not None:
+            return new_question
+        started = time.monotonic()
+        new_question = await condense()
+        self._remember(key, new_question, time.monotonic() - started)
+        return new_question
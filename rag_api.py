@@ -0,0 +1,572 @@
+"""
+This module provides a headless HTTP API of the RAG bot on aiohttp. It serves the pipeline initialize_session_state
+of main.py builds, i.e. the question router, the semantic answer cache, MMR retrieval from the rag_documents
+collection, the context packer and the answer prompt, to many concurrent conversations on one event loop instead
+of one blocking chain call per Streamlit session. The memory of a conversation is kept on the server under its
+conversation id. The query embeddings of concurrent requests are collected for a few milliseconds and embedded
+in one call, retrieval uses the async Qdrant client, and answers can be streamed as server-sent events.
+
+Endpoints:
+    POST /chat: Answers {"question": ..., "conversation_id": ..., "stream": false}. Without a conversation id a
+        new conversation is started, its id is returned with the answer.
+    DELETE /conversations/{conversation_id}: Forgets a conversation.
+    GET /stats: Returns the batching, cache, router and memory metrics.
+
+Classes:
+    EmbeddingBatchStats: A data class counting the queries and the embedding calls they were batched into.
+    MicroBatchEmbedder: Batches the query embeddings of concurrent requests.
+    ConversationStore: The per-conversation memories, bounded in number and idle time.
+    RAGService: The async RAG pipeline.
+
+Functions:
+    create_app(service: RAGService) -> web.Application:
+        Returns the aiohttp application serving the pipeline.
+
+    build_service(window_ms: float, max_batch: int) -> RAGService:
+        Builds the pipeline from the settings main.py reads from the Streamlit secrets.
+
+    main() -> None:
+        Runs the API server.
+
+Usage:
+    python rag_api.py --port 8080
+    python rag_api.py --batch-window-ms 5 --max-batch 96
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.documents import Document
+from langchain_core.prompts import BasePromptTemplate
+
+from context_packer import ContextPacker
+from ingestion import COLLECTION_NAME
+from mmr import select_documents
+from prompts import ANSWER_PROMPT, CONDENSE_QUESTION_PROMPT
+from question_router import QuestionRouter
+from semantic_cache import SemanticCache
+
+# same separator as the "stuff" documents chain of the Streamlit app
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+@dataclass
+class EmbeddingBatchStats:
+    """Class for keeping track of the embedded queries and the calls they were batched into."""
+
+    queries: int = 0
+    calls: int = 0
+    max_batch: int = 0
+    failures: int = 0
+
+    @property
+    def mean_batch(self) -> float:
+        return self.queries / self.calls if self.calls else 0.0
+
+
+class MicroBatchEmbedder:
+    """
+    Collects the queries to embed for up to `window_ms` milliseconds, or until `max_batch` queries are pending,
+    and embeds them in one call of `embed_queries` on a worker thread. Identical pending queries are embedded
+    once. Must be used from one event loop.
+
+    Args:
+        embed_queries (Callable[[List[str]], List[List[float]]]): Embeds query texts in one call, e.g.
+            CachedEmbeddings.embed_queries.
+        window_ms (float): The milliseconds the first query of a batch waits for others.
+        max_batch (int): The number of queries that flush a batch at once, 1 disables batching.
+    """
+
+    def __init__(
+        self,
+        embed_queries: Callable[[List[str]], List[List[float]]],
+        window_ms: float = 5.0,
+        max_batch: int = 96,
+    ):
+        self.embed_queries = embed_queries
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.stats = EmbeddingBatchStats()
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query text together with the queries of the other requests pending in the window.
+
+        Args:
+            text (str): The query text.
+
+        Returns:
+            List[float]: The embedding of the query.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._embed(batch))
+            # the loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.stats.queries += len(batch)
+        self.stats.calls += 1
+        self.stats.max_batch = max(self.stats.max_batch, len(texts))
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(None, self.embed_queries, texts)
+        except Exception as e:
+            self.stats.failures += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            # the request may have been cancelled, e.g. by a disconnected client
+            if not future.done():
+                future.set_result(by_text[text])
+
+
+@dataclass
+class _Conversation:
+    memory: BaseChatMemory
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConversationStore:
+    """
+    Keeps the memory of each conversation under its id. Conversations idle for longer than `ttl` seconds are
+    dropped, and the least recently used ones once there are more than `max_conversations`.
+
+    Args:
+        memory_factory (Callable[[], BaseChatMemory]): Creates the memory of a new conversation.
+        max_conversations (int): The number of conversations kept.
+        ttl (float): The seconds a conversation is kept after its last turn.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Callable[[], BaseChatMemory],
+        max_conversations: int = 10_000,
+        ttl: float = 3600.0,
+    ):
+        self.memory_factory = memory_factory
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.created = 0
+        self.expired = 0
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def get(self, conversation_id: str) -> _Conversation:
+        """Returns the conversation with the id, starting it if it is new or expired."""
+        self._drop_expired()
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            conversation = self._conversations[conversation_id] = _Conversation(memory=self.memory_factory())
+            self.created += 1
+            self._drop_least_recent(keep=conversation_id)
+        self._conversations.move_to_end(conversation_id)
+        conversation.last_used = time.monotonic()
+        return conversation
+
+    def delete(self, conversation_id: str) -> bool:
+        """Forgets a conversation, returns whether it existed."""
+        return self._conversations.pop(conversation_id, None) is not None
+
+    def _drop_expired(self) -> None:
+        oldest_valid = time.monotonic() - self.ttl
+        # ordered by last use, so the expired ones are at the front
+        while self._conversations:
+            conversation_id, conversation = next(iter(self._conversations.items()))
+            if conversation.last_used >= oldest_valid or conversation.lock.locked():
+                return
+            del self._conversations[conversation_id]
+            self.expired += 1
+
+    def _drop_least_recent(self, keep: str) -> None:
+        # like the expired ones, conversations answering a question right now are kept
+        excess = len(self._conversations) - self.max_conversations
+        dropped = []
+        for conversation_id, conversation in self._conversations.items():
+            if len(dropped) >= excess:
+                break
+            if conversation_id != keep and not conversation.lock.locked():
+                dropped.append(conversation_id)
+        for conversation_id in dropped:
+            del self._conversations[conversation_id]
+            self.expired += 1
+
+
+class RAGService:
+    """
+    The async counterpart of the RAGChain main.py builds: condenses the question with the conversation history,
+    answers it from the semantic answer cache or retrieves with MMR from Qdrant, packs the context and generates
+    the answer, then stores the turn in the memory of the conversation. The turns of one conversation run one
+    after another, different conversations concurrently.
+
+    Args:
+        llm (BaseChatModel): The chat model, shared by all conversations.
+        embedder (MicroBatchEmbedder): Embeds the standalone questions.
+        client (AsyncQdrantClient): The async Qdrant client.
+        conversations (ConversationStore): The memories of the conversations.
+        collection_name (str): The collection to retrieve from.
+        k (int): The number of chunks retrieved.
+        fetch_k (int): The number of candidates fetched for MMR.
+        lambda_mult (float): The MMR relevance weight, 1 ranks by relevance only.
+        search_params (SearchParams): The search params of a quantized collection.
+        answer_cache (SemanticCache): The semantic answer cache, None disables caching.
+        context_packer (ContextPacker): Packs the chunks into the token budget, None passes them unchanged.
+        question_router (QuestionRouter): Skips needless condense calls, None condenses every follow-up.
+        answer_prompt (BasePromptTemplate): The prompt answering from the context.
+        condense_prompt (BasePromptTemplate): The prompt condensing a follow-up question.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        embedder: MicroBatchEmbedder,
+        client: Any,
+        conversations: ConversationStore,
+        collection_name: str = COLLECTION_NAME,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        search_params: Optional[Any] = None,
+        answer_cache: Optional[SemanticCache] = None,
+        context_packer: Optional[ContextPacker] = None,
+        question_router: Optional[QuestionRouter] = None,
+        answer_prompt: BasePromptTemplate = ANSWER_PROMPT,
+        condense_prompt: BasePromptTemplate = CONDENSE_QUESTION_PROMPT,
+    ):
+        self.llm = llm
+        self.embedder = embedder
+        self.client = client
+        self.conversations = conversations
+        self.collection_name = collection_name
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.search_params = search_params
+        self.answer_cache = answer_cache
+        self.context_packer = context_packer
+        self.question_router = question_router
+        self.answer_prompt = answer_prompt
+        self.condense_prompt = condense_prompt
+
+    async def _condense(self, question: str, chat_history: str) -> str:
+        async def condense() -> str:
+            message = await self.llm.ainvoke(self.condense_prompt.format(question=question, chat_history=chat_history))
+            return message.content
+
+        if self.question_router is not None:
+            return await self.question_router.acondense(question, chat_history, condense)
+        if not chat_history:
+            return question
+        return await condense()
+
+    async def retrieve(self, question: str, query_vector: List[float]) -> List[Document]:
+        """
+        Retrieves the chunks of a standalone question with MMR and packs them into the token budget.
+
+        Args:
+            question (str): The standalone question.
+            query_vector (List[float]): The embedding of the question.
+
+        Returns:
+            List[Document]: The chunks of the answer prompt.
+        """
+        # without diversity or when every candidate is returned, MMR keeps the relevance order of the search
+        relevance_only = self.lambda_mult >= 1 or self.k >= self.fetch_k
+        response = await self.client.query_points(
+            self.collection_name,
+            query=query_vector,
+            limit=self.fetch_k,
+            search_params=self.search_params,
+            with_payload=True,
+            with_vectors=not relevance_only,
+        )
+        docs = select_documents(query_vector, response.points, self.k, self.lambda_mult, self.collection_name)
+        if self.context_packer is not None:
+            docs = self.context_packer.pack(docs)
+        return docs
+
+    async def _generate(
+        self, question: str, docs: List[Document], on_token: Optional[Callable[[str], Awaitable[None]]]
+    ) -> str:
+        prompt = self.answer_prompt.format(
+            context=DOCUMENT_SEPARATOR.join(doc.page_content for doc in docs), question=question
+        )
+        if on_token is None:
+            return (await self.llm.ainvoke(prompt)).content
+        answer = ""
+        async for chunk in self.llm.astream(prompt):
+            answer += chunk.content
+            await on_token(chunk.content)
+        return answer
+
+    async def answer(
+        self,
+        question: str,
+        conversation_id: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Answers a question of a conversation and stores the turn in its memory.
+
+        Args:
+            question (str): The question of the user.
+            conversation_id (str): The id of the conversation, a new id starts a conversation.
+            on_token (Callable[[str], Awaitable[None]]): Awaited with every new token of the answer, with the
+                whole answer for an answer from the cache. None generates without streaming.
+
+        Returns:
+            dict: The answer, the conversation_id, the generated_question, whether the answer was cached and the
+                timings of the turn in seconds.
+        """
+        conversation = self.conversations.get(conversation_id)
+        async with conversation.lock:
+            started = time.monotonic()
+            memory = conversation.memory
+            chat_history = _get_chat_history(memory.load_memory_variables({})[memory.memory_key])
+            new_question = await self._condense(question, chat_history)
+            condensed = time.monotonic()
+            query_vector = await self.embedder.embed_query(new_question)
+            embedded = time.monotonic()
+
+            retrieved = None
+            answer = self.answer_cache.lookup(new_question, query_vector) if self.answer_cache is not None else None
+            cached = answer is not None
+            if cached:
+                if on_token is not None:
+                    await on_token(answer)
+            else:
+                docs = await self.retrieve(new_question, query_vector)
+                retrieved = time.monotonic()
+                answer = await self._generate(new_question, docs, on_token)
+                if self.answer_cache is not None:
+                    self.answer_cache.add(
+                        new_question, answer, latency=time.monotonic() - embedded, vector=query_vector
+                    )
+            memory.save_context({"question": question}, {"answer": answer})
+            finished = time.monotonic()
+
+        return {
+            "answer": answer,
+            "conversation_id": conversation_id,
+            "generated_question": new_question,
+            "cached": cached,
+            "timings": {
+                "condense": condensed - started,
+                "embed": embedded - condensed,
+                "retrieve": retrieved - embedded if retrieved else None,
+                "generation": finished - retrieved if retrieved else None,
+                "total": finished - started,
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the batching, cache, router and conversation metrics."""
+        stats: Dict[str, Any] = {
+            "embedding_batches": {**asdict(self.embedder.stats), "mean_batch": self.embedder.stats.mean_batch},
+            "conversations": {
+                "active": len(self.conversations),
+                "created": self.conversations.created,
+                "expired": self.conversations.expired,
+            },
+        }
+        if self.answer_cache is not None:
+            stats["answer_cache"] = {**asdict(self.answer_cache.stats), "hit_rate": self.answer_cache.stats.hit_rate}
+        if self.question_router is not None:
+            stats["question_router"] = {
+                "decisions": dict(self.question_router.stats.decisions),
+                "saved_seconds": self.question_router.stats.saved_seconds,
+            }
+        if self.context_packer is not None:
+            stats["context_packer"] = asdict(self.context_packer.stats)
+        return stats
+
+
+SERVICE_KEY = web.AppKey("service", RAGService)
+
+
+def _event(data: Dict[str, Any]) -> bytes:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def _chat(request: web.Request) -> web.StreamResponse:
+    service = request.app[SERVICE_KEY]
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="the body must be a JSON object")
+    question = str(body.get("question") or "").strip() if isinstance(body, dict) else ""
+    if not question:
+        raise web.HTTPBadRequest(text="question is required")
+    conversation_id = str(body.get("conversation_id") or uuid.uuid4().hex)
+
+    if not body.get("stream"):
+        return web.json_response(await service.answer(question, conversation_id))
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    disconnected = False
+
+    async def send(data: Dict[str, Any]) -> None:
+        # after the client went away the answer is still finished and stored in the conversation, unsent
+        nonlocal disconnected
+        if disconnected:
+            return
+        try:
+            await response.write(_event(data))
+        except ConnectionResetError:
+            disconnected = True
+
+    try:
+        result = await service.answer(question, conversation_id, on_token=lambda token: send({"token": token}))
+        await send({"done": True, **result})
+    except Exception as e:
+        # the status is sent already, the error goes into the stream
+        print(f"rag api: answering {conversation_id} failed: {e}")
+        await send({"error": str(e), "conversation_id": conversation_id})
+    if not disconnected:
+        try:
+            await response.write_eof()
+        except ConnectionResetError:
+            pass
+    return response
+
+
+async def _delete_conversation(request: web.Request) -> web.Response:
+    if not request.app[SERVICE_KEY].conversations.delete(request.match_info["conversation_id"]):
+        raise web.HTTPNotFound(text="unknown conversation")
+    return web.json_response({"deleted": request.match_info["conversation_id"]})
+
+
+async def _stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app[SERVICE_KEY].stats())
+
+
+def create_app(service: RAGService) -> web.Application:
+    """
+    Returns the aiohttp application serving the pipeline. The Qdrant client of the service is closed with the
+    application.
+
+    Args:
+        service (RAGService): The pipeline.
+
+    Returns:
+        web.Application: The application.
+    """
+    app = web.Application()
+    app[SERVICE_KEY] = service
+    app.router.add_post("/chat", _chat)
+    app.router.add_delete("/conversations/{conversation_id}", _delete_conversation)
+    app.router.add_get("/stats", _stats)
+
+    async def close_client(app: web.Application) -> None:
+        await app[SERVICE_KEY].client.close()
+
+    app.on_cleanup.append(close_client)
+    return app
+
+
+def build_service(window_ms: float = 5.0, max_batch: int = 96) -> RAGService:
+    """
+    Builds the pipeline from the Qdrant, retrieval, cache, router and memory settings main.py reads from the
+    Streamlit secrets, sharing the embedder, the LLMs and the caches through resources.py. Retrieval is dense
+    MMR from the Qdrant cluster. The hybrid retriever, the reranker and the local backend stay with the Streamlit
+    app, they are synchronous.
+
+    Args:
+        window_ms (float): The milliseconds queries wait to be embedded together.
+        max_batch (int): The maximal number of queries embedded in one call.
+
+    Returns:
+        RAGService: The pipeline.
+    """
+    import streamlit as st
+    from qdrant_client import AsyncQdrantClient
+
+    from background_memory import BackgroundSummaryMemory
+    from quantization import search_params
+    from resources import get_answer_cache, get_context_packer, get_embeddings, get_llm, get_question_router
+
+    os.environ["COHERE_API_KEY"] = st.secrets["COHERE_API_KEY"]
+    semantic_cache_threshold = float(st.secrets.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+    context_token_budget = int(st.secrets.get("CONTEXT_TOKEN_BUDGET", 2000))
+    memory_window_turns = int(st.secrets.get("MEMORY_WINDOW_TURNS", 3))
+    mmr_fetch_k = int(st.secrets.get("MMR_FETCH_K", 20))
+
+    # the summaries are generated off the critical path and need no streaming
+    summary_llm = get_llm()
+    return RAGService(
+        llm=get_llm(streaming=True),
+        embedder=MicroBatchEmbedder(get_embeddings().embed_queries, window_ms=window_ms, max_batch=max_batch),
+        client=AsyncQdrantClient(
+            url=st.secrets["QDRANT_HOST"],
+            api_key=st.secrets["QDRANT_API_KEY"],
+            prefer_grpc=st.secrets.get("QDRANT_PREFER_GRPC", True),
+        ),
+        conversations=ConversationStore(
+            lambda: BackgroundSummaryMemory(
+                llm=summary_llm,
+                memory_key="chat_history",
+                input_key="question",
+                output_key="answer",
+                return_messages=True,
+                window_turns=memory_window_turns,
+            ),
+            ttl=float(st.secrets.get("CONVERSATION_TTL", 3600)),
+        ),
+        k=4,
+        fetch_k=max(mmr_fetch_k, 4),
+        lambda_mult=float(st.secrets.get("MMR_LAMBDA", 0.5)),
+        search_params=search_params(st.secrets.get("QDRANT_QUANTIZATION", "none")),
+        answer_cache=get_answer_cache(semantic_cache_threshold, float(st.secrets.get("SEMANTIC_CACHE_TTL", 24 * 3600)))
+        if semantic_cache_threshold > 0 else None,
+        context_packer=get_context_packer(context_token_budget) if context_token_budget > 0 else None,
+        question_router=get_question_router() if st.secrets.get("ROUTE_QUESTIONS", True) else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="milliseconds queries wait to be embedded together")
+    parser.add_argument("--max-batch", type=int, default=96, help="maximal queries per embedding call, 1 disables batching")
+    args = parser.parse_args()
+
+    web.run_app(create_app(build_service(args.batch_window_ms, args.max_batch)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+This module provides the conversational RAG chain of the bot. It is a ConversationalRetrievalChain whose call
+is split into explicit stages (condense the question, retrieve, answer), so that the stages can be cached,
+measured and replaced individually.
+
+Classes:
+    RAGChain: A ConversationalRetrievalChain with a semantic answer cache in front of retrieval and generation
+        and a context packer between retrieval and generation.
+    AnswerStreamHandler: A callback handler that streams the tokens of the answer and measures their timing.
+"""
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForChainRun
+from langchain_core.documents import Document
+
+from context_packer import ContextPacker
+from question_router import QuestionRouter
+from semantic_cache import SemanticCache
+
+# tags the LLM run that generates the answer, as opposed to the one condensing the question
+ANSWER_TAG = "rag_answer"
+
+
+class AnswerStreamHandler(BaseCallbackHandler):
+    """
+    Passes the answer generated so far to `on_token` for every new token of the answer LLM run and
+    measures the time to first token and the generation time of the turn. The LLM has to be created
+    with streaming=True to produce tokens.
+
+    Args:
+        on_token (Callable[[str], None]): Called with the answer generated so far.
+    """
+
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+        self.text = ""
+        self.started = time.monotonic()
+        self.generation_started: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.llm_calls = 0
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, tags=None, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        if tags and ANSWER_TAG in tags:
+            self.generation_started = time.monotonic()
+
+    def on_llm_new_token(self, token: str, *, tags=None, **kwargs: Any) -> None:
+        if not tags or ANSWER_TAG not in tags:
+            return
+        if self.first_token is None:
+            self.first_token = time.monotonic()
+        self.text += token
+        self.on_token(self.text)
+
+    def on_llm_end(self, response: Any, *, tags=None, **kwargs: Any) -> None:
+        if tags and ANSWER_TAG in tags:
+            self.finished = time.monotonic()
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """
+        Returns the timings of the turn in seconds since the handler was created.
+
+        Returns:
+            dict: time_to_first_token, generation (answer LLM start to end), total and llm_calls, the number
+                of LLM calls the turn waited for.
+        """
+        return {
+            "time_to_first_token": self.first_token - self.started if self.first_token else None,
+            "generation": self.finished - self.generation_started
+            if self.finished and self.generation_started else None,
+            "total": time.monotonic() - self.started,
+            "llm_calls": self.llm_calls,
+        }
+
+
+class RAGChain(ConversationalRetrievalChain):
+    """
+    A ConversationalRetrievalChain that answers a standalone question from the semantic answer cache when
+    a similar question was answered before, and only retrieves and generates on a miss.
+    """
+
+    answer_cache: Optional[SemanticCache] = None
+    """The semantic cache of answers, shared by all sessions. None disables caching."""
+
+    context_packer: Optional[ContextPacker] = None
+    """Packs the retrieved chunks into the token budget of the prompt. None passes them unchanged."""
+
+    question_router: Optional[QuestionRouter] = None
+    """Skips the condense-question call for self-contained questions. None condenses every follow-up."""
+
+    def _condense(
+        self, question: str, chat_history_str: str, run_manager: CallbackManagerForChainRun
+    ) -> str:
+        def condense() -> str:
+            return self.question_generator.run(
+                question=question, chat_history=chat_history_str, callbacks=run_manager.get_child()
+            )
+
+        if self.question_router is not None:
+            return self.question_router.condense(question, chat_history_str, condense)
+        if not chat_history_str:
+            return question
+        return condense()
+
+    def _retrieve(
+        self, question: str, inputs: Dict[str, Any], run_manager: CallbackManagerForChainRun
+    ) -> List[Document]:
+        if "run_manager" in inspect.signature(self._get_docs).parameters:
+            docs = self._get_docs(question, inputs, run_manager=run_manager)
+        else:
+            docs = self._get_docs(question, inputs)  # type: ignore[call-arg]
+        if self.context_packer is not None:
+            docs = self.context_packer.pack(docs)
+        return docs
+
+    def _answer(
+        self,
+        question: str,
+        new_question: str,
+        docs: List[Document],
+        inputs: Dict[str, Any],
+        chat_history_str: str,
+        run_manager: CallbackManagerForChainRun,
+    ) -> str:
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self.response_if_no_docs_found
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        callbacks = run_manager.get_child()
+        callbacks.add_tags([ANSWER_TAG])
+        return self.combine_docs_chain.run(input_documents=docs, callbacks=callbacks, **new_inputs)
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        new_question = self._condense(question, chat_history_str, _run_manager)
+        output: Dict[str, Any] = {}
+
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(new_question)
+            if cached is not None:
+                output[self.output_key] = cached
+                if self.return_source_documents:
+                    output["source_documents"] = []
+                if self.return_generated_question:
+                    output["generated_question"] = new_question
+                return output
+
+        started = time.monotonic()
+        docs = self._retrieve(new_question, inputs, _run_manager)
+        answer = self._answer(question, new_question, docs, inputs, chat_history_str, _run_manager)
+        output[self.output_key] = answer
+        if self.answer_cache is not None:
+            self.answer_cache.add(new_question, answer, latency=time.monotonic() - started)
+
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = new_question
+        return output
@@ -0,0 +1,104 @@
+"""
+This module provides helpers to stay within the rate limits of remote APIs.
+
+Classes:
+    TokenBucket: A thread-safe token bucket that blocks callers until a token is available.
+
+Functions:
+    retry_with_jitter(func, max_retries, base_delay, max_delay, retry_on) -> Any:
+        Calls a function and retries it with exponential back-off and full jitter.
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Tuple, Type
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are refilled continuously at `rate` per second up to `capacity`,
+    and acquire() blocks until enough tokens are available, so bursts beyond the quota are queued
+    instead of failing.
+
+    Args:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximal number of tokens, i.e. the allowed burst size.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, calls: float, burst: float = 1.0) -> "TokenBucket":
+        """Creates a bucket allowing `calls` per minute with bursts of `burst` calls."""
+        return cls(rate=calls / 60.0, capacity=burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Takes tokens if they are available right now and returns whether it did."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Blocks until tokens are available and takes them. Raises a ValueError for more tokens than the
+        capacity, they would never be available.
+
+        Returns:
+            float: The number of seconds the caller waited.
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"cannot acquire {tokens} tokens from a bucket of capacity {self.capacity}")
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def retry_with_jitter(
+    func: Callable[[], Any],
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+) -> Any:
+    """
+    Calls a function and retries it with exponential back-off and full jitter.
+
+    Args:
+        func (Callable): The function to call without arguments.
+        max_retries (int): The number of retries after the first attempt.
+        base_delay (float): The back-off in seconds before the first retry.
+        max_delay (float): The upper bound of the back-off in seconds.
+        retry_on (tuple): The exception types that trigger a retry.
+
+    Returns:
+        Any: The return value of the function.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except retry_on:
+            if attempt >= max_retries:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
@@ -0,0 +1,146 @@
+"""
+This module persists the outputs of the analysis steps, so a rerun of a report only recomputes the steps whose
+inputs changed. A step output is keyed by its prompt template and its input variables (ticker, period, topics
+and the outputs of the steps it depends on) and is valid for the trading date it was computed on. Rerunning a
+ticker on the same day reuses every step, and unchecking a step reuses the data-gathering steps and only
+regenerates the rating from their cached outputs.
+
+Classes:
+    ReportCacheStats: A data class counting reused and recomputed steps.
+    ReportCache: The SQLite store of the step outputs.
+
+Functions:
+    trading_date(now: datetime) -> str:
+        Returns the date of the latest US trading session.
+
+    get_report_cache() -> ReportCache:
+        Returns the process-wide report cache.
+"""
+import hashlib
+import json
+import sqlite3
+import string
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from zoneinfo import ZoneInfo
+
+REPORT_CACHE_PATH = "report_cache.sqlite"
+
+_EXCHANGE_TIMEZONE = ZoneInfo("America/New_York")
+
+# the output AgentExecutor returns instead of an answer when it hits max_iterations or max_execution_time
+_EARLY_STOP_PREFIX = "Agent stopped due to"
+
+
+def trading_date(now: Optional[datetime] = None) -> str:
+    """
+    Returns the date of the latest US trading session, weekends map to the Friday before. Exchange holidays
+    are not taken into account, their reports are recomputed once more than needed.
+
+    Args:
+        now (datetime): The time, defaults to now.
+
+    Returns:
+        str: The date in ISO format.
+    """
+    day = (now or datetime.now(_EXCHANGE_TIMEZONE)).astimezone(_EXCHANGE_TIMEZONE).date()
+    if day.weekday() >= 5:
+        day -= timedelta(days=day.weekday() - 4)
+    return day.isoformat()
+
+
+@dataclass
+class ReportCacheStats:
+    """Class for keeping track of the reused and recomputed steps and the time the reuse saved."""
+
+    hits: int = 0
+    misses: int = 0
+    saved_seconds: float = 0.0
+
+
+class ReportCache:
+    """
+    Persists step outputs by (trading date, prompt template, input variables used by the template). Outputs of earlier trading
+    dates are deleted when a new output is stored.
+
+    Args:
+        path (str): The path of the SQLite store. Use ":memory:" for a process local cache.
+        today (Callable[[], str]): Returns the current trading date, replaceable in tests.
+    """
+
+    def __init__(self, path: str = REPORT_CACHE_PATH, today: Callable[[], str] = trading_date):
+        self.today = today
+        self.stats = ReportCacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS step_outputs (key TEXT PRIMARY KEY, trading_date TEXT NOT NULL, "
+            "output TEXT NOT NULL, seconds REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(prompt_template: str, input: Dict[str, Any], date: str) -> str:
+        # only the variables the template uses, so e.g. the summary step is reused for another period
+        names = {name for _, name, _, _ in string.Formatter().parse(prompt_template) if name}
+        variables = {name: str(value).strip() for name, value in input.items() if name in names}
+        if "ticker" in variables:
+            variables["ticker"] = variables["ticker"].upper()
+        payload = json.dumps([date, prompt_template, variables], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def memoize(self, invoke: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        """
+        Wraps an agent runner to return the stored output of a step run with the same prompt template and
+        input on the same trading date, and to store the outputs it computes. Failed steps, including the ones
+        the agent stopped early at its iteration or time limit, are not stored.
+
+        Args:
+            invoke (Callable): Runs an agent, called as invoke(input=..., tools=..., prompt_template=...) and
+                returning a dict with the key "output", e.g. invoke_cohere_with_tools.
+
+        Returns:
+            Callable: The agent runner with the same signature.
+        """
+
+        def cached_invoke(input: Dict[str, Any], tools, prompt_template: str = "{input}", **kwargs: Any):
+            date = self.today()
+            key = self.key(prompt_template, input, date)
+            with self._lock:
+                row = self._db.execute("SELECT output, seconds FROM step_outputs WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.stats.hits += 1
+                    self.stats.saved_seconds += row[1]
+            if row is not None:
+                return {**input, "output": row[0]}
+
+            started = time.monotonic()
+            response = invoke(input=input, tools=tools, prompt_template=prompt_template, **kwargs)
+            seconds = time.monotonic() - started
+            with self._lock:
+                self.stats.misses += 1
+                if not response["output"] or str(response["output"]).startswith(_EARLY_STOP_PREFIX):
+                    return response
+                self._db.execute("INSERT OR REPLACE INTO step_outputs VALUES (?, ?, ?, ?)",
+                                 (key, date, response["output"], seconds))
+                self._db.execute("DELETE FROM step_outputs WHERE trading_date < ?", (date,))
+                self._db.commit()
+            return response
+
+        return cached_invoke
+
+
+_cache: Optional[ReportCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    """Returns the process-wide report cache, created on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReportCache()
+        return _cache
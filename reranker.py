@@ -0,0 +1,220 @@
+"""
+This module provides the second stage of a two-stage retrieval. The first stage over-retrieves candidates
+cheaply, and a reranker scores every candidate against the query to pick the few chunks stuffed into the
+prompt. Scores are computed in batches and cached per (scorer, query, chunk hash), so a repeated question
+or a chunk retrieved again for the same question is not scored twice.
+
+Classes:
+    Reranker: The base class of the scorers.
+    CohereReranker: Scores with the Cohere rerank endpoint.
+    LexicalReranker: Scores locally with lexical overlap features, for offline and test use.
+    RerankStats: A data class counting the reranked candidates, cache hits and reranking latency.
+    RerankingRetriever: A retriever reranking the candidates of a first stage retriever.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from bm25_index import tokenize
+from context_packer import RELEVANCE_KEY
+from metrics import summarize_latencies
+
+
+@dataclass
+class RerankStats:
+    """Class for keeping track of the reranked candidates, the score cache and the reranking latency."""
+
+    queries: int = 0
+    candidates: int = 0
+    cache_hits: int = 0
+    scored: int = 0
+    batches: int = 0
+    # share of the returned chunks that the first stage ranked in its own top n, lower means the reranker
+    # changed more of the context
+    first_stage_overlap: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    def report(self) -> dict:
+        return {
+            "queries": self.queries,
+            "candidates": self.candidates,
+            "cache_hit_rate": self.cache_hits / self.candidates if self.candidates else 0.0,
+            "scored": self.scored,
+            "batches": self.batches,
+            "first_stage_overlap": self.first_stage_overlap / self.queries if self.queries else 0.0,
+            **summarize_latencies(self.latencies),
+        }
+
+
+class Reranker(ABC):
+    """
+    The base class of the scorers. Subclasses implement `_score_batch`, scoring the uncached chunks of a query.
+
+    Args:
+        batch_size (int): The maximal number of chunks scored in one call.
+        cache_entries (int): The number of (query, chunk) scores kept, the least recently used are dropped first.
+    """
+
+    name = "reranker"
+
+    def __init__(self, batch_size: int = 64, cache_entries: int = 50_000):
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self.stats = RerankStats()
+        self._cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        """Returns the relevance scores of at most `batch_size` chunks for the query, higher is more relevant."""
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Scores texts against a query, from the cache where possible and in batches otherwise.
+
+        Args:
+            query (str): The query.
+            texts (List[str]): The texts of the candidates.
+
+        Returns:
+            List[float]: The relevance scores, higher is more relevant.
+        """
+        keys = [(self.name, query, hashlib.sha256(text.encode("utf-8")).hexdigest()) for text in texts]
+        scores: List[Optional[float]] = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        batches = 0
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for i, score in zip(batch, self._score_batch(query, [texts[i] for i in batch])):
+                scores[i] = score
+            batches += 1
+
+        with self._lock:
+            for i in missing:
+                self._cache[keys[i]] = scores[i]
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+            self.stats.candidates += len(texts)
+            self.stats.cache_hits += len(texts) - len(missing)
+            self.stats.scored += len(missing)
+            self.stats.batches += batches
+        return scores
+
+    def record(self, latency: float, first_stage_overlap: float) -> None:
+        """
+        Records a reranked query.
+
+        Args:
+            latency (float): The seconds spent reranking the candidates of the query.
+            first_stage_overlap (float): The share of the returned chunks the first stage ranked as high.
+        """
+        with self._lock:
+            self.stats.queries += 1
+            self.stats.first_stage_overlap += first_stage_overlap
+            self.stats.latencies.append(latency)
+            del self.stats.latencies[:-1000]
+
+
+class CohereReranker(Reranker):
+    """
+    Scores with the Cohere rerank endpoint, which accepts up to 1000 documents per request.
+
+    Args:
+        model (str): The Cohere rerank model.
+        client (cohere.Client): The Cohere client. Defaults to a client for COHERE_API_KEY.
+        batch_size (int): The maximal number of chunks per request.
+        cache_entries (int): The number of cached scores.
+    """
+
+    name = "cohere"
+
+    def __init__(self, model: str = "rerank-english-v3.0", client=None, batch_size: int = 100,
+                 cache_entries: int = 50_000):
+        super().__init__(batch_size=batch_size, cache_entries=cache_entries)
+        if client is None:
+            import cohere
+
+            client = cohere.Client(os.environ["COHERE_API_KEY"])
+        self.model = model
+        self.client = client
+
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        response = self.client.rerank(query=query, documents=texts, model=self.model, top_n=len(texts))
+        scores = [0.0] * len(texts)
+        for result in response.results:
+            scores[result.index] = result.relevance_score
+        return scores
+
+
+class LexicalReranker(Reranker):
+    """
+    Scores locally, without network calls, from lexical features of the query and the chunk: the share of
+    query terms in the chunk, their saturated frequency and the share of query bigrams found in order.
+    """
+
+    name = "lexical"
+
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        query_terms = tokenize(query)
+        terms = set(query_terms)
+        bigrams = set(zip(query_terms, query_terms[1:]))
+        scores = []
+        for text in texts:
+            tokens = tokenize(text)
+            counts = Counter(tokens)
+            coverage = sum(1 for term in terms if term in counts) / len(terms) if terms else 0.0
+            frequency = sum(math.log1p(counts[term]) for term in terms) / (len(terms) or 1)
+            text_bigrams = set(zip(tokens, tokens[1:]))
+            proximity = len(bigrams & text_bigrams) / len(bigrams) if bigrams else 0.0
+            scores.append(0.6 * coverage + 0.2 * min(frequency, 1.0) + 0.2 * proximity)
+        return scores
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Retrieves candidates with the first stage retriever, e.g. 50 by relevance, and returns the `top_n`
+    candidates with the highest reranker scores.
+    """
+
+    base_retriever: BaseRetriever
+    reranker: Reranker
+    top_n: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(query, {"callbacks": run_manager.get_child()})
+        if not candidates:
+            return []
+        started = time.perf_counter()
+        scores = self.reranker.score(query, [candidate.page_content for candidate in candidates])
+        ranked = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[: self.top_n]
+        latency = time.perf_counter() - started
+
+        self.reranker.record(latency, sum(1 for i in ranked if i < self.top_n) / len(ranked))
+        # copies, the candidates may be documents of the local docstore shared by all sessions
+        return [
+            Document(
+                page_content=candidates[i].page_content, metadata={**candidates[i].metadata, RELEVANCE_KEY: scores[i]}
+            )
+            for i in ranked
+        ]
@@ -0,0 +1,258 @@
+"""
+This module provides the process-wide resources of the RAG bot. Streamlit re-runs the script on every
+interaction and starts a session per user, so the Qdrant clients, the embedder, the LLMs and the local index
+are created once per process here and reused by every rerun and every session.
+
+Classes:
+    ResourceStats: A data class counting created and reused resources and Qdrant health checks.
+
+Functions:
+    get_qdrant_client(url, api_key, prefer_grpc, health_check_interval) -> QdrantClient:
+        Returns the shared, health-checked Qdrant client for a cluster.
+
+    get_embeddings(model: str) -> CachedEmbeddings:
+        Returns the shared cache-backed Cohere embedder.
+
+    get_llm(**kwargs) -> ChatCohere:
+        Returns the shared ChatCohere for the given settings.
+
+    get_local_index(index_dir: str) -> LocalIndex:
+        Returns the shared local index.
+
+    get_answer_cache(threshold: float, ttl: float) -> SemanticCache:
+        Returns the shared semantic answer cache.
+
+    get_context_packer(max_tokens: int) -> ContextPacker:
+        Returns the shared context packer.
+
+    get_reranker(kind: str) -> Reranker:
+        Returns the shared reranker with its score cache.
+
+    get_question_router() -> QuestionRouter:
+        Returns the shared question router with its rewrite cache.
+
+    resource_stats() -> dict:
+        Returns the resource reuse metrics.
+"""
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import qdrant_client
+from langchain_cohere import ChatCohere, CohereEmbeddings
+
+from context_packer import ContextPacker
+from embedding_cache import CachedEmbeddings
+from ingestion import read_generation
+from local_index import LOCAL_INDEX_DIR, LocalIndex
+from question_router import QuestionRouter
+from reranker import CohereReranker, LexicalReranker, Reranker
+from semantic_cache import SemanticCache
+
+EMBEDDING_MODEL = "embed-english-v2.0"
+
+
+@dataclass
+class ResourceStats:
+    """Class for keeping track of the reuse of the shared resources."""
+
+    qdrant_clients_created: int = 0
+    qdrant_client_reuses: int = 0
+    health_checks: int = 0
+    health_check_failures: int = 0
+    embedders_created: int = 0
+    llms_created: int = 0
+    local_indexes_created: int = 0
+    other_created: int = 0
+    other_reuses: int = 0
+
+
+_lock = threading.RLock()
+_resources: Dict[Hashable, Any] = {}
+_stats = ResourceStats()
+
+
+@dataclass
+class _PooledClient:
+    client: qdrant_client.QdrantClient
+    checked: float
+
+
+def _shared(key: Hashable, factory: Callable[[], Any], counter: str) -> Any:
+    with _lock:
+        if key in _resources:
+            _stats.other_reuses += 1
+            return _resources[key]
+        resource = factory()
+        _resources[key] = resource
+        setattr(_stats, counter, getattr(_stats, counter) + 1)
+        return resource
+
+
+def get_qdrant_client(
+    url: Optional[str],
+    api_key: Optional[str] = None,
+    prefer_grpc: bool = True,
+    health_check_interval: float = 30.0,
+) -> qdrant_client.QdrantClient:
+    """
+    Returns the shared Qdrant client for a cluster. A QdrantClient keeps a pool of keep-alive HTTP
+    connections or one multiplexed gRPC channel, so one client per cluster serves all sessions.
+    The client is health-checked at most every `health_check_interval` seconds, outside the lock, and
+    replaced for the next sessions if the check fails.
+
+    Args:
+        url (str): The url of the cluster.
+        api_key (str): The api key of the cluster.
+        prefer_grpc (bool): Whether to use gRPC for the operations that support it.
+        health_check_interval (float): The minimal number of seconds between two health checks.
+
+    Returns:
+        QdrantClient: The shared client.
+    """
+    key = ("qdrant", url, api_key, prefer_grpc)
+    with _lock:
+        pooled = _resources.get(key)
+        if pooled is None:
+            return _new_qdrant_client(key, url, api_key, prefer_grpc)
+        if time.monotonic() - pooled.checked < health_check_interval:
+            _stats.qdrant_client_reuses += 1
+            return pooled.client
+        # claims the check, so the other sessions keep using the client meanwhile
+        pooled.checked = time.monotonic()
+        _stats.health_checks += 1
+
+    # the round trip runs outside the lock, the other shared resources stay available
+    try:
+        pooled.client.get_collections()
+        with _lock:
+            _stats.qdrant_client_reuses += 1
+        return pooled.client
+    except Exception:
+        with _lock:
+            _stats.health_check_failures += 1
+            if _resources.get(key) is not pooled:
+                return _resources[key].client
+            # the failed client is not closed, the retrievers of open sessions still hold it
+            return _new_qdrant_client(key, url, api_key, prefer_grpc)
+
+
+def _new_qdrant_client(
+    key: Hashable, url: Optional[str], api_key: Optional[str], prefer_grpc: bool
+) -> qdrant_client.QdrantClient:
+    # called with _lock held
+    client = qdrant_client.QdrantClient(url=url, api_key=api_key, prefer_grpc=prefer_grpc)
+    _resources[key] = _PooledClient(client=client, checked=time.monotonic())
+    _stats.qdrant_clients_created += 1
+    return client
+
+
+def get_embeddings(model: str = EMBEDDING_MODEL) -> CachedEmbeddings:
+    """
+    Returns the shared cache-backed Cohere embedder.
+
+    Args:
+        model (str): The Cohere embedding model.
+
+    Returns:
+        CachedEmbeddings: The shared embedder.
+    """
+    return _shared(
+        ("embeddings", model),
+        lambda: CachedEmbeddings(CohereEmbeddings(model=model)),
+        "embedders_created",
+    )
+
+
+def get_llm(**kwargs) -> ChatCohere:
+    """
+    Returns the shared ChatCohere for the given settings.
+
+    Args:
+        **kwargs: The settings passed to ChatCohere, e.g. streaming=True.
+
+    Returns:
+        ChatCohere: The shared LLM.
+    """
+    return _shared(("llm", tuple(sorted(kwargs.items()))), lambda: ChatCohere(**kwargs), "llms_created")
+
+
+def get_local_index(index_dir: str = LOCAL_INDEX_DIR, model: str = EMBEDDING_MODEL) -> LocalIndex:
+    """
+    Returns the shared local index, so that every session searches the same memory-mapped snapshot.
+
+    Args:
+        index_dir (str): The directory holding the snapshots.
+        model (str): The Cohere embedding model the snapshots were built with.
+
+    Returns:
+        LocalIndex: The shared local index.
+    """
+    return _shared(
+        ("local_index", index_dir, model),
+        lambda: LocalIndex(index_dir, get_embeddings(model)),
+        "local_indexes_created",
+    )
+
+
+def get_answer_cache(threshold: float = 0.95, ttl: float = 24 * 3600, model: str = EMBEDDING_MODEL) -> SemanticCache:
+    """
+    Returns the shared semantic answer cache, invalidated whenever build_vectorstore.py changes the collection.
+
+    Args:
+        threshold (float): The minimal cosine similarity of two standalone questions to share an answer.
+        ttl (float): The number of seconds an answer stays valid.
+        model (str): The Cohere embedding model used for the questions.
+
+    Returns:
+        SemanticCache: The shared cache.
+    """
+    return _shared(
+        ("answer_cache", threshold, ttl, model),
+        lambda: SemanticCache(get_embeddings(model), threshold=threshold, ttl=ttl, generation=read_generation),
+        "other_created",
+    )
+
+
+def get_context_packer(max_tokens: int = 2000) -> ContextPacker:
+    """
+    Returns the shared context packer, so that the tiktoken encoding is loaded once per process.
+
+    Args:
+        max_tokens (int): The token budget of the retrieved chunks in the prompt.
+
+    Returns:
+        ContextPacker: The shared packer.
+    """
+    return _shared(("context_packer", max_tokens), lambda: ContextPacker(max_tokens), "other_created")
+
+
+def get_reranker(kind: str = "cohere") -> Reranker:
+    """
+    Returns the shared reranker, so that all sessions share its score cache.
+
+    Args:
+        kind (str): "cohere" for the Cohere rerank endpoint or "lexical" for the local scorer.
+
+    Returns:
+        Reranker: The shared reranker.
+    """
+    factories = {"cohere": CohereReranker, "lexical": LexicalReranker}
+    return _shared(("reranker", kind), factories[kind], "other_created")
+
+
+def get_question_router() -> QuestionRouter:
+    """
+    Returns the shared question router, so that all sessions share its rewrite cache.
+
+    Returns:
+        QuestionRouter: The shared router.
+    """
+    return _shared("question_router", QuestionRouter, "other_created")
+
+
+def resource_stats() -> Dict[str, int]:
+    """Returns the resource reuse metrics."""
+    with _lock:
+        return asdict(_stats)
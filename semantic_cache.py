@@ -0,0 +1,150 @@
+"""
+This module provides a semantic answer cache for the RAG chain. Answers are stored with the embedding of the
+standalone question they answered, and a new standalone question whose cosine similarity to a stored one is
+above a threshold gets the stored answer without retrieval or generation.
+
+Entries expire after a TTL and the whole cache is invalidated when the ingestion generation changes, i.e.
+when build_vectorstore.py changed the rag_documents collection.
+
+Classes:
+    SemanticCacheStats: A data class counting lookups, hits and the generation latency saved.
+    SemanticCache: The semantic answer cache.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+@dataclass
+class SemanticCacheStats:
+    """Class for keeping track of the semantic cache hits and the latency they saved."""
+
+    lookups: int = 0
+    hits: int = 0
+    expired: int = 0
+    invalidations: int = 0
+    saved_seconds: float = 0.0
+    # moving average of the latency of answers computed on a miss, used to estimate the saved latency
+    avg_miss_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    created: float
+
+
+class SemanticCache:
+    """
+    A process-wide semantic cache of answers keyed by the embedding of the standalone question.
+
+    Args:
+        embeddings (Embeddings): The embeddings of the questions, e.g. the shared cache-backed embedder.
+        threshold (float): The minimal cosine similarity of a question to a cached one to count as a hit.
+        ttl (float): The number of seconds an answer stays valid.
+        max_entries (int): The number of answers kept, the oldest ones are dropped first.
+        generation (Callable): Returns the current ingestion generation, a change clears the cache.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        ttl: float = 24 * 3600,
+        max_entries: int = 1000,
+        generation: Optional[Callable[[], str]] = None,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = generation
+        self.stats = SemanticCacheStats()
+        self._entries: List[_Entry] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._generation = generation() if generation else None
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str, vector: Optional[List[float]] = None) -> np.ndarray:
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _clear(self) -> None:
+        self._entries = []
+        self._vectors = None
+
+    def _drop_stale(self) -> None:
+        if self.generation is not None:
+            generation = self.generation()
+            if generation != self._generation:
+                self._generation = generation
+                if self._entries:
+                    self.stats.invalidations += 1
+                self._clear()
+                return
+        oldest_valid = time.time() - self.ttl
+        keep = [i for i, entry in enumerate(self._entries) if entry.created >= oldest_valid]
+        if len(keep) < len(self._entries):
+            self.stats.expired += len(self._entries) - len(keep)
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep else None
+
+    def lookup(self, question: str, vector: Optional[List[float]] = None) -> Optional[str]:
+        """
+        Returns the cached answer of the most similar question if it is similar enough.
+
+        Args:
+            question (str): The standalone question.
+            vector (List[float]): The embedding of the question if already computed.
+
+        Returns:
+            str: The cached answer, or None on a miss.
+        """
+        vector = self._embed(question, vector)
+        with self._lock:
+            self.stats.lookups += 1
+            self._drop_stale()
+            if self._vectors is None:
+                return None
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            self.stats.hits += 1
+            self.stats.saved_seconds += self.stats.avg_miss_seconds
+            return self._entries[best].answer
+
+    def add(
+        self, question: str, answer: str, latency: Optional[float] = None, vector: Optional[List[float]] = None
+    ) -> None:
+        """
+        Caches the answer of a standalone question.
+
+        Args:
+            question (str): The standalone question.
+            answer (str): The answer of the chain.
+            latency (float): The seconds it took to compute the answer, used to report the saved latency.
+            vector (List[float]): The embedding of the question if already computed.
+        """
+        vector = self._embed(question, vector)
+        with self._lock:
+            if latency is not None:
+                misses = self.stats.lookups - self.stats.hits
+                self.stats.avg_miss_seconds += (latency - self.stats.avg_miss_seconds) / max(misses, 1)
+            self._entries.append(_Entry(question=question, answer=answer, created=time.time()))
+            vectors = vector[np.newaxis, :]
+            self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+                self._vectors = self._vectors[-self.max_entries:]
@@ -0,0 +1,148 @@
+"""
+This module provides a streaming, bounded-memory alternative to WebBaseLoader(...).load(). Pages are fetched
+concurrently with a connection-pooled aiohttp session on a background event loop, split as they arrive and
+handed to the caller through a bounded queue, so at most `queue_size` chunks and `concurrency` pages are held
+in memory no matter how large the corpus is.
+
+Functions:
+    page_to_document(url: str, html: str) -> Document:
+        Builds a Document from a fetched page the same way WebBaseLoader does.
+
+    stream_chunks(urls, text_splitter, concurrency, queue_size, timeout, continue_on_failure) -> Iterator[Document]:
+        Fetches and splits the pages concurrently and yields their chunks as they become available.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator
+
+import aiohttp
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def page_to_document(url: str, html: str) -> Document:
+    """
+    Builds a Document from a fetched page the same way WebBaseLoader does, so that chunks
+    and their content hashes do not depend on the loader that produced them.
+
+    Args:
+        url (str): The url of the page.
+        html (str): The html of the page.
+
+    Returns:
+        Document: The text of the page with source, title, description and language metadata.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html_tag := soup.find("html"):
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return Document(page_content=soup.get_text(), metadata=metadata)
+
+
+async def _produce(
+    urls: Iterable[str],
+    text_splitter: TextSplitter,
+    chunks: "queue.Queue",
+    stop: threading.Event,
+    concurrency: int,
+    timeout: float,
+    continue_on_failure: bool,
+) -> None:
+    loop = asyncio.get_running_loop()
+    url_iter = iter(urls)
+    url_lock = asyncio.Lock()
+
+    async def put(item) -> None:
+        # blocks in a worker thread while the queue is full, which back-pressures the fetchers
+        await loop.run_in_executor(None, chunks.put, item)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while not stop.is_set():
+            async with url_lock:
+                url = next(url_iter, None)
+            if url is None:
+                return
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    html = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not continue_on_failure:
+                    raise
+                logger.warning("could not load %s: %s", url, e)
+                continue
+            for chunk in text_splitter.split_documents([page_to_document(url, html)]):
+                if stop.is_set():
+                    return
+                await put(chunk)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+
+def stream_chunks(
+    urls: Iterable[str],
+    text_splitter: TextSplitter,
+    concurrency: int = 8,
+    queue_size: int = 256,
+    timeout: float = 30.0,
+    continue_on_failure: bool = False,
+) -> Iterator[Document]:
+    """
+    Fetches and splits the pages concurrently and yields their chunks as they become available.
+    The chunks of a page are yielded in order, pages are yielded in the order they arrive.
+
+    Args:
+        urls (Iterable[str]): The urls to load, consumed lazily.
+        text_splitter (TextSplitter): The splitter applied to every page.
+        concurrency (int): The number of concurrent requests and pooled connections.
+        queue_size (int): The maximal number of chunks waiting for the consumer.
+        timeout (float): The timeout of a single request in seconds.
+        continue_on_failure (bool): Whether to log and skip pages that cannot be loaded instead of raising.
+
+    Returns:
+        Iterator[Document]: The chunks of all pages.
+    """
+    chunks: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def run() -> None:
+        try:
+            asyncio.run(_produce(urls, text_splitter, chunks, stop, concurrency, timeout, continue_on_failure))
+        except BaseException as e:
+            chunks.put(e)
+        else:
+            chunks.put(_DONE)
+
+    producer = threading.Thread(target=run, name="stream-loader", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # drain the queue so that a producer blocked on a full queue can see the stop flag
+        while producer.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,134 @@
+"""
+This module provides a vectorized technical indicator engine. The indicators of every ticker are computed at
+once over a DataFrame of daily closes with one column per ticker, so multi-year histories of many tickers
+cost a few pandas/NumPy operations instead of a text dump of the history that the agent has to work through.
+
+Functions:
+    compute_indicators(closes: pd.DataFrame, benchmark: pd.Series, risk_free_rate: float) -> pd.DataFrame:
+        Computes moving averages, 52 week high/low, RSI, performance, volatility, Sharpe ratio, beta and
+        maximal drawdown for every ticker.
+
+    summarize_indicators(indicators: pd.DataFrame) -> dict:
+        Converts the indicators into a compact dict per ticker.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+MOVING_AVERAGES = (50, 100, 200)
+# trading days of the performance windows
+PERFORMANCE_WINDOWS = {"1w": 5, "1m": 21, "3m": 63, "6m": 126, "1y": 252}
+RSI_PERIOD = 14
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+
+def _window_mean(closes: pd.DataFrame, days: int) -> pd.Series:
+    # a window longer than the history of a ticker yields NaN instead of the mean of a shorter window
+    window = closes.iloc[-days:]
+    return window.mean().where(window.notna().sum() >= days)
+
+
+def _beta(returns: pd.DataFrame, benchmark_returns: pd.Series) -> pd.Series:
+    r = returns.to_numpy()
+    b = benchmark_returns.to_numpy()[:, np.newaxis]
+    # cov(r, b) / var(b) over the days both have a return, for all tickers at once
+    both = ~np.isnan(r) & ~np.isnan(b)
+    days = both.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r_centered = r - np.where(both, r, 0).sum(axis=0) / days
+        b_centered = b - np.where(both, b, 0).sum(axis=0) / days
+        covariance = np.where(both, r_centered * b_centered, 0).sum(axis=0)
+        variance = np.where(both, b_centered ** 2, 0).sum(axis=0)
+        beta = covariance / variance
+    return pd.Series(np.where(days > 1, beta, np.nan), index=returns.columns)
+
+
+def _rsi(closes: pd.DataFrame, period: int = RSI_PERIOD) -> pd.Series:
+    change = closes.diff()
+    # Wilder's smoothing is an exponential moving average with alpha = 1 / period
+    gain = change.clip(lower=0).ewm(alpha=1 / period, adjust=False, min_periods=period).mean().iloc[-1]
+    loss = (-change.clip(upper=0)).ewm(alpha=1 / period, adjust=False, min_periods=period).mean().iloc[-1]
+    rsi = 100 - 100 / (1 + gain / loss.replace(0, np.nan))
+    # no losses in the window is the most overbought case, a flat window is neutral
+    rsi = rsi.mask((loss == 0) & (gain > 0), 100.0)
+    return rsi.mask((loss == 0) & (gain == 0), 50.0)
+
+
+def compute_indicators(
+    closes: pd.DataFrame,
+    benchmark: Optional[pd.Series] = None,
+    risk_free_rate: float = 0.0,
+) -> pd.DataFrame:
+    """
+    Computes the technical indicators of every ticker from its daily closes.
+
+    Args:
+        closes (pd.DataFrame): The daily closes, one column per ticker, oldest first. Tickers with a shorter
+            history have NaN before their first close.
+        benchmark (pd.Series): The daily closes of the index the beta is computed against.
+        risk_free_rate (float): The annual risk-free rate of the Sharpe ratio.
+
+    Returns:
+        pd.DataFrame: One row per ticker and one column per indicator.
+    """
+    closes = closes.sort_index().ffill()
+    last = closes.iloc[-1]
+    indicators = {"close": last}
+
+    for days in MOVING_AVERAGES:
+        average = _window_mean(closes, days)
+        indicators[f"ma_{days}"] = average
+        indicators[f"vs_ma_{days}_pct"] = 100 * (last / average - 1)
+
+    year = closes.iloc[-TRADING_DAYS:]
+    indicators["high_52w"] = year.max()
+    indicators["low_52w"] = year.min()
+    indicators["vs_high_52w_pct"] = 100 * (last / indicators["high_52w"] - 1)
+
+    rsi = _rsi(closes)
+    indicators["rsi_14"] = rsi
+    indicators["signal"] = pd.Series(
+        np.select([rsi >= RSI_OVERBOUGHT, rsi <= RSI_OVERSOLD], ["overbought", "oversold"], "neutral"),
+        index=closes.columns,
+    ).where(rsi.notna())
+
+    for name, days in PERFORMANCE_WINDOWS.items():
+        indicators[f"perf_{name}_pct"] = (
+            100 * (last / closes.iloc[-days - 1] - 1) if len(closes) > days else last * np.nan
+        )
+
+    returns = closes.pct_change(fill_method=None).iloc[1:]
+    volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    indicators["volatility_pct"] = 100 * volatility
+    indicators["sharpe"] = (returns.mean() * TRADING_DAYS - risk_free_rate) / volatility.replace(0, np.nan)
+    indicators["max_drawdown_pct"] = 100 * (closes / closes.cummax() - 1).min()
+
+    if benchmark is not None:
+        benchmark_returns = benchmark.sort_index().ffill().pct_change(fill_method=None).reindex(returns.index)
+        indicators["beta"] = _beta(returns, benchmark_returns)
+
+    return pd.DataFrame(indicators)
+
+
+def summarize_indicators(indicators: pd.DataFrame, decimals: int = 2) -> Dict[str, dict]:
+    """
+    Converts the indicators into a compact dict per ticker, rounding the numbers and dropping missing values.
+
+    Args:
+        indicators (pd.DataFrame): The result of compute_indicators.
+        decimals (int): The number of decimals kept.
+
+    Returns:
+        dict: The indicators per ticker.
+    """
+    summary = {}
+    for ticker, row in indicators.iterrows():
+        summary[str(ticker)] = {
+            name: round(float(value), decimals) if isinstance(value, (int, float, np.number)) else value
+            for name, value in row.items()
+            if not pd.isna(value)
+        }
+    return summary
@@ -0,0 +1,35 @@
+"""
+This module provides the tiktoken token counter shared by the context packer and the tool compactor.
+
+Functions:
+    tiktoken_counter(encoding_name: str) -> Callable[[str], int]:
+        Returns a function counting the tokens of a text, loading the encoding on its first call.
+"""
+import functools
+from typing import Any, Callable
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(encoding_name: str) -> Any:
+    # loading an encoding reads its BPE ranks from the tiktoken cache, once per process and encoding
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def tiktoken_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Returns a function counting the tokens of a text. The encoding is loaded on the first count, not on import
+    or construction, so modules holding a counter stay cheap to import.
+
+    Args:
+        encoding_name (str): The tiktoken encoding.
+
+    Returns:
+        Callable[[str], int]: Counts the tokens of a text, special tokens count as text.
+    """
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding(encoding_name).encode(text, disallowed_special=()))
+
+    return count_tokens
@@ -0,0 +1,300 @@
+"""
+This module compacts the outputs of the investment advisor tools before they reach the agent. The raw outputs,
+like the 150 fields of a yfinance info dict or the full Polygon financials, are stringified into the scratchpad
+of the ReAct agent and sent again with every iteration. The compactor keeps the fields the report headings of
+the prompt need, drops empty values, rounds numbers, serializes without whitespace and cuts the result to a
+token budget per tool counted with tiktoken.
+
+Classes:
+    ToolCompactionStats: A data class counting the calls and the tokens going in and out per tool.
+    ToolCompactor: Compacts tool outputs and wraps tools to return compacted outputs.
+
+Functions:
+    get_tool_compactor() -> ToolCompactor:
+        Returns the process-wide compactor.
+
+    compact_tools(tools: list, compactor: ToolCompactor) -> list:
+        Wraps the tools to return compacted outputs.
+"""
+import json
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from token_count import tiktoken_counter
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+# the fields of each tool needed for the headings of the report, nested fields are separated by dots and
+# apply to every element of a list
+TOOL_FIELDS = {
+    "yf_get_ticker_info": [
+        "longName", "city", "state", "country", "website", "sector", "industry", "fullTimeEmployees",
+        "companyOfficers.name", "companyOfficers.title", "marketCap", "enterpriseValue", "currentPrice", "beta",
+        "trailingPE", "forwardPE", "pegRatio", "priceToBook", "trailingEps", "forwardEps", "totalRevenue",
+        "revenueGrowth", "earningsGrowth", "earningsQuarterlyGrowth", "grossMargins", "operatingMargins",
+        "ebitdaMargins", "profitMargins", "returnOnEquity", "freeCashflow", "operatingCashflow", "totalCash",
+        "totalDebt", "debtToEquity", "dividendYield", "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "fiftyDayAverage",
+        "twoHundredDayAverage", "recommendationKey", "recommendationMean", "numberOfAnalystOpinions",
+        "targetLowPrice", "targetMeanPrice", "targetHighPrice",
+    ],
+    "fv_get_fundamental_data": [
+        "Company", "Sector", "Industry", "Country", "Market Cap", "Price", "P/E", "Forward P/E", "PEG", "P/B",
+        "EPS (ttm)", "EPS next Y", "EPS Q/Q", "Sales Q/Q", "EPS past 5Y", "Sales past 5Y", "Sales", "Income",
+        "Gross Margin", "Oper. Margin", "Profit Margin", "ROE", "Debt/Eq", "LT Debt/Eq", "52W High", "52W Low",
+        "SMA20", "SMA50", "SMA200", "RSI (14)", "Beta", "Perf Week", "Perf Month", "Perf Quarter",
+        "Perf Half Y", "Perf Year", "Recom", "Target Price",
+    ],
+    "polygon_financials": [
+        "fiscal_period", "fiscal_year", "end_date",
+        "financials.income_statement.revenues.value",
+        "financials.income_statement.gross_profit.value",
+        "financials.income_statement.operating_income_loss.value",
+        "financials.income_statement.net_income_loss.value",
+        "financials.income_statement.diluted_earnings_per_share.value",
+        "financials.balance_sheet.assets.value",
+        "financials.balance_sheet.liabilities.value",
+        "financials.balance_sheet.equity.value",
+        "financials.balance_sheet.long_term_debt.value",
+        "financials.cash_flow_statement.net_cash_flow_from_operating_activities.value",
+        "financials.cash_flow_statement.net_cash_flow.value",
+    ],
+    "polygon_ticker_news": [
+        "title", "published_utc", "publisher.name", "description",
+        "insights.ticker", "insights.sentiment", "insights.sentiment_reasoning",
+    ],
+    "internet_search": ["url", "content"],
+}
+
+# token budgets of the compacted outputs per tool
+TOOL_TOKEN_BUDGETS = {
+    "yf_get_ticker_info": 600,
+    "yf_get_business_summary": 400,
+    "yf_get_ticker_history": 1500,
+    "yf_get_technical_indicators": 800,
+    "fv_get_fundamental_data": 600,
+    "polygon_financials": 1200,
+    "polygon_ticker_news": 1000,
+    "internet_search": 1200,
+}
+
+# values meaning "no data"
+_EMPTY_VALUES = ("", "-", "N/A", "None", "null")
+_TRUNCATED = " ...[truncated]"
+
+
+def _fields_tree(paths: Sequence[str]) -> Dict[str, Any]:
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node.setdefault(leaf, None)
+    return tree
+
+
+def _project(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+def _compact(value: Any, significant_digits: int) -> Any:
+    if isinstance(value, dict):
+        items = {key: _compact(item, significant_digits) for key, item in value.items()}
+        items = {key: item for key, item in items.items() if item is not None}
+        # {"value": 1} of the Polygon financials
+        if list(items) == ["value"]:
+            return items["value"]
+        return items or None
+    if isinstance(value, (list, tuple)):
+        items = [item for item in (_compact(item, significant_digits) for item in value) if item is not None]
+        return items or None
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        value = float(f"{value:.{significant_digits}g}")
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str):
+        value = value.strip()
+        return None if value in _EMPTY_VALUES else value
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+@dataclass
+class ToolCompactionStats:
+    """Class for keeping track of the calls and the tokens going in and out of the compactor per tool."""
+
+    calls: Counter = field(default_factory=Counter)
+    tokens_in: Counter = field(default_factory=Counter)
+    tokens_out: Counter = field(default_factory=Counter)
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(self.tokens_in.values()) - sum(self.tokens_out.values())
+
+    def report(self) -> str:
+        tools = " | ".join(
+            f"{name} {calls}x {self.tokens_in[name]} -> {self.tokens_out[name]}"
+            for name, calls in sorted(self.calls.items())
+        )
+        return (f"{sum(self.calls.values())} tool calls, {sum(self.tokens_in.values())} -> "
+                f"{sum(self.tokens_out.values())} tokens ({self.tokens_saved} saved) | {tools}")
+
+
+class ToolCompactor:
+    """
+    Compacts tool outputs: projects structured outputs to the fields of the tool, drops empty values, rounds
+    numbers, serializes compact JSON and cuts the result to the token budget of the tool. Lists are cut by
+    dropping their last elements, the tools return them newest or most relevant first.
+
+    Args:
+        fields (dict): The fields kept per tool name, tools without fields keep all fields.
+        budgets (dict): The token budget per tool name.
+        default_budget (int): The token budget of tools without a budget.
+        significant_digits (int): The significant digits numbers are rounded to.
+        encoding_name (str): The tiktoken encoding used to count tokens.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text. Defaults to the tiktoken encoding.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+        budgets: Optional[Dict[str, int]] = None,
+        default_budget: int = 1000,
+        significant_digits: int = 4,
+        encoding_name: str = "cl100k_base",
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.fields = {name: _fields_tree(paths) for name, paths in (TOOL_FIELDS if fields is None else fields).items()}
+        self.budgets = {**TOOL_TOKEN_BUDGETS, **(budgets or {})}
+        self.default_budget = default_budget
+        self.significant_digits = significant_digits
+        self.encoding_name = encoding_name
+        self._count_tokens = count_tokens or tiktoken_counter(encoding_name)
+        self.stats = ToolCompactionStats()
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        return self._count_tokens(text)
+
+    def compact(self, tool_name: str, output: Any) -> str:
+        """
+        Compacts the output of a tool call.
+
+        Args:
+            tool_name (str): The name of the tool.
+            output (Any): The output of the tool, a structure or a string, JSON strings are parsed.
+
+        Returns:
+            str: The compacted output.
+        """
+        raw = output if isinstance(output, str) else str(output)
+        data = output
+        if isinstance(output, str):
+            try:
+                data = json.loads(output)
+            except ValueError:
+                data = output
+        if not isinstance(data, str):
+            data = _compact(_project(data, self.fields.get(tool_name)), self.significant_digits)
+            if data is None:
+                data = []
+
+        budget = self.budgets.get(tool_name, self.default_budget)
+        text = _dumps(data)
+        tokens = self.count_tokens(text)
+        while tokens > budget and isinstance(data, list) and len(data) > 1:
+            data = data[:-1]
+            text = _dumps(data)
+            tokens = self.count_tokens(text)
+        if tokens > budget:
+            text = self._truncate(text, budget)
+            tokens = self.count_tokens(text)
+
+        tokens_in = self.count_tokens(raw)
+        with self._lock:
+            self.stats.calls[tool_name] += 1
+            self.stats.tokens_in[tool_name] += tokens_in
+            self.stats.tokens_out[tool_name] += tokens
+        return text
+
+    def _truncate(self, text: str, budget: int) -> str:
+        # the longest prefix within the budget, found by bisection over the characters
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle] + _TRUNCATED) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low] + _TRUNCATED
+
+    def wrap(self, tool: "BaseTool") -> "BaseTool":
+        """
+        Returns a copy of the tool returning compacted outputs. Name, description and arguments are kept, so
+        the agent sees the same tool.
+
+        Args:
+            tool (BaseTool): The tool.
+
+        Returns:
+            BaseTool: The wrapped tool.
+        """
+        compacted_class = _compacted_class(type(tool), self)
+        return compacted_class.construct(**{name: getattr(tool, name) for name in tool.__fields__})
+
+
+_compacted_classes: Dict[Tuple[type, ToolCompactor], type] = {}
+
+
+def _compacted_class(tool_class: type, compactor: ToolCompactor) -> type:
+    # a subclass overriding run(), which AgentExecutor and invoke() call, keeps the schema and the callbacks
+    key = (tool_class, compactor)
+    if key not in _compacted_classes:
+
+        def run(self, *args, **kwargs):
+            return compactor.compact(self.name, tool_class.run(self, *args, **kwargs))
+
+        _compacted_classes[key] = type(f"Compacted{tool_class.__name__}", (tool_class,), {"run": run})
+    return _compacted_classes[key]
+
+
+_compactor: Optional[ToolCompactor] = None
+_compactor_lock = threading.Lock()
+
+
+def get_tool_compactor() -> ToolCompactor:
+    """Returns the process-wide compactor, so that the tiktoken encoding is loaded once per process."""
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = ToolCompactor()
+        return _compactor
+
+
+def compact_tools(tools: List["BaseTool"], compactor: Optional[ToolCompactor] = None) -> List["BaseTool"]:
+    """
+    Wraps the tools to return compacted outputs.
+
+    Args:
+        tools (List[BaseTool]): The tools.
+        compactor (ToolCompactor): The compactor, defaults to the process-wide one.
+
+    Returns:
+        List[BaseTool]: The wrapped tools.
+    """
+    compactor = compactor or get_tool_compactor()
+    return [compactor.wrap(tool) for tool in tools]
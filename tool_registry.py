@@ -0,0 +1,147 @@
+"""
+This module provides the registry of the agent tools of the *_tools.py modules. A tool is registered by name
+with the module and the factory building it, and the module is imported and the tool built on first use only,
+once per process. A Streamlit rerun, e.g. after a checkbox toggle, neither imports the LangChain, yfinance and
+Polygon stacks nor builds API wrappers before a tool is actually needed.
+
+Classes:
+    RegistryStats: A data class counting the tools built and the time it took.
+
+Functions:
+    register_tool(name: str, factory: Callable[[], BaseTool]) -> None:
+        Registers a tool factory under the name of the tool.
+
+    registered_tools() -> list:
+        Returns the names of the registered tools.
+
+    get_tool(name: str) -> BaseTool:
+        Returns the tool, building it on first use.
+
+    get_tools(names: list) -> list:
+        Returns the tools with the given names.
+"""
+import importlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+# module and factory function of the tools of the *_tools.py modules
+TOOL_FACTORIES = {
+    "yf_get_ticker_info": ("yfinance_tools", "get_ticker_info_tool"),
+    "yf_get_business_summary": ("yfinance_tools", "get_business_summary_tool"),
+    "yf_get_ticker_history": ("yfinance_tools", "get_ticker_history_tool"),
+    "yf_get_technical_indicators": ("yfinance_tools", "get_technical_indicators_tool"),
+    "internet_search": ("cohere_tools", "get_internet_search_tool"),
+    "wikipedia-tool": ("cohere_tools", "get_wikipedia_tool"),
+    "open_weather_map": ("cohere_tools", "get_openweathermap_tool"),
+    "av_search_symbols": ("alpha_vantage_tools", "get_search_symbols_tool"),
+    "av_get_time_series_daily": ("alpha_vantage_tools", "get_time_series_daily_tool"),
+    "av_get_time_series_weekly": ("alpha_vantage_tools", "get_time_series_weekly_tool"),
+    "av_get_market_news_sentiment": ("alpha_vantage_tools", "get_market_news_sentimen_tool"),
+    "av_get_exchange_rate": ("alpha_vantage_tools", "get_exchange_rate_tool"),
+    "fv_get_fundamental_data": ("finvizfinance_tools", "get_fundamental_data_tool"),
+}
+
+# tools of the Polygon toolkit, built together from one API wrapper
+POLYGON_TOOLS = ("polygon_aggregates", "polygon_financials", "polygon_last_quote", "polygon_ticker_news")
+
+
+@dataclass
+class RegistryStats:
+    """Class for keeping track of the tools built and the seconds it took, imports included."""
+
+    built: int = 0
+    build_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+stats = RegistryStats()
+_factories: Dict[str, Callable[[], "BaseTool"]] = {}
+_tools: Dict[str, "BaseTool"] = {}
+_lock = threading.RLock()
+
+
+def _import_factory(module: str, attribute: str) -> Callable[[], "BaseTool"]:
+    return lambda: getattr(importlib.import_module(module), attribute)()
+
+
+def _polygon_factory(name: str) -> Callable[[], "BaseTool"]:
+    def build():
+        from langchain_community.agent_toolkits.polygon.toolkit import PolygonToolkit
+        from langchain_community.utilities.polygon import PolygonAPIWrapper
+
+        tools = {tool.name: tool for tool in PolygonToolkit.from_polygon_api_wrapper(PolygonAPIWrapper()).get_tools()}
+        # the other tools of the toolkit share the wrapper and are kept for their first use
+        for other, tool in tools.items():
+            _tools.setdefault(other, tool)
+        return tools[name]
+
+    return build
+
+
+def register_tool(name: str, factory: Callable[[], "BaseTool"]) -> None:
+    """
+    Registers a tool factory under the name of the tool, replacing a tool of the same name.
+
+    Args:
+        name (str): The name of the tool.
+        factory (Callable[[], BaseTool]): Builds the tool, importing what it needs.
+    """
+    with _lock:
+        _factories[name] = factory
+        _tools.pop(name, None)
+
+
+def registered_tools() -> List[str]:
+    """Returns the names of the registered tools."""
+    with _lock:
+        return list(_factories)
+
+
+def get_tool(name: str) -> "BaseTool":
+    """
+    Returns the tool, building it and importing its module on first use.
+
+    Args:
+        name (str): The name of the tool.
+
+    Returns:
+        BaseTool: The tool, shared by all callers of the process.
+    """
+    with _lock:
+        tool = _tools.get(name)
+        if tool is None:
+            if name not in _factories:
+                raise KeyError(f"unknown tool {name}, registered tools are {sorted(_factories)}")
+            started = time.perf_counter()
+            tool = _tools[name] = _factories[name]()
+            stats.built += 1
+            stats.build_seconds[name] = time.perf_counter() - started
+            print(f"tool registry: built {name} in {stats.build_seconds[name]:.2f}s")
+        return tool
+
+
+def get_tools(names: Sequence[str]) -> List["BaseTool"]:
+    """
+    Returns the tools with the given names, building those used for the first time.
+
+    Args:
+        names (Sequence[str]): The names of the tools.
+
+    Returns:
+        List[BaseTool]: The tools in the order of the names.
+    """
+    return [get_tool(name) for name in names]
+
+
+def _register_defaults() -> None:
+    for name, (module, attribute) in TOOL_FACTORIES.items():
+        register_tool(name, _import_factory(module, attribute))
+    for name in POLYGON_TOOLS:
+        register_tool(name, _polygon_factory(name))
+
+
+_register_defaults()
@@ -0,0 +1,294 @@
+"""
+This module runs the investment analysis over a whole watchlist. Inputs shared by all tickers, like the research
+about the macroeconomic situation, the markets and the fear and greed index, are gathered once per run, the price
+histories of all tickers are downloaded in bulk, and the per-ticker analyses run on a bounded worker pool whose
+LLM and tool calls are throttled to the rate limits of the providers. The reports are written to a JSON file.
+
+Usage:
+    python watchlist_batch.py NVDA AMD INTC --period 1y --output watchlist_report.json
+    python watchlist_batch.py --file watchlist.txt --workers 4 --polygon-calls-per-minute 5
+
+Classes:
+    RateLimitHandler: A callback handler blocking LLM and tool calls until their provider's rate limit allows them.
+    WatchlistResult: A data class holding the reports, errors and throughput of a run.
+
+Functions:
+    parse_watchlist(text: str) -> list:
+        Parses ticker symbols separated by commas, spaces or new lines.
+
+    build_rate_limiter(calls_per_minute: dict) -> RateLimitHandler:
+        Creates the rate limiter of a run from the calls per minute allowed per provider.
+
+    run_watchlist(tickers, steps, input, invoke, shared_keys, workers, step_workers, prefetch) -> WatchlistResult:
+        Runs the analysis steps for every ticker of the watchlist.
+
+    write_results(result: WatchlistResult, path: str, input: dict) -> None:
+        Writes the reports of a run to a JSON file.
+
+    main() -> None:
+        The command line entry point.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from analysis_dag import AnalysisStep, run_analysis_dag
+from rate_limit import TokenBucket
+from report_cache import get_report_cache
+
+WATCHLIST_OUTPUT_PATH = "watchlist_report.json"
+
+# the ticker the prompts of the shared steps are formatted with
+SHARED_TICKER = "the stock market"
+
+# tool name prefixes of the providers, the LLM is limited under the provider "llm"
+PROVIDER_PREFIXES = {
+    "polygon": "polygon_",
+    "yfinance": "yf_",
+    "alpha_vantage": "av_",
+    "finviz": "fv_",
+    "search": "internet_search",
+}
+
+
+def parse_watchlist(text: str) -> List[str]:
+    """
+    Parses ticker symbols separated by commas, spaces or new lines, dropping duplicates.
+
+    Args:
+        text (str): The watchlist.
+
+    Returns:
+        list: The ticker symbols in upper case, in the order of the watchlist.
+    """
+    tickers = [ticker.upper() for ticker in re.split(r"[,;\s]+", text) if ticker]
+    return list(dict.fromkeys(tickers))
+
+
+class RateLimitHandler(BaseCallbackHandler):
+    """
+    A callback handler taking a token of the provider's bucket before every LLM and tool call. The callbacks run
+    in the thread of the call, so the call waits until the provider's quota allows it.
+
+    Args:
+        buckets (dict): The token bucket per provider, "llm" or a key of PROVIDER_PREFIXES. Providers
+            without a bucket are not limited.
+    """
+
+    def __init__(self, buckets: Dict[str, TokenBucket]):
+        self.buckets = buckets
+        self.waited_seconds: Dict[str, float] = {provider: 0.0 for provider in buckets}
+        self._lock = threading.Lock()
+
+    def _acquire(self, provider: Optional[str]) -> None:
+        bucket = self.buckets.get(provider)
+        if bucket is not None:
+            waited = bucket.acquire()
+            with self._lock:
+                self.waited_seconds[provider] += waited
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._acquire("llm")
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name", "")
+        provider = next((provider for provider, prefix in PROVIDER_PREFIXES.items() if name.startswith(prefix)), None)
+        self._acquire(provider)
+
+
+def build_rate_limiter(calls_per_minute: Dict[str, float]) -> RateLimitHandler:
+    """
+    Creates the rate limiter of a run.
+
+    Args:
+        calls_per_minute (dict): The calls per minute allowed per provider, 0 for unlimited.
+
+    Returns:
+        RateLimitHandler: The rate limiter, passed as callback to the agents.
+    """
+    return RateLimitHandler({
+        provider: TokenBucket.per_minute(calls)
+        for provider, calls in calls_per_minute.items()
+        if calls
+    })
+
+
+@dataclass
+class WatchlistResult:
+    """Class for keeping the reports, errors and throughput of a watchlist run."""
+
+    reports: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    shared: Dict[str, str] = field(default_factory=dict)
+    total_seconds: float = 0.0
+
+    @property
+    def tickers_per_minute(self) -> float:
+        tickers = len(self.reports) + len(self.errors)
+        return 60 * tickers / self.total_seconds if self.total_seconds else 0.0
+
+
+def run_watchlist(
+    tickers: Sequence[str],
+    steps: Sequence[AnalysisStep],
+    input: Dict[str, Any],
+    invoke: Callable[..., Dict[str, Any]],
+    shared_keys: Sequence[str] = ("prompt_start",),
+    workers: int = 4,
+    step_workers: int = 4,
+    prefetch: bool = True,
+) -> WatchlistResult:
+    """
+    Runs the analysis steps for every ticker of the watchlist. The steps in `shared_keys` do not depend on the
+    ticker and run once, their outputs are passed to the steps of every ticker depending on them. A ticker whose
+    analysis fails is reported in the errors and does not stop the run.
+
+    Args:
+        tickers (Sequence[str]): The ticker symbols.
+        steps (Sequence[AnalysisStep]): The analysis steps, e.g. from build_analysis_steps.
+        input (dict): The input variables of the prompts besides the ticker, e.g. topics and period.
+        invoke (Callable): Runs an agent, see run_analysis_dag.
+        shared_keys (Sequence[str]): The keys of the steps run once for all tickers.
+        workers (int): The maximal number of tickers analyzed at once.
+        step_workers (int): The maximal number of agents running at once per ticker.
+        prefetch (bool): Downloads the price histories of all tickers in bulk before the analyses.
+
+    Returns:
+        WatchlistResult: The reports per ticker, the errors and the duration of the run.
+    """
+    result = WatchlistResult()
+    started = time.monotonic()
+
+    if prefetch and input.get("period"):
+        # yfinance and pandas are imported when a watchlist runs, not with the app
+        from yfinance_tools import prefetch_prices
+
+        prefetch_started = time.monotonic()
+        prefetch_prices(tickers, input["period"])
+        print(f"watchlist: prices of {len(tickers)} tickers downloaded in {time.monotonic() - prefetch_started:.1f}s")
+
+    shared_steps = [step for step in steps if step.key in shared_keys]
+    ticker_steps = [step for step in steps if step.key not in shared_keys]
+    if shared_steps:
+        shared = run_analysis_dag(shared_steps, {**input, "ticker": SHARED_TICKER}, invoke, max_workers=step_workers)
+        result.shared = shared.outputs
+        print(f"watchlist: shared steps done in {shared.total_seconds:.1f}s")
+
+    def analyze(ticker: str) -> Dict[str, Any]:
+        analysis = run_analysis_dag(ticker_steps, {**input, "ticker": ticker}, invoke,
+                                    max_workers=step_workers, outputs=result.shared)
+        return {
+            # the last step is the rating when it is selected
+            "report": analysis.outputs[ticker_steps[-1].key] if ticker_steps else "",
+            "steps": analysis.outputs,
+            "seconds": round(analysis.total_seconds, 2),
+        }
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="watchlist") as executor:
+        futures = {executor.submit(analyze, ticker): ticker for ticker in tickers}
+        for done, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            try:
+                result.reports[ticker] = future.result()
+                print(f"watchlist: {ticker} done ({done}/{len(tickers)})")
+            except Exception as e:
+                result.errors[ticker] = str(e)
+                print(f"watchlist: {ticker} failed ({done}/{len(tickers)}): {e}")
+
+    result.total_seconds = time.monotonic() - started
+    print(f"watchlist: {len(tickers)} tickers in {result.total_seconds:.1f}s, "
+          f"{result.tickers_per_minute:.1f} tickers/min")
+    return result
+
+
+def write_results(result: WatchlistResult, path: str, input: Dict[str, Any]) -> None:
+    """
+    Writes the reports of a run to a JSON file, replacing it at once so readers never see a partial file.
+
+    Args:
+        result (WatchlistResult): The result of run_watchlist.
+        path (str): The path of the JSON file.
+        input (dict): The input variables of the run, stored with the reports.
+    """
+    document = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "input": input,
+        "tickers": len(result.reports) + len(result.errors),
+        "seconds": round(result.total_seconds, 2),
+        "tickers_per_minute": round(result.tickers_per_minute, 2),
+        "shared": result.shared,
+        "reports": result.reports,
+        "errors": result.errors,
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    # imported here, investment_advisor imports this module for its batch mode
+    from investment_advisor import (
+        PROMPT_TEMPLATES,
+        build_analysis_steps,
+        get_keys,
+        get_tools,
+        invoke_cohere_with_tools,
+    )
+
+    parser = argparse.ArgumentParser(description="Run the investment analysis over a watchlist.")
+    parser.add_argument("tickers", nargs="*", help="ticker symbols")
+    parser.add_argument("--file", help="file with ticker symbols separated by commas, spaces or new lines")
+    parser.add_argument("--period", default="1y", help="period of the price history")
+    parser.add_argument("--topics", default="all relevant key figures like margin, profit, earnings growth and so on, "
+                        "fundamental indicators, technical indicators and analyst recommendations")
+    parser.add_argument("--steps", nargs="+", choices=list(PROMPT_TEMPLATES), default=list(PROMPT_TEMPLATES),
+                        help="steps of the report")
+    parser.add_argument("--output", default=WATCHLIST_OUTPUT_PATH, help="path of the JSON report")
+    parser.add_argument("--workers", type=int, default=4, help="tickers analyzed at once")
+    parser.add_argument("--step-workers", type=int, default=4, help="agents running at once per ticker")
+    parser.add_argument("--no-prefetch", action="store_true", help="skip the bulk download of the price histories")
+    parser.add_argument("--no-report-cache", action="store_true",
+                        help="recompute the steps already run today with the same inputs")
+    parser.add_argument("--llm-calls-per-minute", type=float, default=0, help="0 for unlimited")
+    parser.add_argument("--polygon-calls-per-minute", type=float, default=5, help="0 for unlimited")
+    parser.add_argument("--search-calls-per-minute", type=float, default=0, help="0 for unlimited")
+    parser.add_argument("--yfinance-calls-per-minute", type=float, default=0, help="0 for unlimited")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            tickers.extend(parse_watchlist(f.read()))
+    tickers = parse_watchlist(" ".join(tickers))
+    if not tickers:
+        parser.error("no ticker symbols given")
+
+    get_keys()
+    limiter = build_rate_limiter({
+        "llm": args.llm_calls_per_minute,
+        "polygon": args.polygon_calls_per_minute,
+        "search": args.search_calls_per_minute,
+        "yfinance": args.yfinance_calls_per_minute,
+    })
+    input = {"topics": args.topics, "period": args.period}
+    steps = build_analysis_steps([key for key in PROMPT_TEMPLATES if key in args.steps], get_tools())
+    invoke = invoke_cohere_with_tools if args.no_report_cache else get_report_cache().memoize(invoke_cohere_with_tools)
+    result = run_watchlist(tickers, steps, input, partial(invoke, callbacks=[limiter]),
+                           workers=args.workers, step_workers=args.step_workers, prefetch=not args.no_prefetch)
+    write_results(result, args.output, input)
+    waited = ", ".join(f"{provider} {seconds:.1f}s" for provider, seconds in limiter.waited_seconds.items())
+    print(f"reports written to {args.output}" + (f", waited for rate limits: {waited}" if waited else ""))
+
+
+if __name__ == "__main__":
+    main()
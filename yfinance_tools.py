@@ -13,6 +13,12 @@ Functions:
     get_ticker_history(ticker_symbol: str, period: str) -> str:
         Retrieves historical data for a specified stock market ticker symbol over a given period.
         
+    get_technical_indicators(ticker_symbols: str, period: str, benchmark: str) -> str:
+        Computes the technical indicators of one or more stock market ticker symbols.
+
+    prefetch_prices(ticker_symbols: list, period: str, indicator_period: str, benchmark: str) -> None:
+        Downloads the prices of many ticker symbols in bulk and caches them for the history and indicator tools.
+
     get_ticker_info_tool() -> StructuredTool:
         Creates a StructuredTool for retrieving detailed ticker information.
         
@@ -21,12 +27,29 @@ Functions:
         
     get_ticker_history_tool() -> StructuredTool:
         Creates a StructuredTool for retrieving historical data.
+
+    get_technical_indicators_tool() -> StructuredTool:
+        Creates a StructuredTool for computing technical indicators.
 """
 
+import json
+import re
+
+import pandas as pd
 import yfinance as yf
-from langchain_community.utilities.alpha_vantage import AlphaVantageAPIWrapper
 from langchain.tools import StructuredTool
 
+from alpha_vantage_client import get_alpha_vantage_client
+from market_data_cache import cached_fetch, get_market_data_cache
+from technical_indicators import compute_indicators, summarize_indicators
+
+# defaults of the indicator tool, the period covers the 200 day moving average and the 1 year performance
+INDICATOR_PERIOD = "2y"
+BENCHMARK = "^GSPC"
+
+# the columns of Ticker.history(), a bulk download has them only with actions=True
+HISTORY_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
 
 def get_ticker_info(ticker_symbol: str) -> str:
     """
@@ -38,8 +61,7 @@ def get_ticker_info(ticker_symbol: str) -> str:
     Returns:
         str: A string containing the detailed information of the stock.
     """
-    ticker = yf.Ticker(ticker_symbol)
-    return ticker.info
+    return cached_fetch("yfinance", "info", ticker_symbol, "info", lambda: yf.Ticker(ticker_symbol).info)
 
 def get_business_summary(ticker_symbol: str) -> str:
     """
@@ -51,9 +73,10 @@ def get_business_summary(ticker_symbol: str) -> str:
     Returns:
         str: A string containing the business summary of the stock.
     """
-    ticker = yf.Ticker(ticker_symbol)
+    # fetched from the info payload shared with get_ticker_info, but kept longer
     try:
-        long_business_summary = ticker.info['longBusinessSummary']
+        long_business_summary = cached_fetch("yfinance", "business_summary", ticker_symbol, "summary",
+                                             lambda: get_ticker_info(ticker_symbol)['longBusinessSummary'])
     except KeyError as e:
         long_business_summary = 'Business summary could not be loaded'
 
@@ -62,8 +85,8 @@ def get_business_summary(ticker_symbol: str) -> str:
 
 def av_search_symbols(company_name: str) -> str:
     """Searches a stock market symbol or a company."""
-    alpha_vantage = AlphaVantageAPIWrapper()
-    return alpha_vantage.search_symbols(company_name)
+    return cached_fetch("alpha_vantage", "search_symbols", company_name, "search",
+                        lambda: get_alpha_vantage_client().search_symbols(company_name))
 
 
 def get_ticker_history(ticker_symbol: str, period: str) -> str:
@@ -77,9 +100,94 @@ def get_ticker_history(ticker_symbol: str, period: str) -> str:
     Returns:
         str: A string containing the historical data of the stock.
     """
-    ticker = yf.Ticker(ticker_symbol)
-    history = str(ticker.history(period=period))
-    return history
+    return cached_fetch("yfinance", "history", ticker_symbol, "history",
+                        lambda: _history_text(yf.Ticker(ticker_symbol).history(period=period)), {"period": period})
+
+
+def _history_text(history: pd.DataFrame) -> str:
+    # the same text for Ticker.history() and for a column group of a bulk download, whose dates have no time
+    # zone and whose volume is float where the other tickers traded on days this one did not
+    history = history.dropna(how="all").reindex(columns=HISTORY_COLUMNS)
+    history[["Volume", "Dividends", "Stock Splits"]] = history[["Volume", "Dividends", "Stock Splits"]].fillna(0)
+    history["Volume"] = history["Volume"].astype("int64")
+    dates = pd.DatetimeIndex(history.index)
+    history.index = (dates.tz_localize(None) if dates.tz is not None else dates).rename("Date")
+    return str(history)
+
+def download_closes(ticker_symbols, period: str):
+    """
+    Downloads the daily closes of several ticker symbols in one request.
+
+    Args:
+        ticker_symbols (list): The ticker symbols.
+        period (str): The period to download (e.g., '1y', '2y', '5y').
+
+    Returns:
+        pd.DataFrame: The adjusted daily closes, one column per ticker symbol.
+    """
+    symbols = sorted(set(ticker_symbols))
+
+    def download():
+        prices = yf.download(symbols, period=period, auto_adjust=True, progress=False, group_by="ticker", threads=True)
+        return _closes_frame(prices, symbols)
+
+    return cached_fetch("yfinance", "download_closes", ",".join(symbols), "history", download, {"period": period})
+
+
+def _closes_frame(prices: pd.DataFrame, symbols) -> pd.DataFrame:
+    # the closes of some tickers of a download grouped by ticker, without the dates on which only the other
+    # tickers of the download traded, so a watchlist download gives the frame a download of these tickers gives
+    return pd.DataFrame({symbol: prices[symbol]["Close"] for symbol in symbols}).dropna(how="all")
+
+
+def prefetch_prices(ticker_symbols, period: str, indicator_period: str = INDICATOR_PERIOD,
+                    benchmark: str = BENCHMARK) -> None:
+    """
+    Downloads the prices of many ticker symbols with one request per period and caches them per ticker symbol
+    under the keys and in the format of get_ticker_history and get_technical_indicators, replacing cached ones,
+    so the analyses of a watchlist find them in the cache instead of calling Yahoo Finance once per ticker and
+    tool.
+
+    Args:
+        ticker_symbols (list): The ticker symbols.
+        period (str): The period of the price history (e.g., '1y').
+        indicator_period (str): The period the technical indicators are computed on.
+        benchmark (str): The ticker symbol of the index the beta is computed against.
+    """
+    cache = get_market_data_cache()
+    symbols = sorted({symbol.upper() for symbol in ticker_symbols} - {benchmark})
+    for download_period in sorted({period, indicator_period}):
+        prices = yf.download(symbols + [benchmark], period=download_period, auto_adjust=True, actions=True,
+                             progress=False, group_by="ticker", threads=True)
+        for symbol in symbols:
+            if download_period == period:
+                cache.put("yfinance", "history", symbol, "history", _history_text(prices[symbol]),
+                          {"period": period})
+            if download_period == indicator_period:
+                pair = sorted([symbol, benchmark])
+                cache.put("yfinance", "download_closes", ",".join(pair), "history", _closes_frame(prices, pair),
+                          {"period": indicator_period})
+
+
+def get_technical_indicators(ticker_symbols: str, period: str = INDICATOR_PERIOD, benchmark: str = BENCHMARK) -> str:
+    """
+    Computes the technical indicators of one or more stock market ticker symbols from their daily closes:
+    50/100/200 day moving averages, 52 week high/low, RSI and overbought/oversold signal, performance over
+    1 week to 1 year, volatility, Sharpe ratio, maximal drawdown and beta against a benchmark index.
+
+    Args:
+        ticker_symbols (str): One or more ticker symbols separated by commas or spaces.
+        period (str): The period of daily closes the indicators are computed on, at least '1y' for all of them.
+        benchmark (str): The ticker symbol of the index the beta is computed against.
+
+    Returns:
+        str: A JSON object with the indicators per ticker symbol.
+    """
+    symbols = [symbol.upper() for symbol in re.split(r"[,\s]+", ticker_symbols) if symbol]
+    closes = download_closes(symbols + [benchmark], period)
+    indicators = compute_indicators(closes[symbols], benchmark=closes[benchmark])
+    return json.dumps(summarize_indicators(indicators))
+
 
 def get_ticker_info_tool():
     """
@@ -131,3 +239,23 @@ def get_ticker_history_tool():
     return StructuredTool.from_function(
         func=get_ticker_history, name="yf_get_ticker_history", description=description
     )
+
+
+def get_technical_indicators_tool():
+    """
+    Creates a StructuredTool for computing technical indicators.
+
+    Returns:
+        StructuredTool: A tool for computing technical indicators.
+    """
+    description = (
+        "Useful for when you need the technical analysis of one or more stock symbols: moving averages, "
+        "52 week high/low, RSI, overbought/oversold, performance 1 week to 1 year, volatility, sharpe ratio, "
+        "drawdown and beta. Takes several symbols at once, e.g. 'NVDA, AMD, INTC'. "
+        "Useful if somebody asks 'Is companyXXX overbought or oversold?' "
+        "Useful if somebody asks 'How did companyXXX perform compared to its moving averages?' "
+    )
+
+    return StructuredTool.from_function(
+        func=get_technical_indicators, name="yf_get_technical_indicators", description=description
+    )